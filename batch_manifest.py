@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+批量处理清单 (增量 / 断点续传)
+输出目录中的 batch_manifest.json 记录每个输出文件对应的输入 (路径、大小、修改时间、
+快速内容哈希)、转换参数和输出哈希; 再次运行时跳过未变化的任务
+每个任务完成后立即保存清单, 中途崩溃后重新运行即从未完成的任务继续
+"""
+
+import os
+import json
+import time
+import hashlib
+
+MANIFEST_FILE = 'batch_manifest.json'
+MANIFEST_VERSION = 1
+
+# 快速哈希: 小文件整体哈希, 大文件只读取头尾和均匀分布的采样块
+FULL_HASH_LIMIT = 4 * 1024 * 1024
+EDGE_BYTES = 1024 * 1024
+SAMPLE_BYTES = 256 * 1024
+SAMPLE_COUNT = 8
+
+
+def file_digest(path):
+    """文件的快速内容哈希 (BLAKE2b, 大文件按块采样), 返回十六进制字符串"""
+    h = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(path)
+    h.update(size.to_bytes(8, 'little'))
+
+    with open(path, 'rb') as f:
+        if size <= FULL_HASH_LIMIT:
+            h.update(f.read())
+            return h.hexdigest()
+
+        h.update(f.read(EDGE_BYTES))
+        step = (size - 2 * EDGE_BYTES) // (SAMPLE_COUNT + 1)
+        for i in range(1, SAMPLE_COUNT + 1):
+            f.seek(EDGE_BYTES + i * step)
+            h.update(f.read(SAMPLE_BYTES))
+        f.seek(size - EDGE_BYTES)
+        h.update(f.read(EDGE_BYTES))
+    return h.hexdigest()
+
+
+def task_params(task):
+    """影响输出内容的任务参数"""
+    offsets = task.get('offsets')
+    return {
+        'type': task['type'],
+        'conversion_type': task.get('conversion_type', 'rgb'),
+        'origin': [float(v) for v in offsets] if offsets is not None else None,
+        'encoding': task.get('encoding', 'binary'),
+        'engine': task.get('engine', 'native'),
+    }
+
+
+class BatchManifest:
+    """输出目录中的批量处理清单, 以输出文件的相对路径为键"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.entries = self.load()
+
+    def load(self):
+        """读取清单, 不存在或损坏时返回空清单"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"批量清单读取失败, 将重新处理全部文件: {e}")
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def save(self):
+        """原子写入清单 (先写临时文件再替换)"""
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f,
+                          indent=1, ensure_ascii=False, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"批量清单保存失败: {e}")
+
+    def task_key(self, task):
+        return os.path.relpath(os.path.abspath(task['output_file']), os.path.abspath(self.output_dir))
+
+    def is_up_to_date(self, task):
+        """输入、参数和输出都未变化时返回 True"""
+        entry = self.entries.get(self.task_key(task))
+        if entry is None:
+            return False
+        if entry['input'] != os.path.abspath(task['input_file']) or entry['params'] != task_params(task):
+            return False
+
+        try:
+            stat = os.stat(task['input_file'])
+            if stat.st_size != entry['input_size']:
+                return False
+            # 修改时间变化但内容未变 (如重新拷贝), 更新记录后仍视为最新
+            if stat.st_mtime_ns != entry['input_mtime_ns']:
+                if file_digest(task['input_file']) != entry['input_hash']:
+                    return False
+                entry['input_mtime_ns'] = stat.st_mtime_ns
+
+            if os.path.getsize(task['output_file']) != entry['output_size']:
+                return False
+            return file_digest(task['output_file']) == entry['output_hash']
+        except OSError:
+            return False
+
+    def pending_tasks(self, tasks):
+        """过滤出需要重新处理的任务, 返回 (待处理任务, 跳过数)"""
+        pending = [task for task in tasks if not self.is_up_to_date(task)]
+        if len(pending) < len(tasks):
+            # 保存可能更新过的修改时间
+            self.save()
+        return pending, len(tasks) - len(pending)
+
+    def record(self, task):
+        """任务成功后记录输入和输出状态, 并立即保存"""
+        try:
+            stat = os.stat(task['input_file'])
+            entry = {
+                'input': os.path.abspath(task['input_file']),
+                'input_size': stat.st_size,
+                'input_mtime_ns': stat.st_mtime_ns,
+                'input_hash': file_digest(task['input_file']),
+                'params': task_params(task),
+                'output_size': os.path.getsize(task['output_file']),
+                'output_hash': file_digest(task['output_file']),
+                'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+        except OSError as e:
+            print(f"批量清单记录失败: {e}")
+            return
+        self.entries[self.task_key(task)] = entry
+        self.save()
+
+    def forget(self, task):
+        """任务失败时删除旧记录, 下次运行会重新处理"""
+        if self.entries.pop(self.task_key(task), None) is not None:
+            self.save()
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+网格分割 (内置 pointcloud_divider)
+- 输入 LAS 点块 (流式流程) 或 PCD 文件 (点云分割)
+- 按 grid_size_x × grid_size_y 把点分桶到网格 (向量化计算网格编号),
+  或按密度自适应的四叉树分块 (见 quadtree_tiling), 每块点数不超过上限
+- 每个网格的点先缓存在内存, 超过内存上限时按网格连续写入一个新的溢出文件 (每次落盘只打开一个文件)
+- 需要降采样或压缩输出时按网格并行 (多进程) 执行体素滤波 / LZF 压缩
+- 写出 {prefix}_{x}_{y}.pcd 网格文件、{prefix}_metadata.yaml 和网格索引 {prefix}_tiles.idx
+"""
+
+import os
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import las_io
+import pcd_io
+import process_runner
+import quadtree_tiling
+import tile_index
+import voxel_filter
+
+# 网格缓存的默认内存上限 (字节)
+DEFAULT_MEMORY_LIMIT = 1024 * 1024 * 1024
+
+MB = 1024 * 1024
+
+
+def memory_limit_bytes(memory_limit_mb):
+    """任务参数 memory_limit_mb (MB, None / 0 表示默认) → 网格缓存的内存上限 (字节)"""
+    return int(memory_limit_mb * MB) if memory_limit_mb else DEFAULT_MEMORY_LIMIT
+
+
+def format_coord(value):
+    """网格坐标: 整数不带小数点 (与 pointcloud_divider 输出一致)"""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def tile_file_name(prefix, key, grid_size_x, grid_size_y):
+    """网格文件名, 使用网格左下角坐标"""
+    ix, iy = key
+    return f"{prefix}_{format_coord(ix * grid_size_x)}_{format_coord(iy * grid_size_y)}.pcd"
+
+
+def write_grid_metadata(output_dir, prefix, grid_size_x, grid_size_y, tiles, sizes=None, comments=()):
+    """写出网格元数据 YAML (Autoware 地图加载格式)
+
+    tiles: {文件名: (网格左下角 x, 网格左下角 y)}
+    sizes: 自适应分块时 {文件名: (边长 x, 边长 y)}, 追加在坐标之后 (只读取前两项的加载器按最大边长处理)
+    comments: 写在文件开头的注释行 (分块方式说明)
+    """
+    metadata_file = os.path.join(output_dir, f'{prefix}_metadata.yaml')
+    with open(metadata_file, 'w') as f:
+        for line in comments:
+            f.write(f"# {line}\n")
+        f.write(f"x_resolution: {float(grid_size_x)}\n")
+        f.write(f"y_resolution: {float(grid_size_y)}\n")
+        for name in sorted(tiles):
+            values = list(tiles[name]) + list(sizes[name] if sizes else ())
+            f.write(f"{name}: [{', '.join(format_coord(v) for v in values)}]\n")
+    return metadata_file
+
+
+def point_bounds(points):
+    """点的包围盒 (min_x, min_y, min_z, max_x, max_y, max_z), 没有点时返回 None"""
+    if len(points) == 0:
+        return None
+    axes = ('x', 'y', 'z')
+    return tuple(float(points[axis].min()) for axis in axes) + tuple(float(points[axis].max()) for axis in axes)
+
+
+def write_tile_points(points, output_file, point_type, leaf_size=0.0, voxel_mode='centroid',
+                      encoding='binary'):
+    """降采样并写出一个网格, 返回 (文件名, 输入点数, 输出点数, 包围盒, 文件字节数)"""
+    out = voxel_filter.voxel_downsample(points, leaf_size, voxel_mode)
+    with pcd_io.PCDWriter(output_file, point_type, len(out), encoding) as writer:
+        writer.write(out)
+    return (os.path.basename(output_file), len(points), len(out), point_bounds(out),
+            os.path.getsize(output_file))
+
+
+def read_segments(segments, dtype):
+    """读取网格在溢出文件中的点段 [(溢出文件, 字节偏移, 点数)], 返回点块列表"""
+    return [np.fromfile(path, dtype=dtype, count=count, offset=offset) for path, offset, count in segments]
+
+
+def write_tile_part(task):
+    """子进程任务: 读取网格在溢出文件中的点段, 降采样后写出 PCD (内存只与网格大小相关)"""
+    segments, output_file, point_type, leaf_size, voxel_mode, encoding = task
+    blocks = read_segments(segments, pcd_io.point_dtype(point_type))
+    points = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+    return write_tile_points(points, output_file, point_type, leaf_size, voxel_mode, encoding)
+
+
+class TileBinner:
+    """网格分桶器: 内存占用受 memory_limit 限制, 超出时把全部缓存写入一个新的溢出文件
+
+    溢出文件中每个网格的点连续存放, segments 记录每个网格在各溢出文件中的点段;
+    落盘次数约为 总点数 / 内存上限, 与网格数无关
+    """
+
+    def __init__(self, point_type, grid_size_x, grid_size_y, work_dir,
+                 memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.point_type = point_type
+        self.dtype = pcd_io.point_dtype(point_type)
+        self.grid_size_x = float(grid_size_x)
+        self.grid_size_y = float(grid_size_y)
+        self.work_dir = work_dir
+        self.memory_limit = memory_limit
+
+        self.buffers = {}   # 网格 → 内存中的点块列表
+        self.counts = {}    # 网格 → 点数
+        self.segments = {}  # 网格 → 溢出文件中的点段 [(溢出文件, 字节偏移, 点数)]
+        self.spill_files = []
+        self.buffered_bytes = 0
+        os.makedirs(work_dir, exist_ok=True)
+
+    def tile_keys(self, records):
+        """每个点所在网格的 64 位键 (ix, iy 打包)"""
+        ix = np.floor(records['x'] / self.grid_size_x).astype(np.int64)
+        iy = np.floor(records['y'] / self.grid_size_y).astype(np.int64)
+        return quadtree_tiling.pack_keys(ix, iy)
+
+    def unpack_key(self, key):
+        """64 位键 → 网格 (ix, iy)"""
+        return key >> 32, ((key & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000
+
+    def tile_name(self, prefix, key):
+        return tile_file_name(prefix, key, self.grid_size_x, self.grid_size_y)
+
+    def tile_origin(self, key):
+        """网格左下角坐标"""
+        return key[0] * self.grid_size_x, key[1] * self.grid_size_y
+
+    def index_key(self, key):
+        """网格索引中的 ((ix, iy), 级别)"""
+        return key, 0
+
+    def write_metadata(self, output_dir, prefix, tiles):
+        return write_grid_metadata(output_dir, prefix, self.grid_size_x, self.grid_size_y, tiles)
+
+    def add(self, records):
+        """加入一块点记录"""
+        if len(records) == 0:
+            return
+
+        # 按 64 位键排序分组
+        keys = self.tile_keys(records)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        grouped = records[order]
+
+        for start, end in zip(starts, ends):
+            key = self.unpack_key(int(sorted_keys[start]))
+            self.buffers.setdefault(key, []).append(grouped[start:end])
+            self.counts[key] = self.counts.get(key, 0) + int(end - start)
+
+        self.buffered_bytes += grouped.nbytes
+        if self.buffered_bytes > self.memory_limit:
+            self.spill()
+
+    def spill(self):
+        """把所有内存缓存写入一个新的溢出文件, 每个网格的点连续存放"""
+        if not self.buffers:
+            return
+        path = os.path.join(self.work_dir, f'spill_{len(self.spill_files)}.data')
+        offset = 0
+        with open(path, 'wb') as f:
+            for key, blocks in self.buffers.items():
+                count = 0
+                for block in blocks:
+                    block.tofile(f)
+                    count += len(block)
+                self.segments.setdefault(key, []).append((path, offset, count))
+                offset += count * self.dtype.itemsize
+        self.spill_files.append(path)
+        self.buffers = {}
+        self.buffered_bytes = 0
+
+    def remove_spill_files(self):
+        """全部网格写出后删除溢出文件"""
+        for path in self.spill_files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.spill_files = []
+        self.segments = {}
+
+    def tile_points(self, key):
+        """读取一个网格的全部点 (溢出文件中的点段 + 内存缓存)"""
+        blocks = read_segments(self.segments.pop(key, []), self.dtype)
+        blocks.extend(self.buffers.pop(key, []))
+        if not blocks:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+
+    def iter_written_tiles(self, output_dir, prefix, leaf_size, voxel_mode, workers, encoding='binary',
+                           cancel=None):
+        """写出全部网格, 按完成顺序产出 write_tile_points 的结果
+
+        需要降采样或压缩且 workers > 1 时, 先把缓存全部落盘, 再由进程池逐网格处理;
+        cancel 为 process_runner.CancelToken, 取消时结束进程池的工作进程
+        """
+        keys = sorted(self.counts)
+        names = {key: self.tile_name(prefix, key) for key in keys}
+
+        heavy = leaf_size > 0 or encoding == 'binary_compressed'
+        if heavy and workers > 1 and len(keys) > 1:
+            self.spill()
+            tasks = [(self.segments[key], os.path.join(output_dir, names[key]),
+                      self.point_type, leaf_size, voxel_mode, encoding) for key in keys]
+            # 调用方可能在 GUI 的后台线程中, 使用 spawn 避免 fork 后死锁
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(write_tile_part, task) for task in tasks]
+                with process_runner.pool_tracking(cancel, executor):
+                    for future in as_completed(futures):
+                        yield future.result()
+            self.remove_spill_files()
+            return
+
+        for key in keys:
+            yield write_tile_points(self.tile_points(key), os.path.join(output_dir, names[key]),
+                                    self.point_type, leaf_size, voxel_mode, encoding)
+        self.remove_spill_files()
+
+    def write_tiles(self, output_dir, prefix, leaf_size=0.0, voxel_mode='centroid', workers=1,
+                    progress=None, encoding='binary', advance=None, cancel=None):
+        """写出全部网格 PCD、元数据和网格索引, 返回 {文件名: (x, y)}"""
+        emit = progress or (lambda message: None)
+        step = advance or (lambda *args: None)
+        total = len(self.counts)
+        keys = {self.tile_name(prefix, key): key for key in self.counts}
+        tiles = {name: self.tile_origin(key) for name, key in keys.items()}
+
+        points_in = points_out = 0
+        entries = []
+        for idx, (name, count_in, count_out, bounds, size) in enumerate(
+                self.iter_written_tiles(output_dir, prefix, leaf_size, voxel_mode, workers, encoding,
+                                        cancel)):
+            points_in += count_in
+            points_out += count_out
+            entries.append((name, *self.index_key(keys[name]), count_out, size, bounds))
+            step('写出网格', idx + 1, total, 'tiles')
+            if leaf_size > 0:
+                emit(f"[{idx+1}/{total}] {name}: {count_in:,} → {count_out:,} 点")
+            elif (idx + 1) % 100 == 0 or idx + 1 == total:
+                emit(f"已写出网格 {idx+1}/{total}")
+
+        if leaf_size > 0 and points_in:
+            emit(f"降采样 ({voxel_mode}, {leaf_size}m): {points_in:,} → {points_out:,} 点 "
+                 f"({points_out * 100 / points_in:.1f}%)")
+
+        self.write_metadata(output_dir, prefix, tiles)
+        tile_index.write_index(output_dir, prefix, self.grid_size_x, self.grid_size_y, entries)
+        return tiles
+
+    def write_merged(self, output_file, leaf_size=0.0, voxel_mode='centroid', progress=None,
+                     encoding='binary', advance=None):
+        """逐网格降采样后合并写出为单个 PCD, 返回点数"""
+        emit = progress or (lambda message: None)
+        step = advance or (lambda *args: None)
+        data_file = os.path.join(self.work_dir, 'merged.data')
+        total = len(self.counts)
+        written = 0
+
+        with open(data_file, 'wb') as f:
+            for idx, key in enumerate(sorted(self.counts)):
+                points = voxel_filter.voxel_downsample(self.tile_points(key), leaf_size, voxel_mode)
+                points.tofile(f)
+                written += len(points)
+                step('合并网格', idx + 1, total, 'tiles')
+                if (idx + 1) % 100 == 0 or idx + 1 == total:
+                    emit(f"已处理网格 {idx+1}/{total}")
+        self.remove_spill_files()
+
+        # 点数确定后再写文件头, 然后拷贝点数据
+        if encoding == 'binary':
+            with open(output_file, 'wb') as out, open(data_file, 'rb') as f:
+                out.write(pcd_io.make_header(self.point_type, written))
+                shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+        else:
+            # ascii / binary_compressed 需要重新编码
+            with pcd_io.PCDWriter(output_file, self.point_type, written, encoding, advance) as writer:
+                if written:
+                    points = np.memmap(data_file, dtype=self.dtype, mode='r')
+                    for begin in range(0, written, pcd_io.DEFAULT_CHUNK_POINTS):
+                        writer.write(points[begin:begin + pcd_io.DEFAULT_CHUNK_POINTS])
+                    del points
+        os.remove(data_file)
+        return written
+
+    def cleanup(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class AdaptiveTileBinner(TileBinner):
+    """按四叉树分块 (quadtree_tiling.QuadTreeTiling) 分桶, 分块键为 (级别, ix, iy)"""
+
+    def __init__(self, point_type, tiling, work_dir, memory_limit=DEFAULT_MEMORY_LIMIT):
+        super().__init__(point_type, tiling.root_x, tiling.root_y, work_dir, memory_limit)
+        self.tiling = tiling
+
+    def tile_keys(self, records):
+        return self.tiling.tile_ids(records['x'], records['y'])
+
+    def unpack_key(self, key):
+        return self.tiling.leaves[key]
+
+    def tile_name(self, prefix, key):
+        x, y = self.tile_origin(key)
+        return f"{prefix}_{format_coord(x)}_{format_coord(y)}.pcd"
+
+    def tile_origin(self, key):
+        return self.tiling.tile_origin(key)
+
+    def index_key(self, key):
+        return key[1:], key[0]
+
+    def write_metadata(self, output_dir, prefix, tiles):
+        # 分块互不重叠, 左下角坐标唯一; 元数据的分辨率为根网格 (最大分块) 边长
+        names = {self.tile_name(prefix, key): key for key in self.counts}
+        sizes = {name: self.tiling.tile_size(key[0]) for name, key in names.items()}
+        return write_grid_metadata(output_dir, prefix, self.grid_size_x, self.grid_size_y, tiles, sizes,
+                                   self.tiling.metadata_comments())
+
+
+def build_adaptive_tiling(xy_chunks, grid_size_x, grid_size_y, max_points, progress=None):
+    """第一遍: 由 (x, y) 点块统计密度直方图并生成四叉树分块, grid_size 为根网格 (最大分块) 边长"""
+    emit = progress or (lambda message: None)
+    scale = 1 << quadtree_tiling.MAX_DEPTH
+    histogram = quadtree_tiling.DensityHistogram(grid_size_x / scale, grid_size_y / scale)
+    for x, y in xy_chunks:
+        histogram.add(x, y)
+    tiling = quadtree_tiling.QuadTreeTiling.build(histogram, grid_size_x, grid_size_y, max_points)
+
+    levels = ', '.join(f"{tiling.tile_size(level)[0]:g}m × {count}" for level, count in tiling.summary().items())
+    emit(f"自适应分块: 每块最多 {max_points:,} 点, {len(tiling.leaves)} 块 ({levels})")
+    if tiling.oversized():
+        emit(f"⚠️  {tiling.oversized()} 个分块细分到最小边长后仍超过点数上限")
+    return tiling
+
+
+def make_binner(point_type, grid_size_x, grid_size_y, work_dir, memory_limit, tiling=None):
+    """固定网格或自适应分块 (tiling 为 QuadTreeTiling) 的分桶器"""
+    if tiling is not None:
+        return AdaptiveTileBinner(point_type, tiling, work_dir, memory_limit)
+    return TileBinner(point_type, grid_size_x, grid_size_y, work_dir, memory_limit)
+
+
+def divide_las_stream(input_file, output_dir, prefix, conversion_type, grid_size_x, grid_size_y,
+                      leaf_size=0.0, origin=None, voxel_mode='centroid', workers=1,
+                      memory_limit=DEFAULT_MEMORY_LIMIT, progress=None, encoding='binary',
+                      advance=None, cancel=None, tiling='grid', max_tile_points=None, max_tile_bytes=None):
+    """LAS 直接流式分割为网格 PCD, 不生成全尺寸的中间 PCD 文件
+
+    返回 {文件名: (x, y)}; advance 为进度回调 (读取分桶按点数, 写出按网格数),
+    cancel 为取消标记 (见 write_tiles);
+    tiling 为 'adaptive' 时先读一遍坐标统计密度, grid_size 作为最大分块边长, 每块点数 / 字节数不超过上限
+    """
+    emit = progress or (lambda message: None)
+    step = advance or (lambda *args: None)
+
+    header, points = las_io.open_las_points(input_file)
+    count = len(points)
+    if origin is None:
+        origin = las_io.default_origin(header, points, conversion_type)
+    emit(f"the origin coordinate is x0 = {origin[0]:.2f}, y0 = {origin[1]:.2f}, z0 = {origin[2]:.2f}")
+    emit(f"输出编码: {encoding}")
+
+    shift = las_io.rgb_shift(points) if 'red' in points.dtype.names else 0
+
+    quadtree = None
+    if tiling == 'adaptive':
+        def xy_chunks():
+            done = 0
+            for chunk in las_io.iter_las_chunks(points):
+                yield (las_io.las_chunk_coordinate(chunk, header, origin, 0),
+                       las_io.las_chunk_coordinate(chunk, header, origin, 1))
+                done += len(chunk)
+                step('密度统计', done, count, 'points')
+
+        max_points = quadtree_tiling.max_points_for(max_tile_points, max_tile_bytes,
+                                                    pcd_io.point_dtype(conversion_type).itemsize)
+        quadtree = build_adaptive_tiling(xy_chunks(), grid_size_x, grid_size_y, max_points, progress)
+
+    binner = make_binner(conversion_type, grid_size_x, grid_size_y,
+                         os.path.join(output_dir, f'.{prefix}_tiles_tmp'), memory_limit, quadtree)
+    try:
+        done = 0
+        next_report = 0
+        for chunk in las_io.iter_las_chunks(points):
+            binner.add(las_io.las_chunk_to_pcd(chunk, header, origin, conversion_type, shift))
+            done += len(chunk)
+            step('分桶', done, count, 'points')
+
+            percent = done * 100 // count
+            if percent >= next_report:
+                emit(f"已读取 {done:,} / {count:,} 点 ({percent}%), 网格数 {len(binner.counts)}")
+                next_report = percent + 10
+
+        return binner.write_tiles(output_dir, prefix, leaf_size, voxel_mode, workers, progress, encoding,
+                                  advance, cancel)
+    finally:
+        binner.cleanup()
+
+
+def divide_pcd_files(input_files, output_dir, prefix, grid_size_x, grid_size_y, leaf_size=0.0,
+                     merge_pcds=False, voxel_mode='centroid', workers=1,
+                     memory_limit=DEFAULT_MEMORY_LIMIT, progress=None, encoding='binary',
+                     advance=None, cancel=None, tiling='grid', max_tile_points=None, max_tile_bytes=None):
+    """内置点云分割 (替代 pointcloud_divider), 参数与 pointcloud_divider 配置一致
+
+    merge_pcds 为 True 时合并输出为 {prefix}.pcd (不降采样时直接拼接输入, 见 pcd_io.merge_pcd_files),
+    否则输出网格文件和元数据,
+    返回输出的 PCD 文件名列表; advance 为进度回调 (读取分桶按点数, 写出按网格数),
+    cancel 为取消标记 (见 write_tiles); tiling / max_tile_points / max_tile_bytes 见 divide_las_stream
+    """
+    emit = progress or (lambda message: None)
+    step = advance or (lambda *args: None)
+
+    if not input_files:
+        raise ValueError("没有输入的 PCD 文件")
+    headers = [pcd_io.read_header(path) for path in input_files]
+    point_types = {pcd_io.detect_point_type(header) for header in headers}
+    if len(point_types) > 1:
+        raise ValueError(f"输入文件的点类型不一致: {', '.join(sorted(point_types))}")
+    point_type = point_types.pop()
+    emit(f"输出编码: {encoding}")
+
+    if merge_pcds and leaf_size <= 0:
+        # 不降采样时合并与网格无关, 直接拼接输入文件
+        output_file = os.path.join(output_dir, f'{prefix}.pcd')
+        written = pcd_io.merge_pcd_files(input_files, output_file, encoding, progress, advance)
+        emit(f"合并输出: {os.path.basename(output_file)} ({written:,} 点)")
+        return [os.path.basename(output_file)]
+
+    total_points = sum(header['points'] for header in headers)
+    quadtree = None
+    if tiling == 'adaptive' and not merge_pcds:
+        def xy_chunks():
+            done = 0
+            for path, header in zip(input_files, headers):
+                for chunk in pcd_io.iter_point_chunks(path, 'xyz', header=header):
+                    yield chunk['x'], chunk['y']
+                    done += len(chunk)
+                    step('密度统计', done, total_points, 'points')
+
+        max_points = quadtree_tiling.max_points_for(max_tile_points, max_tile_bytes,
+                                                    pcd_io.point_dtype(point_type).itemsize)
+        quadtree = build_adaptive_tiling(xy_chunks(), grid_size_x, grid_size_y, max_points, progress)
+
+    binner = make_binner(point_type, grid_size_x, grid_size_y,
+                         os.path.join(output_dir, f'.{prefix}_tiles_tmp'), memory_limit, quadtree)
+    try:
+        done = 0
+        for idx, (path, header) in enumerate(zip(input_files, headers)):
+            emit(f"[{idx+1}/{len(input_files)}] 读取 {os.path.basename(path)} ({header['points']:,} 点)")
+            for chunk in pcd_io.iter_point_chunks(path, point_type, header=header):
+                binner.add(chunk)
+                done += len(chunk)
+                step('分桶', done, total_points, 'points')
+        emit(f"分桶完成: {sum(binner.counts.values()):,} 点, {len(binner.counts)} 个网格")
+
+        if merge_pcds:
+            output_file = os.path.join(output_dir, f'{prefix}.pcd')
+            written = binner.write_merged(output_file, leaf_size, voxel_mode, progress, encoding, advance)
+            emit(f"合并输出: {os.path.basename(output_file)} ({written:,} 点)")
+            return [os.path.basename(output_file)]
+
+        return sorted(binner.write_tiles(output_dir, prefix, leaf_size, voxel_mode, workers, progress,
+                                         encoding, advance, cancel))
+    finally:
+        binner.cleanup()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+任务内存估算
+- 按输入文件头中的点数和点记录大小估算各类任务的峰值内存 (不读取点数据)
+- 任务结束后用实测的峰值内存修正各任务类型的系数 (指数平滑), 保存在用户缓存目录
+- 调度器只在估算总量不超过内存预算时启动任务
+"""
+
+import os
+import json
+
+import las_io
+import pcd_io
+import grid_divider
+from metadata_cache import default_cache_dir
+from pointcloud_jobs import default_workers
+
+MODEL_VERSION = 1
+
+MB = 1024 * 1024
+
+# 处理点块的固定开销 (点块缓冲、查找表等)
+CHUNK_OVERHEAD_MB = 64
+
+# 每个工作进程的固定开销 (解释器 + NumPy)
+PROCESS_OVERHEAD_MB = 60
+
+# 输出 PCD 每点字节数 (x, y, z + rgb / intensity, 各 4 字节)
+PCD_POINT_BYTES = 16
+
+# binary_compressed 需要整个文件的字段数据和压缩结果同时在内存中 (相对于 PCD 数据大小)
+COMPRESSED_FACTOR = 4.0
+
+# 外部程序把整个点云读入 PCL 点云对象, 每点约占用的字节数
+EXTERNAL_POINT_BYTES = 48
+
+# 修正系数的平滑权重和范围
+LEARNING_RATE = 0.3
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+
+# 估算值太小时实测误差主要来自解释器本身, 不用于修正
+MIN_LEARN_MB = 32
+
+
+def default_memory_budget():
+    """默认内存预算 (MB): 物理内存的 70%, 无法获取时返回 None (不限制)"""
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+    return int(total * 0.7 / MB)
+
+
+def default_binning_limit_mb(memory_budget=None):
+    """默认分桶缓存上限 (MB): grid_divider 的默认值, 设置了内存预算时不超过预算的 1/4"""
+    limit = grid_divider.DEFAULT_MEMORY_LIMIT // MB
+    if memory_budget:
+        limit = max(64, min(limit, memory_budget // 4))
+    return limit
+
+
+def binning_limit(params):
+    """分割 / 一键流程的分桶缓存上限 (字节), 与任务实际使用的上限一致"""
+    return grid_divider.memory_limit_bytes(params.get('memory_limit_mb'))
+
+
+def measured_memory_mb(metrics, workers=1):
+    """任务实测的峰值内存 (MB): 阶段峰值 - 任务开始时的内存 + 子进程峰值 × 并行数
+
+    只有各阶段的峰值能单独统计 (Linux) 时返回, 否则返回 None
+    """
+    start = metrics.begin.get('rss_mb')
+    stages = [s for s in metrics.stages if s['peak_rss_mb'] is not None]
+    if start is None or not stages or any(s['peak_rss_scope'] != 'stage' for s in stages):
+        return None
+    own = max(s['peak_rss_mb'] for s in stages) - start
+    children = max(s['children_peak_rss_mb'] or 0 for s in stages)
+    return max(0.0, own) + children * workers
+
+
+class MemoryModel:
+    """任务内存估算模型
+
+    估算在提交任务时 (图形界面线程中) 调用, 只直接解析文件头, 不调用 pdal/lasinfo
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_cache_dir(), 'memory_model.json')
+        self.factors = self.load()
+
+    def load(self):
+        """读取修正系数, 不存在或损坏时全部为 1"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"内存模型读取失败, 使用默认系数: {e}")
+            return {}
+        if data.get('version') != MODEL_VERSION:
+            return {}
+        return data.get('factors', {})
+
+    def save(self):
+        """原子写入修正系数"""
+        temp_path = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump({'version': MODEL_VERSION, 'factors': self.factors}, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"内存模型保存失败: {e}")
+
+    def factor(self, task_type):
+        return self.factors.get(task_type, {}).get('factor', 1.0)
+
+    def estimate(self, task_type, params):
+        """修正后的峰值内存估算 (MB), 无法读取输入时返回 None"""
+        raw = self.raw_estimate(task_type, params)
+        if raw is None:
+            return None
+        return raw * self.factor(task_type)
+
+    def learn(self, task_type, params, measured_mb):
+        """用实测峰值内存修正该任务类型的系数, 返回新系数 (未修正时返回 None)"""
+        raw = self.raw_estimate(task_type, params)
+        if measured_mb is None or raw is None or raw < MIN_LEARN_MB:
+            return None
+        entry = self.factors.setdefault(task_type, {'factor': 1.0, 'runs': 0})
+        ratio = max(MIN_FACTOR, min(MAX_FACTOR, measured_mb / raw))
+        entry['factor'] = round(entry['factor'] * (1 - LEARNING_RATE) + ratio * LEARNING_RATE, 4)
+        entry['runs'] += 1
+        self.save()
+        return entry['factor']
+
+    # 各任务类型的估算 (MB), 系数来自对合成数据的实测
+
+    def raw_estimate(self, task_type, params):
+        """未修正的峰值内存估算 (MB), 无法读取输入时返回 None"""
+        try:
+            if task_type == 'las2pcd':
+                return self.las2pcd_estimate(params['input_file'], params.get('engine', 'native'),
+                                             params.get('encoding', 'binary'),
+                                             params.get('workers') or default_workers())
+            if task_type == 'enhance':
+                return self.enhance_estimate(params)
+            if task_type == 'divide':
+                return self.divide_estimate(params)
+            if task_type == 'pipeline':
+                return self.pipeline_estimate(params)
+            if task_type == 'batch':
+                return self.batch_estimate(params)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def las_size(self, las_file):
+        """(点数, 点记录字节数); 文件头无法解析时按文件大小和格式 3 的记录长度估算"""
+        try:
+            header = las_io.read_las_header(las_file)
+        except ValueError:
+            record_length = las_io.POINT_FORMATS[3][0]
+            return os.path.getsize(las_file) // record_length, record_length
+        return int(header['point_count']), header['record_length']
+
+    def las2pcd_estimate(self, las_file, engine, encoding, workers=1):
+        points, record_length = self.las_size(las_file)
+        if engine == 'external':
+            return points * EXTERNAL_POINT_BYTES / MB + CHUNK_OVERHEAD_MB
+        # 内置引擎逐块转换, 输入以内存映射方式读取 (读过的页计入常驻内存)
+        total = points * record_length
+        if workers > 1 and points > las_io.DEFAULT_CHUNK_POINTS:
+            # 并行转换: 每个进程只映射自己的切片, 主进程只读取第一块
+            slice_points = max(las_io.DEFAULT_CHUNK_POINTS,
+                               -(-points // (workers * las_io.SLICES_PER_WORKER)))
+            workers = min(workers, -(-points // slice_points))
+            total = (workers * slice_points + las_io.DEFAULT_CHUNK_POINTS) * record_length
+            total += workers * (CHUNK_OVERHEAD_MB + PROCESS_OVERHEAD_MB) * MB
+        if encoding == 'binary_compressed':
+            total += points * PCD_POINT_BYTES * COMPRESSED_FACTOR
+        return total / MB + CHUNK_OVERHEAD_MB
+
+    def enhance_estimate(self, params):
+        header = pcd_io.read_header(params['input_file'])
+        points = header['points']
+        if params.get('engine', 'native') == 'external':
+            return points * EXTERNAL_POINT_BYTES / MB + CHUNK_OVERHEAD_MB
+        data_bytes = points * sum(size * count for size, count in zip(header['sizes'], header['counts']))
+        compressed = header['data'] == 'binary_compressed' or params.get('encoding') == 'binary_compressed'
+        return data_bytes * (COMPRESSED_FACTOR if compressed else 1.0) / MB + CHUNK_OVERHEAD_MB
+
+    def divide_estimate(self, params):
+        points = sum(pcd_io.read_header(path)['points'] for path in params['input_files'])
+        if params.get('engine', 'native') == 'external':
+            return points * EXTERNAL_POINT_BYTES / MB + CHUNK_OVERHEAD_MB
+        if params.get('merge_pcds') and params.get('leaf_size', 0) <= 0:
+            # 直接合并: 拼接或逐块重新编码
+            if params.get('encoding') == 'binary_compressed':
+                return points * PCD_POINT_BYTES * COMPRESSED_FACTOR / MB + CHUNK_OVERHEAD_MB
+            return CHUNK_OVERHEAD_MB
+        # 分桶缓存超过上限时落盘, 内存不超过上限
+        binned = min(points * PCD_POINT_BYTES * 3, binning_limit(params) * 1.25)
+        return binned / MB + CHUNK_OVERHEAD_MB
+
+    def pipeline_estimate(self, params):
+        las_file = params['input_file']
+        points, record_length = self.las_size(las_file)
+        encoding = params.get('encoding', 'binary')
+        binned = min(points * PCD_POINT_BYTES * 2, binning_limit(params) * 1.25)
+        if params.get('fused', True) and params.get('engine', 'native') == 'native':
+            return (points * record_length + binned) / MB + CHUNK_OVERHEAD_MB
+        # 两阶段流程: 转换和分割先后进行, 取较大者
+        engine = params.get('engine', 'native')
+        divide = (points * EXTERNAL_POINT_BYTES if engine == 'external' else binned) / MB
+        return max(self.las2pcd_estimate(las_file, engine, encoding, params.get('workers') or default_workers()),
+                   divide + CHUNK_OVERHEAD_MB)
+
+    def batch_estimate(self, params):
+        tasks = params['tasks']
+        if not tasks:
+            return 0.0
+        # 同时运行 workers 个文件, 按最大的几个文件估算; 内置引擎每个文件在独立进程中运行
+        estimates = sorted((self.las2pcd_estimate(task['input_file'], task.get('engine', 'native'),
+                                                  task.get('encoding', 'binary'))
+                            for task in tasks), reverse=True)
+        workers = min(params.get('workers') or default_workers(), len(tasks))
+        total = sum(estimates[:workers])
+        if workers > 1 and any(task.get('engine', 'native') == 'native' for task in tasks):
+            total += workers * PROCESS_OVERHEAD_MB
+        return total
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+任务阶段统计
+- 每个阶段记录开始/结束时间、耗时、CPU 时间 (本进程 + 已结束的子进程)、峰值内存、
+  读取/写入字节数 (输入/输出文件大小) 和处理点数
+- 阶段开始/结束时通过回调发出结构化事件 (dict)
+- 任务结束后生成汇总表和 JSON 报告
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_VERSION = 1
+
+# 汇总表各数值列的宽度 (耗时 ~ 点/秒)
+COLUMN_WIDTHS = (9, 9, 14, 10, 16, 10, 10, 14, 13)
+
+# 本进程中各任务进行中的阶段: 峰值内存是整个进程的, 其他任务的阶段进行中时不能重置,
+# 与其他任务重叠的阶段, 峰值只能记为进程范围
+_stages_lock = threading.Lock()
+_running_stages = {}   # id(JobMetrics) → 进行中的阶段记录列表
+
+
+def _pad(text, width, left=False):
+    """按显示宽度补齐 (中文字符占两列)"""
+    text = str(text)
+    display = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    padding = ' ' * max(0, width - display)
+    return text + padding if left else padding + text
+
+
+def _read_vm_status(key):
+    """读取 /proc/self/status 中的内存项 (MB), 不可用时返回 None"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _read_vm_hwm():
+    """本进程的峰值常驻内存 (MB, VmHWM), 不可用时返回 None"""
+    return _read_vm_status('VmHWM')
+
+
+def _reset_vm_hwm():
+    """重置本进程的峰值内存统计 (Linux clear_refs), 返回是否成功"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _enter_stage(metrics, record):
+    """登记进行中的阶段; 没有其他任务的阶段进行中时重置峰值内存统计, 返回是否已重置"""
+    with _stages_lock:
+        others = [other for key, records in _running_stages.items() if key != id(metrics)
+                  for other in records]
+        for other in others:
+            other['_overlapped'] = True
+        if others:
+            record['_overlapped'] = True
+        _running_stages.setdefault(id(metrics), []).append(record)
+        return not others and _reset_vm_hwm()
+
+
+def _leave_stage(metrics, record):
+    with _stages_lock:
+        records = [other for other in _running_stages.get(id(metrics), []) if other is not record]
+        _running_stages[id(metrics)] = records
+        if not records:
+            _running_stages.pop(id(metrics), None)
+
+
+def _maxrss_mb(who):
+    # ru_maxrss 在 Linux 上单位为 KB, macOS 上为字节
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def resource_snapshot():
+    """当前的时间和资源使用量"""
+    snapshot = {'time': time.time(), 'clock': time.perf_counter(), 'rss_mb': _read_vm_status('VmRSS'),
+                'cpu_self': None, 'cpu_children': None, 'children_rss_mb': None}
+    if resource is not None:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        snapshot['cpu_self'] = own.ru_utime + own.ru_stime
+        snapshot['cpu_children'] = children.ru_utime + children.ru_stime
+        snapshot['children_rss_mb'] = _maxrss_mb(resource.RUSAGE_CHILDREN)
+    return snapshot
+
+
+def files_size(paths):
+    """文件总大小 (字节), 不存在的文件忽略"""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def _delta(end, begin, key):
+    if end[key] is None or begin[key] is None:
+        return None
+    return round(end[key] - begin[key], 3)
+
+
+def measure(begin, end):
+    """两次快照之间的耗时和 CPU 时间"""
+    return {
+        'started_at': round(begin['time'], 3),
+        'finished_at': round(end['time'], 3),
+        'wall_seconds': round(end['clock'] - begin['clock'], 3),
+        'cpu_seconds': _delta(end, begin, 'cpu_self'),
+        'children_cpu_seconds': _delta(end, begin, 'cpu_children'),
+    }
+
+
+class JobMetrics:
+    """一次任务的阶段统计
+
+    with metrics.stage('las2pcd', inputs=[...], outputs=[...]):
+        ...
+        metrics.update(points=n)    # 补充当前阶段的字段
+    """
+
+    def __init__(self, task_type, emit=None):
+        self.task_type = task_type
+        self.emit = emit or (lambda event: None)
+        self.stages = []
+        self.active = []
+        self.begin = resource_snapshot()
+        self.end = None
+
+    @contextmanager
+    def stage(self, name, inputs=(), outputs=(), **fields):
+        """统计一个阶段; 阶段内抛出异常时记为失败并继续抛出"""
+        record = {'stage': name, 'status': 'ok', 'points': None,
+                  'inputs': list(inputs), 'outputs': list(outputs)}
+        record.update(fields)
+        self.emit({'event': 'stage_start', 'task': self.task_type, 'stage': name,
+                   'time': round(time.time(), 3)})
+
+        # 峰值内存: 能重置 (且没有其他任务同时运行) 时为本阶段的峰值, 否则为进程范围的峰值
+        hwm_reset = _enter_stage(self, record)
+        begin = resource_snapshot()
+        self.active.append(record)
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            end = resource_snapshot()
+            self.active.pop()
+            _leave_stage(self, record)
+            self.finish_stage(record, begin, end, hwm_reset)
+
+    def update(self, **fields):
+        """补充当前阶段的字段 (点数、输出文件、引擎等), 不在阶段中时忽略"""
+        if self.active:
+            self.active[-1].update(fields)
+
+    def finish_stage(self, record, begin, end, hwm_reset):
+        record.update(measure(begin, end))
+        peak = _read_vm_hwm()
+        if peak is None and resource is not None:
+            peak = _maxrss_mb(resource.RUSAGE_SELF)
+        record['peak_rss_mb'] = round(peak, 1) if peak is not None else None
+        # 与其他任务重叠的阶段, 峰值包含其他任务的内存 (或已被其他任务重置), 不用于修正内存估算
+        overlapped = record.pop('_overlapped', False)
+        record['peak_rss_scope'] = 'stage' if hwm_reset and not overlapped else 'process'
+        # 子进程峰值只能取所有已结束子进程的最大值, 本阶段没有刷新时为 None
+        children_rss = end['children_rss_mb']
+        record['children_peak_rss_mb'] = (round(children_rss, 1) if children_rss is not None
+                                          and children_rss > (begin['children_rss_mb'] or 0) else None)
+
+        inputs = [path for path in record.pop('inputs') if path]
+        outputs = [path for path in record.pop('outputs') if path]
+        record['bytes_read'] = files_size(inputs)
+        record['bytes_written'] = files_size(outputs)
+        record['files_read'] = len(inputs)
+        record['files_written'] = len(outputs)
+        seconds = record['wall_seconds']
+        record['points_per_sec'] = (round(record['points'] / seconds) if record['status'] == 'ok'
+                                    and record['points'] and seconds > 0 else None)
+
+        self.stages.append(record)
+        event = {'event': 'stage_end', 'task': self.task_type}
+        event.update(record)
+        self.emit(event)
+
+    def close(self):
+        """任务结束"""
+        self.end = resource_snapshot()
+
+    def totals(self):
+        end = self.end or resource_snapshot()
+        totals = measure(self.begin, end)
+        totals['bytes_read'] = sum(s['bytes_read'] for s in self.stages)
+        totals['bytes_written'] = sum(s['bytes_written'] for s in self.stages)
+        peaks = [s['peak_rss_mb'] for s in self.stages if s['peak_rss_mb'] is not None]
+        totals['peak_rss_mb'] = max(peaks) if peaks else None
+        children = [s['children_peak_rss_mb'] for s in self.stages if s['children_peak_rss_mb'] is not None]
+        totals['children_peak_rss_mb'] = max(children) if children else None
+        rss = self.begin['rss_mb']
+        totals['start_rss_mb'] = round(rss, 1) if rss is not None else None
+        return totals
+
+    def report(self, params=None, success=None, message=None):
+        """JSON 报告内容"""
+        return {
+            'version': REPORT_VERSION,
+            'task': self.task_type,
+            'success': success,
+            'message': message,
+            'params': params,
+            'total': self.totals(),
+            'stages': self.stages,
+        }
+
+    def write_report(self, path, params=None, success=None, message=None):
+        """写出 JSON 报告, 失败时返回 False"""
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.report(params, success, message), f, indent=2,
+                          ensure_ascii=False, default=str)
+        except OSError as e:
+            print(f"任务报告保存失败: {e}")
+            return False
+        return True
+
+    def summary_lines(self):
+        """阶段汇总表 (每行一个字符串)"""
+        def number(value, fmt):
+            return format(value, fmt) if value is not None else '-'
+
+        def mb(value):
+            return number(value / (1024 * 1024) if value else None, '.1f')
+
+        def row(*cells):
+            return (_pad(cells[0], 16, left=True) + ''.join(
+                _pad(cell, width) for cell, width in zip(cells[1:], COLUMN_WIDTHS))).rstrip()
+
+        lines = [row('阶段', '耗时(s)', 'CPU(s)', '子进程CPU(s)', '内存(MB)', '子进程内存(MB)',
+                     '读取(MB)', '写入(MB)', '点数', '点/秒')]
+        for s in self.stages:
+            lines.append(row(
+                s['stage'] if s['status'] == 'ok' else f"{s['stage']} ({s['status']})",
+                f"{s['wall_seconds']:.2f}", number(s['cpu_seconds'], '.2f'),
+                number(s['children_cpu_seconds'], '.2f'), number(s['peak_rss_mb'], '.0f'),
+                number(s['children_peak_rss_mb'], '.0f'), mb(s['bytes_read']), mb(s['bytes_written']),
+                number(s['points'], ','), number(s['points_per_sec'], ',')))
+
+        t = self.totals()
+        lines.append(row(
+            '合计', f"{t['wall_seconds']:.2f}", number(t['cpu_seconds'], '.2f'),
+            number(t['children_cpu_seconds'], '.2f'), number(t['peak_rss_mb'], '.0f'),
+            number(t['children_peak_rss_mb'], '.0f'), mb(t['bytes_read']), mb(t['bytes_written']),
+            '', ''))
+        return lines
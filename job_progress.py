@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+任务进度 (百分比、吞吐量、剩余时间)
+内置引擎按块/按网格/按文件回调 advance(phase, done, total, unit),
+ProgressMeter 计算当前阶段的百分比、吞吐量和剩余时间, 节流后以 dict 发出
+"""
+
+import time
+
+# 进度单位的显示名称
+UNIT_LABELS = {
+    'points': '点',
+    'tiles': '网格',
+    'files': '文件',
+    'bytes': 'MB',
+}
+
+# 两次进度回调之间的最小间隔 (秒), 阶段完成时总会发出
+EMIT_INTERVAL = 0.2
+
+
+def format_duration(seconds):
+    """秒数 → H:MM:SS / M:SS"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_rate(rate, unit):
+    """吞吐量文本, 如 1.25M 点/s, 85.3 MB/s"""
+    label = UNIT_LABELS.get(unit, unit)
+    if unit == 'bytes':
+        return f"{rate / (1024 * 1024):.1f} {label}/s"
+    if rate >= 1e6:
+        return f"{rate / 1e6:.2f}M {label}/s"
+    if rate >= 1e4:
+        return f"{rate / 1e3:.1f}k {label}/s"
+    return f"{rate:.1f} {label}/s"
+
+
+def format_progress(state):
+    """进度文本, 如 "写出网格 45% · 12.0 网格/s · 剩余 3:20" """
+    parts = [f"{state['phase']} {state['percent']:.0f}%"]
+    if state['rate']:
+        parts.append(format_rate(state['rate'], state['unit']))
+    if state['eta'] is not None and state['done'] < state['total']:
+        parts.append(f"剩余 {format_duration(state['eta'])}")
+    return ' · '.join(parts)
+
+
+class ProgressMeter:
+    """可作为 advance 回调: meter(phase, done, total, unit)
+
+    阶段名变化时重新计时; 吞吐量为该阶段第一次回调以来的平均值
+    (第一次回调时已完成的部分耗时未知, 不计入)
+    """
+
+    def __init__(self, emit, interval=EMIT_INTERVAL):
+        self.emit = emit
+        self.interval = interval
+        self.phase = None
+        self.started = 0.0
+        self.base = 0
+        self.last_emit = 0.0
+
+    def __call__(self, phase, done, total, unit='points'):
+        now = time.monotonic()
+        if phase != self.phase:
+            self.phase = phase
+            self.started = now
+            self.base = done
+            self.last_emit = 0.0
+        finished = done >= total
+        if not finished and now - self.last_emit < self.interval:
+            return
+        self.last_emit = now
+
+        elapsed = now - self.started
+        rate = (done - self.base) / elapsed if done > self.base and elapsed > 0 else None
+        eta = (total - done) / rate if rate else None
+        self.emit({
+            'phase': phase,
+            'done': done,
+            'total': total,
+            'unit': unit,
+            'percent': round(min(100.0, done * 100.0 / total), 2) if total else 100.0,
+            'elapsed': round(elapsed, 3),
+            'rate': round(rate, 1) if rate else None,
+            'eta': round(eta, 1) if eta is not None else None,
+        })
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+任务队列与调度
+- 任务按优先级 (高的先运行) 和提交顺序排队
+- 每个任务占用若干 CPU 槽位和磁盘槽位, 槽位不足时等待, 不同选项卡的任务可以同时运行
+- 设置内存预算时, 按 job_memory 估算的峰值内存准入, 估算总量不超过预算
+- 记录排队 / 运行 / 结束时间, 供任务面板显示
+不依赖 Qt: 由 launch 回调启动任务, 任务结束时调用 job_finished; 所有方法在同一线程 (界面线程) 中调用
+"""
+
+import time
+import heapq
+import itertools
+
+from pointcloud_jobs import JobSignal, default_workers
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+STATE_LABELS = {
+    QUEUED: '排队中',
+    RUNNING: '运行中',
+    FINISHED: '完成',
+    FAILED: '失败',
+    CANCELLED: '已取消',
+}
+
+TASK_LABELS = {
+    'las2pcd': 'LAS → PCD',
+    'divide': '点云分割',
+    'enhance': 'PCD 增强',
+    'batch': '批量处理',
+    'pipeline': '一键流程',
+}
+
+PRIORITY_LOW = -1
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+
+PRIORITY_LABELS = {
+    PRIORITY_LOW: '低',
+    PRIORITY_NORMAL: '普通',
+    PRIORITY_HIGH: '高',
+}
+
+# 默认的磁盘槽位数: 同时运行的大量读写任务 (分割 / 批量 / 一键流程)
+DEFAULT_DISK_SLOTS = 2
+
+# 写出大量网格文件或同时读取多个文件的任务, 占用一个磁盘槽位
+DISK_HEAVY_TASKS = ('divide', 'batch', 'pipeline')
+
+# 使用 workers 参数并行的任务, 按并行数占用 CPU 槽位
+PARALLEL_TASKS = ('las2pcd', 'divide', 'batch', 'pipeline')
+
+
+def job_resources(task_type, params):
+    """任务占用的槽位 {'cpu': n, 'disk': n}"""
+    cpu = 1
+    if task_type in PARALLEL_TASKS:
+        cpu = params.get('workers') or default_workers()
+    return {'cpu': cpu, 'disk': 1 if task_type in DISK_HEAVY_TASKS else 0}
+
+
+def job_description(task_type, params):
+    """任务面板中显示的输入文件说明"""
+    if task_type == 'batch':
+        return f"{len(params.get('tasks', []))} 个文件 → {params.get('output_dir', '')}"
+    if 'input_files' in params:
+        files = params['input_files']
+        name = files[0] if len(files) == 1 else f"{len(files)} 个文件"
+        return f"{name} → {params.get('output_dir', '')}"
+    return f"{params.get('input_file', '')} → {params.get('output_file') or params.get('output_dir', '')}"
+
+
+class ScheduledJob:
+    """队列中的一个任务"""
+
+    def __init__(self, job_id, task_type, params, priority, resources, tag=None):
+        self.job_id = job_id
+        self.task_type = task_type
+        self.params = params
+        self.priority = priority
+        self.resources = resources
+        # 启动时实际占用的槽位 / 内存 (结束时按此释放, 运行期间修改上限不影响释放量)
+        self.acquired = None
+        self.tag = tag
+        self.state = QUEUED
+        self.message = ''
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # launch 返回的运行句柄 (需要 cancel 方法)
+        self.handle = None
+        self.cancel_requested = False
+        # 运行期间是否有其他任务同时运行 (此时实测内存不能归到单个任务)
+        self.overlapped = False
+
+    @property
+    def label(self):
+        return TASK_LABELS.get(self.task_type, self.task_type)
+
+    @property
+    def description(self):
+        return job_description(self.task_type, self.params)
+
+    @property
+    def done(self):
+        return self.state in (FINISHED, FAILED, CANCELLED)
+
+    def wait_seconds(self, now=None):
+        """排队等待时间"""
+        end = self.started_at or self.finished_at or now or time.time()
+        return end - self.submitted_at
+
+    def run_seconds(self, now=None):
+        """运行时间, 未开始时返回 None"""
+        if self.started_at is None:
+            return None
+        return (self.finished_at or now or time.time()) - self.started_at
+
+
+class JobScheduler:
+    """任务调度器
+
+    launch(job) 启动任务并返回带 cancel() 方法的句柄; 任务结束后调用 job_finished(job, success, message)
+    changed.emit(job) 在任务状态变化时发出
+    memory_model 为 job_memory.MemoryModel, memory_budget 为内存预算 (MB, None 表示不限制)
+    one_per_type 为 True 时同一类型的任务同时只运行一个 (图形界面每个选项卡只有一个日志和进度条)
+    """
+
+    def __init__(self, launch, cpu_slots=None, disk_slots=DEFAULT_DISK_SLOTS, memory_budget=None,
+                 memory_model=None, one_per_type=False):
+        self.launch = launch
+        self.memory_model = memory_model
+        self.one_per_type = one_per_type
+        self.limits = {'cpu': cpu_slots or default_workers(), 'disk': disk_slots, 'memory': memory_budget}
+        self.used = {'cpu': 0, 'disk': 0, 'memory': 0}
+        self.queue = []
+        self.jobs = []
+        self.counter = itertools.count(1)
+        self.changed = JobSignal()
+
+    def set_limits(self, cpu_slots=None, disk_slots=None, memory_budget=None):
+        """修改槽位数 / 内存预算 (MB, 0 表示不限制), 放宽后立即启动可以运行的任务"""
+        if cpu_slots is not None:
+            self.limits['cpu'] = max(1, cpu_slots)
+        if disk_slots is not None:
+            self.limits['disk'] = max(1, disk_slots)
+        if memory_budget is not None:
+            self.limits['memory'] = memory_budget or None
+        self.schedule()
+
+    def submit(self, task_type, params, priority=PRIORITY_NORMAL, tag=None):
+        """加入队列, 有空闲槽位时立即启动; 返回 ScheduledJob"""
+        job_id = next(self.counter)
+        resources = job_resources(task_type, params)
+        if self.memory_model is not None:
+            # 无法读取输入文件头时按 0 计算, 由任务自己报告错误
+            resources['memory'] = round(self.memory_model.estimate(task_type, params) or 0)
+        job = ScheduledJob(job_id, task_type, params, priority, resources, tag)
+        self.jobs.append(job)
+        heapq.heappush(self.queue, (-priority, job_id, job))
+        self.changed.emit(job)
+        self.schedule()
+        return job
+
+    def queued(self):
+        """排队中的任务 (按运行顺序)"""
+        return [entry[2] for entry in sorted(self.queue)]
+
+    def running(self):
+        return [job for job in self.jobs if job.state == RUNNING]
+
+    def queue_position(self, job):
+        """排队位置 (从 1 开始), 不在队列中时返回 None"""
+        for position, queued in enumerate(self.queued(), 1):
+            if queued is job:
+                return position
+        return None
+
+    def demand(self, job):
+        # 超过槽位总数 / 内存预算的任务按总数计算 (在没有其他任务时单独运行), 否则永远无法启动
+        return {name: count if self.limits[name] is None else min(count, self.limits[name])
+                for name, count in job.resources.items()}
+
+    def fits(self, job):
+        return all(self.limits[name] is None or self.used[name] + count <= self.limits[name]
+                   for name, count in self.demand(job).items())
+
+    def over_budget(self, job):
+        """任务的估算内存是否超过内存预算 (只能单独运行)"""
+        budget = self.limits['memory']
+        return budget is not None and job.resources.get('memory', 0) > budget
+
+    def type_busy(self, job):
+        """one_per_type 时是否已有同类型的任务在运行"""
+        return self.one_per_type and any(other.task_type == job.task_type for other in self.running())
+
+    def waiting_for(self, job):
+        """排队中的任务在等待的资源名称 (cpu / disk / memory / task), 不缺资源时返回空列表"""
+        waiting = ['task'] if self.type_busy(job) else []
+        return waiting + [name for name, count in self.demand(job).items()
+                          if self.limits[name] is not None and self.used[name] + count > self.limits[name]]
+
+    def next_job(self):
+        """下一个可以启动的任务: 跳过同类型任务在运行的任务 (它们不占资源, 不阻塞后面的任务);
+        第一个槽位不足的任务之后的任务也等待, 避免大任务一直被插队"""
+        for job in self.queued():
+            if self.type_busy(job):
+                continue
+            return job if self.fits(job) else None
+        return None
+
+    def schedule(self):
+        """按优先级启动可以运行的任务"""
+        while True:
+            job = self.next_job()
+            if job is None:
+                return
+            self.queue = [entry for entry in self.queue if entry[2] is not job]
+            heapq.heapify(self.queue)
+            job.acquired = self.demand(job)
+            for name, count in job.acquired.items():
+                self.used[name] += count
+            running = self.running()
+            if running:
+                job.overlapped = True
+                for other in running:
+                    other.overlapped = True
+            job.state = RUNNING
+            job.started_at = time.time()
+            self.changed.emit(job)
+            try:
+                job.handle = self.launch(job)
+            except Exception as e:
+                self.job_finished(job, False, f"任务启动失败: {e}")
+
+    def job_finished(self, job, success, message):
+        """任务结束: 释放槽位并启动等待中的任务"""
+        if job.state != RUNNING:
+            return
+        for name, count in job.acquired.items():
+            self.used[name] -= count
+        job.acquired = None
+        if success:
+            job.state = FINISHED
+        else:
+            job.state = CANCELLED if job.cancel_requested else FAILED
+        job.message = message
+        job.finished_at = time.time()
+        job.handle = None
+        self.changed.emit(job)
+        self.schedule()
+
+    def cancel(self, job):
+        """取消任务: 排队中的直接移出队列, 运行中的结束其子进程 (结果由 job_finished 报告)"""
+        if job.state == QUEUED:
+            self.queue = [entry for entry in self.queue if entry[2] is not job]
+            heapq.heapify(self.queue)
+            job.state = CANCELLED
+            job.message = "已从队列中移除"
+            job.finished_at = time.time()
+            self.changed.emit(job)
+            self.schedule()
+            return True
+        if job.state == RUNNING and job.handle is not None:
+            job.cancel_requested = True
+            job.handle.cancel()
+            return True
+        return False
+
+    def cancel_all(self):
+        """取消全部排队和运行中的任务"""
+        for job in self.queued():
+            self.cancel(job)
+        for job in self.running():
+            self.cancel(job)
+
+    def set_priority(self, job, priority):
+        """修改排队中任务的优先级"""
+        if job.state != QUEUED:
+            return False
+        job.priority = priority
+        self.queue = [(-j.priority, j.job_id, j) for _, _, j in self.queue]
+        heapq.heapify(self.queue)
+        self.changed.emit(job)
+        self.schedule()
+        return True
+
+    def clear_finished(self):
+        """从列表中移除已结束的任务"""
+        self.jobs = [job for job in self.jobs if not job.done]
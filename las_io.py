@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+LAS 文件读取与内置 LAS→PCD 转换引擎
+- 使用 struct 解析 LAS 公共文件头
+- 使用 NumPy 内存映射按块读取点记录 (点格式 0-3, 6-8)
+- 向量化地应用 scale/offset/原点, 写出 PointXYZRGB / PointXYZI PCD
+- 大文件可按点范围切片, 由多个进程并行转换后拼接为一个 PCD
+"""
+
+import os
+import struct
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时只能使用外部 las2pcd 程序
+    np = None
+
+import pcd_io
+import process_runner
+
+# 内置引擎是否可用
+NATIVE_AVAILABLE = np is not None
+
+# 每块处理的点数 (2M 点, 单块工作内存约 100 MB)
+DEFAULT_CHUNK_POINTS = 2 * 1024 * 1024
+
+# 并行转换时每个进程的切片数, 切片越多进度越平滑
+SLICES_PER_WORKER = 4
+
+# 点格式 → (最小记录长度, RGB 字段偏移); RGB 偏移为 None 表示不含颜色
+POINT_FORMATS = {
+    0: (20, None),
+    1: (28, None),
+    2: (26, 20),
+    3: (34, 28),
+    6: (30, None),
+    7: (36, 30),
+    8: (38, 30),
+}
+
+
+class UnsupportedLASError(ValueError):
+    """内置引擎无法处理的 LAS 文件 (压缩/未知点格式等), 调用方应回退到外部程序"""
+
+
+def _read_string(raw):
+    """解码文件头中以 \\0 填充的定长字符串"""
+    return raw.split(b'\0', 1)[0].decode('ascii', errors='replace').strip()
+
+
+def read_las_header(las_file):
+    """读取 LAS 公共文件头 (前 375 字节), 返回字段字典"""
+    with open(las_file, 'rb') as f:
+        raw = f.read(375)
+
+    if len(raw) < 227 or raw[:4] != b'LASF':
+        raise ValueError(f"不是有效的 LAS 文件: {las_file}")
+
+    version_major, version_minor = struct.unpack_from('<BB', raw, 24)
+    (header_size, point_offset, vlr_count, point_format,
+     record_length, legacy_count) = struct.unpack_from('<HIIBHI', raw, 94)
+    scale = struct.unpack_from('<3d', raw, 131)
+    offset = struct.unpack_from('<3d', raw, 155)
+    max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from('<6d', raw, 179)
+
+    # LAS 1.4 使用 64 位点数 (格式 6 以上的旧字段为 0)
+    point_count = legacy_count
+    if (version_major, version_minor) >= (1, 4) and len(raw) >= 255 and header_size >= 375:
+        count_64 = struct.unpack_from('<Q', raw, 247)[0]
+        if count_64:
+            point_count = count_64
+
+    return {
+        'version_major': version_major,
+        'version_minor': version_minor,
+        'system_id': _read_string(raw[26:58]),
+        'software_id': _read_string(raw[58:90]),
+        'header_size': header_size,
+        'point_offset': point_offset,
+        'vlr_count': vlr_count,
+        # 高两位被 LAZ 用作压缩标志
+        'point_format': point_format & 0x3F,
+        'compressed': bool(point_format & 0xC0),
+        'record_length': record_length,
+        'point_count': point_count,
+        'scale': scale,
+        'offset': offset,
+        'min': (min_x, min_y, min_z),
+        'max': (max_x, max_y, max_z),
+    }
+
+
+def read_las_metadata(las_file):
+    """读取 LAS 元数据, 返回与 pdal/lasinfo 读取结果相同结构的字典"""
+    header = read_las_header(las_file)
+    metadata = {
+        'point_count': header['point_count'],
+        'version': f"{header['version_major']}.{header['version_minor']}",
+        'point_format': header['point_format'],
+    }
+
+    for i, axis in enumerate('xyz'):
+        metadata[f'min_{axis}'] = header['min'][i]
+        metadata[f'max_{axis}'] = header['max'][i]
+        metadata[f'offset_{axis}'] = header['offset'][i]
+        metadata[f'scale_{axis}'] = header['scale'][i]
+
+    if header['software_id']:
+        metadata['software'] = header['software_id']
+    if header['system_id']:
+        metadata['system'] = header['system_id']
+
+    metadata['source'] = 'native'
+    return metadata
+
+
+def point_dtype(point_format, record_length):
+    """构造点记录的 NumPy 结构化 dtype (只映射转换所需字段)"""
+    if point_format not in POINT_FORMATS:
+        raise UnsupportedLASError(f"不支持的点格式: {point_format}")
+
+    min_length, rgb_offset = POINT_FORMATS[point_format]
+    if record_length < min_length:
+        raise UnsupportedLASError(
+            f"点记录长度 {record_length} 小于格式 {point_format} 的最小长度 {min_length}")
+
+    names = ['X', 'Y', 'Z', 'intensity']
+    formats = ['<i4', '<i4', '<i4', '<u2']
+    offsets = [0, 4, 8, 12]
+    if rgb_offset is not None:
+        names += ['red', 'green', 'blue']
+        formats += ['<u2', '<u2', '<u2']
+        offsets += [rgb_offset, rgb_offset + 2, rgb_offset + 4]
+
+    # itemsize 取文件中的记录长度, 自动跳过 extra bytes
+    return np.dtype({'names': names, 'formats': formats,
+                     'offsets': offsets, 'itemsize': record_length})
+
+
+def open_las_points(las_file, header=None):
+    """以只读内存映射方式打开点数据块, 返回 (header, memmap)"""
+    if np is None:
+        raise UnsupportedLASError("未安装 numpy, 无法使用内置引擎")
+
+    if header is None:
+        header = read_las_header(las_file)
+
+    if header['compressed']:
+        raise UnsupportedLASError("不支持压缩的 LAZ 文件")
+
+    dtype = point_dtype(header['point_format'], header['record_length'])
+    count = header['point_count']
+
+    available = (os.path.getsize(las_file) - header['point_offset']) // header['record_length']
+    if available < count:
+        raise ValueError(f"LAS 文件被截断: 文件头声明 {count} 个点, 实际只有 {available} 个")
+
+    if count == 0:
+        return header, np.empty(0, dtype=dtype)
+
+    points = np.memmap(las_file, dtype=dtype, mode='r',
+                       offset=header['point_offset'], shape=(count,))
+    return header, points
+
+
+def iter_las_chunks(points, chunk_points=DEFAULT_CHUNK_POINTS, start=0, stop=None):
+    """按块遍历点记录 (返回内存映射切片, 不复制整块数据)"""
+    if stop is None:
+        stop = len(points)
+    for begin in range(start, stop, chunk_points):
+        yield points[begin:min(begin + chunk_points, stop)]
+
+
+def default_origin(header, points, conversion_type):
+    """默认原点: RGB 模式使用文件头 Offset, 强度模式使用第一个点坐标"""
+    if conversion_type == 'rgb' or len(points) == 0:
+        return tuple(header['offset'])
+
+    first = points[0]
+    return tuple(int(first[axis]) * header['scale'][i] + header['offset'][i]
+                 for i, axis in enumerate(('X', 'Y', 'Z')))
+
+
+def rgb_shift(points):
+    """16 位颜色按规范缩放到 8 位; 若文件中颜色本身就是 8 位则不缩放"""
+    sample = points[:DEFAULT_CHUNK_POINTS]
+    if len(sample) == 0:
+        return 0
+    peak = max(int(sample['red'].max()), int(sample['green'].max()), int(sample['blue'].max()))
+    return 8 if peak > 255 else 0
+
+
+def las_chunk_coordinate(chunk, header, origin, axis):
+    """一块点记录某一轴 (0/1/2) 的 PCD 坐标 (float32)
+
+    先在 float64 下减去原点, 再降为 float32, 避免大坐标丢失精度
+    """
+    coords = chunk[('X', 'Y', 'Z')[axis]].astype(np.float64)
+    coords *= header['scale'][axis]
+    coords += header['offset'][axis] - origin[axis]
+    return coords.astype(np.float32)
+
+
+def las_chunk_to_pcd(chunk, header, origin, conversion_type, shift=8):
+    """将一块 LAS 点记录转换为 PCD 点记录 (向量化)"""
+    out = np.empty(len(chunk), dtype=pcd_io.point_dtype(conversion_type))
+
+    for axis, name in enumerate(('x', 'y', 'z')):
+        out[name] = las_chunk_coordinate(chunk, header, origin, axis)
+
+    if conversion_type == 'rgb':
+        if 'red' in chunk.dtype.names:
+            r = (chunk['red'] >> shift).astype(np.uint32) & 0xFF
+            g = (chunk['green'] >> shift).astype(np.uint32) & 0xFF
+            b = (chunk['blue'] >> shift).astype(np.uint32) & 0xFF
+            out['rgb'] = (r << 16) | (g << 8) | b
+        else:
+            out['rgb'] = 0
+    else:
+        out['intensity'] = chunk['intensity']
+
+    return out
+
+
+def convert_las_slice(task):
+    """进程池任务: 把点范围 [start, stop) 转换为独立的 PCD 分片, 返回点数"""
+    input_file, part_file, conversion_type, origin, shift, start, stop, encoding, chunk_points = task
+    header, points = open_las_points(input_file)
+    with pcd_io.PCDWriter(part_file, conversion_type, stop - start, encoding) as writer:
+        for chunk in iter_las_chunks(points, chunk_points, start, stop):
+            writer.write(las_chunk_to_pcd(chunk, header, origin, conversion_type, shift))
+    return stop - start
+
+
+def convert_las_to_pcd(input_file, output_file, conversion_type='rgb', origin=None,
+                       chunk_points=DEFAULT_CHUNK_POINTS, progress=None, encoding='binary',
+                       advance=None, workers=1, cancel=None):
+    """内置 LAS→PCD 转换, 返回写出的点数
+
+    conversion_type: 'rgb' 输出 PointXYZRGB, 'intensity' 输出 PointXYZI
+    origin: 自定义原点 (x0, y0, z0), 为 None 时使用默认原点
+    encoding: 输出 PCD 的 DATA 编码 (binary / binary_compressed / ascii)
+    progress: 日志回调, 接收一行文本
+    advance: 进度回调 advance(阶段, 已完成, 总数, 单位), 每块调用一次
+    workers: 并行进程数, 大于 1 且点数超过一块时按点范围切片并行转换
+    cancel: process_runner.CancelToken, 取消时结束进程池的工作进程
+    """
+    emit = progress or (lambda message: None)
+    step = advance or (lambda *args: None)
+
+    header, points = open_las_points(input_file)
+    count = len(points)
+
+    emit(f"LAS {header['version_major']}.{header['version_minor']}, "
+         f"点格式 {header['point_format']}, 点数 {count:,}")
+    emit(f"输出编码: {encoding}")
+
+    if conversion_type == 'rgb' and POINT_FORMATS[header['point_format']][1] is None:
+        emit(f"⚠️  点格式 {header['point_format']} 不含颜色, RGB 将全部为 0")
+
+    if origin is None:
+        origin = default_origin(header, points, conversion_type)
+    emit(f"the origin coordinate is x0 = {origin[0]:.2f}, y0 = {origin[1]:.2f}, z0 = {origin[2]:.2f}")
+
+    shift = rgb_shift(points) if 'red' in points.dtype.names else 0
+
+    if workers > 1 and count > chunk_points:
+        return convert_las_parallel(input_file, output_file, conversion_type, origin, shift, count,
+                                    chunk_points, emit, step, encoding, advance, workers, cancel)
+
+    written = 0
+    next_report = 0
+    with pcd_io.PCDWriter(output_file, conversion_type, count, encoding, advance) as writer:
+        for chunk in iter_las_chunks(points, chunk_points):
+            writer.write(las_chunk_to_pcd(chunk, header, origin, conversion_type, shift))
+            written += len(chunk)
+            step('LAS→PCD', written, count, 'points')
+
+            percent = written * 100 // count
+            if percent >= next_report:
+                emit(f"已转换 {written:,} / {count:,} 点 ({percent}%)")
+                next_report = percent + 10
+
+    return written
+
+
+def convert_las_parallel(input_file, output_file, conversion_type, origin, shift, count,
+                         chunk_points, emit, step, encoding, advance, workers, cancel):
+    """按点范围切片, 每片在独立进程中转换为 PCD 分片 (原点和颜色缩放相同), 再拼接为一个文件
+
+    binary / ascii: 写一个文件头后由内核直接拼接各分片的数据段 (不重新解析);
+    binary_compressed 无法拼接, 分片按 binary 写出后读回并整体压缩
+    """
+    slice_points = max(chunk_points, -(-count // (workers * SLICES_PER_WORKER)))
+    part_encoding = 'ascii' if encoding == 'ascii' else 'binary'
+    ranges = [(start, min(start + slice_points, count)) for start in range(0, count, slice_points)]
+    part_files = [f"{output_file}.part{idx}" for idx in range(len(ranges))]
+    tasks = [(input_file, part_file, conversion_type, origin, shift, start, stop, part_encoding, chunk_points)
+             for part_file, (start, stop) in zip(part_files, ranges)]
+    workers = min(workers, len(tasks))
+    emit(f"并行转换: {len(tasks)} 个切片, {workers} 个进程")
+
+    try:
+        written = 0
+        next_report = 0
+        # 调用方可能在 GUI 的后台线程中, 使用 spawn 避免 fork 后死锁
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(convert_las_slice, task) for task in tasks]
+            with process_runner.pool_tracking(cancel, executor):
+                for future in as_completed(futures):
+                    written += future.result()
+                    step('LAS→PCD', written, count, 'points')
+
+                    percent = written * 100 // count
+                    if percent >= next_report:
+                        emit(f"已转换 {written:,} / {count:,} 点 ({percent}%)")
+                        next_report = percent + 10
+
+        emit(f"拼接 {len(part_files)} 个分片...")
+        if encoding == 'binary_compressed':
+            with pcd_io.PCDWriter(output_file, conversion_type, count, encoding, advance) as writer:
+                for part_file in part_files:
+                    for chunk in pcd_io.iter_point_chunks(part_file, conversion_type, chunk_points):
+                        writer.write(chunk)
+        else:
+            pcd_io.concat_pcd_data(part_files, output_file, conversion_type, count, encoding)
+    finally:
+        for part_file in part_files:
+            if os.path.exists(part_file):
+                os.remove(part_file)
+
+    return written
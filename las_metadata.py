@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+LAS 元数据读取 (不依赖 Qt, 供图形界面和命令行共用)
+优先直接解析文件头, 备用 pdal 和 lasinfo; 外部工具的结果可以写入 MetadataCache
+"""
+
+import re
+import json
+import subprocess
+
+import las_io
+
+
+def read_metadata(las_file, cache=None):
+    """读取LAS文件元数据 - 优先直接解析文件头,备用pdal和lasinfo
+
+    cache: MetadataCache, 为 None 时不缓存外部工具的结果
+    """
+
+    # 方法1: 直接解析 LAS 文件头 (无需外部工具, 亚毫秒级)
+    metadata = read_metadata_native(las_file)
+    if metadata and len(metadata) > 0:
+        return metadata
+
+    # 外部工具较慢, 结果按 (路径, 大小, 修改时间) 缓存
+    if cache is not None:
+        metadata = cache.get(las_file)
+        if metadata:
+            return metadata
+
+    # 方法2: 尝试使用 pdal (JSON格式)
+    metadata = read_metadata_pdal(las_file)
+    if not metadata:
+        # 方法3: 回退到 lasinfo
+        metadata = read_metadata_lasinfo(las_file)
+
+    if metadata and len(metadata) > 0:
+        if cache is not None:
+            cache.put(las_file, metadata)
+        return metadata
+
+    return None
+
+
+def read_metadata_native(las_file):
+    """直接解析 LAS 公共文件头读取元数据"""
+    try:
+        return las_io.read_las_metadata(las_file)
+    except Exception as e:
+        print(f"LAS 文件头解析失败: {e}")
+        return None
+
+
+def read_metadata_pdal(las_file):
+    """使用 pdal 读取 LAS 元数据"""
+    try:
+        result = subprocess.run(
+            ['pdal', 'info', '--metadata', las_file],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=30
+        )
+
+        if result.returncode != 0:
+            return None
+
+        # 解析 JSON 输出
+        data = json.loads(result.stdout)
+
+        # 提取 metadata 部分
+        if 'metadata' not in data:
+            return None
+
+        meta = data['metadata']
+        metadata = {}
+
+        # 提取各项信息
+        if 'count' in meta:
+            metadata['point_count'] = int(meta['count'])
+
+        # 提取版本
+        if 'major_version' in meta and 'minor_version' in meta:
+            metadata['version'] = f"{meta['major_version']}.{meta['minor_version']}"
+
+        # 提取边界
+        if 'minx' in meta:
+            metadata['min_x'] = float(meta['minx'])
+            metadata['min_y'] = float(meta['miny'])
+            metadata['min_z'] = float(meta['minz'])
+
+        if 'maxx' in meta:
+            metadata['max_x'] = float(meta['maxx'])
+            metadata['max_y'] = float(meta['maxy'])
+            metadata['max_z'] = float(meta['maxz'])
+
+        # 提取 Offset (重要!)
+        if 'offset_x' in meta:
+            metadata['offset_x'] = float(meta['offset_x'])
+            metadata['offset_y'] = float(meta['offset_y'])
+            metadata['offset_z'] = float(meta['offset_z'])
+
+        # 提取 Scale
+        if 'scale_x' in meta:
+            metadata['scale_x'] = float(meta['scale_x'])
+            metadata['scale_y'] = float(meta['scale_y'])
+            metadata['scale_z'] = float(meta['scale_z'])
+
+        # 提取其他信息
+        if 'software_id' in meta:
+            metadata['software'] = meta['software_id']
+
+        if 'system_id' in meta:
+            metadata['system'] = meta['system_id']
+
+        metadata['source'] = 'pdal'
+        return metadata
+
+    except subprocess.TimeoutExpired:
+        print(f"pdal 读取超时: {las_file}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"pdal JSON 解析失败: {e}")
+        return None
+    except Exception as e:
+        print(f"pdal 读取失败: {e}")
+        return None
+
+
+def read_metadata_lasinfo(las_file):
+    """使用 lasinfo 读取 LAS 元数据 (备用方案)"""
+    try:
+        result = subprocess.run(
+            ['lasinfo', las_file],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=10
+        )
+
+        if result.returncode != 0:
+            return None
+
+        output = result.stdout
+
+        # 解析关键信息
+        metadata = {}
+
+        # 提取点数量
+        match = re.search(r'Number of Point Records:\s+(\d+)', output, re.IGNORECASE)
+        if match:
+            metadata['point_count'] = int(match.group(1))
+
+        # 提取版本
+        match = re.search(r'Version:\s+([\d.]+)', output, re.IGNORECASE)
+        if match:
+            metadata['version'] = match.group(1)
+
+        # 提取边界 - 注意格式: "Min X Y Z:   635619.85 848899.70 406.59"
+        match = re.search(r'Min X Y Z:\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)', output, re.IGNORECASE)
+        if match:
+            metadata['min_x'] = float(match.group(1))
+            metadata['min_y'] = float(match.group(2))
+            metadata['min_z'] = float(match.group(3))
+
+        match = re.search(r'Max X Y Z:\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)', output, re.IGNORECASE)
+        if match:
+            metadata['max_x'] = float(match.group(1))
+            metadata['max_y'] = float(match.group(2))
+            metadata['max_z'] = float(match.group(3))
+
+        # 提取Offset (原点坐标) - 注意格式: "Offset X Y Z:  -0.00 -0.00 -0.00"
+        match = re.search(r'Offset X Y Z:\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)', output, re.IGNORECASE)
+        if match:
+            metadata['offset_x'] = float(match.group(1))
+            metadata['offset_y'] = float(match.group(2))
+            metadata['offset_z'] = float(match.group(3))
+
+        # 提取Scale - 注意格式: "Scale Factor X Y Z:  0.01 0.01 0.01"
+        match = re.search(r'Scale Factor X Y Z:\s+([\d.e-]+)\s+([\d.e-]+)\s+([\d.e-]+)', output, re.IGNORECASE)
+        if match:
+            metadata['scale_x'] = float(match.group(1))
+            metadata['scale_y'] = float(match.group(2))
+            metadata['scale_z'] = float(match.group(3))
+
+        metadata['source'] = 'lasinfo'
+        return metadata
+
+    except subprocess.TimeoutExpired:
+        print(f"lasinfo 读取超时: {las_file}")
+        return None
+    except Exception as e:
+        print(f"lasinfo 读取失败: {e}")
+        return None
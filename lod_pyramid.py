@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+多分辨率 LOD 金字塔
+- 第 0 级为分割输出的全分辨率网格; 第 k 级的体素大小为 基础体素 × 2^k, 网格边长为 网格大小 × 2^k
+- 自底向上生成: 第 k 级的每个网格由第 k-1 级覆盖的子网格 (固定网格最多 4 个) 降采样合并, 不重新读取原始点云
+  (各级体素网格都以坐标原点对齐, 上一级的体素完整落在下一级的体素中)
+- 第 k 级写出到 {prefix}_lod/{k}/: 网格文件、元数据 YAML 和网格索引, 与分割输出格式相同, 可直接按网格加载
+- 清单 {prefix}_lod.json 记录每级的体素大小、误差上限、网格数、点数和字节数,
+  客户端选择误差上限不超过要求的最粗一级
+"""
+
+import os
+import math
+import json
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import pcd_io
+import process_runner
+import tile_index
+import grid_divider
+import voxel_filter
+
+MANIFEST_VERSION = 1
+
+# 默认生成的级数 (不含第 0 级)
+DEFAULT_LOD_LEVELS = 3
+
+# 最多级数: 第 10 级的网格边长为网格大小的 1024 倍
+MAX_LOD_LEVELS = 10
+
+# 全分辨率网格未降采样时, 第 1 级体素为此值的 2 倍 (米)
+DEFAULT_BASE_LEAF_SIZE = 0.1
+
+
+def manifest_file_name(prefix):
+    return f'{prefix}_lod.json'
+
+
+def level_directory(prefix, level):
+    """第 level 级相对输出目录的路径, 第 0 级为输出目录本身"""
+    return '.' if level == 0 else os.path.join(f'{prefix}_lod', str(level))
+
+
+def max_error(leaf_size):
+    """体素降采样的误差上限: 原始点和代表点在同一体素中, 距离不超过体素对角线"""
+    return leaf_size * math.sqrt(3)
+
+
+def read_tile(pcd_file, point_type):
+    """读取一个网格的全部点"""
+    chunks = list(pcd_io.iter_point_chunks(pcd_file, point_type))
+    if not chunks:
+        return np.empty(0, dtype=pcd_io.point_dtype(point_type))
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def build_lod_tile(task):
+    """子进程任务: 子网格逐个降采样后合并, 再降采样一次合并跨子网格的体素
+
+    返回 write_tile_points 的结果, 输入点数为子网格的点数之和
+    """
+    child_files, output_file, point_type, leaf_size, voxel_mode, encoding = task
+    parts = []
+    points_in = 0
+    for child_file in child_files:
+        points = read_tile(child_file, point_type)
+        points_in += len(points)
+        parts.append(voxel_filter.voxel_downsample(points, leaf_size, voxel_mode))
+    points = np.concatenate(parts) if parts else np.empty(0, dtype=pcd_io.point_dtype(point_type))
+    name, _, count_out, bounds, size = grid_divider.write_tile_points(
+        points, output_file, point_type, leaf_size, voxel_mode, encoding)
+    return name, points_in, count_out, bounds, size
+
+
+def iter_lod_tiles(tasks, workers, cancel=None):
+    """按完成顺序产出 build_lod_tile 的结果, workers > 1 时使用进程池"""
+    if workers > 1 and len(tasks) > 1:
+        # 调用方可能在 GUI 的后台线程中, 使用 spawn 避免 fork 后死锁
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(build_lod_tile, task) for task in tasks]
+            with process_runner.pool_tracking(cancel, executor):
+                for future in as_completed(futures):
+                    yield future.result()
+        return
+    for task in tasks:
+        yield build_lod_tile(task)
+
+
+def parent_groups(index):
+    """上一级网格按下一级 (边长 2 倍) 网格分组: {(px, py): [记录下标]}, 跳过空网格
+
+    自适应分块级别 L 的网格边长为 网格大小 / 2^L, 下一级网格编号为 ix >> (L + 1)
+    """
+    records = index.records
+    shift = records['level'].astype(np.int64) + 1
+    px = records['ix'].astype(np.int64) >> shift
+    py = records['iy'].astype(np.int64) >> shift
+    groups = {}
+    for idx in np.flatnonzero(records['points'] > 0):
+        groups.setdefault((int(px[idx]), int(py[idx])), []).append(int(idx))
+    return groups
+
+
+def build_level(source, source_dir, level_dir, prefix, grid_size_x, grid_size_y, leaf_size, point_type,
+                voxel_mode, encoding, workers, advance=None, cancel=None, phase='LOD'):
+    """由上一级网格生成一级, 返回 (网格索引, 输入点数)"""
+    step = advance or (lambda *args: None)
+    groups = parent_groups(source)
+    os.makedirs(level_dir, exist_ok=True)
+
+    keys = {}
+    tasks = []
+    for key in sorted(groups):
+        name = grid_divider.tile_file_name(prefix, key, grid_size_x, grid_size_y)
+        keys[name] = key
+        children = [os.path.join(source_dir, source.name(idx)) for idx in groups[key]]
+        tasks.append((children, os.path.join(level_dir, name), point_type, leaf_size, voxel_mode, encoding))
+
+    entries = []
+    points_in = 0
+    for idx, (name, count_in, count_out, bounds, size) in enumerate(iter_lod_tiles(tasks, workers, cancel)):
+        points_in += count_in
+        entries.append((name, keys[name], 0, count_out, size, bounds))
+        step(phase, idx + 1, len(tasks), 'tiles')
+
+    tiles = {name: (key[0] * grid_size_x, key[1] * grid_size_y) for name, key in keys.items()}
+    grid_divider.write_grid_metadata(level_dir, prefix, grid_size_x, grid_size_y, tiles)
+    index = tile_index.TileIndex.build(entries, grid_size_x, grid_size_y)
+    index.save(os.path.join(level_dir, tile_index.index_file_name(prefix)))
+    return index, points_in
+
+
+def level_entry(prefix, level, leaf_size, index):
+    """清单中一级的说明"""
+    return {
+        'level': level,
+        'leaf_size': leaf_size,
+        'max_error': round(max_error(leaf_size), 6),
+        'tile_size': [index.grid_size_x, index.grid_size_y],
+        'directory': level_directory(prefix, level),
+        'metadata': f'{prefix}_metadata.yaml',
+        'index': tile_index.index_file_name(prefix),
+        'tiles': int(np.count_nonzero(index.records['points'])),
+        'points': int(index.records['points'].sum()),
+        'bytes': int(index.records['bytes'].sum()),
+    }
+
+
+def write_manifest(path, manifest):
+    """原子写入清单"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def build_pyramid(output_dir, prefix, levels=DEFAULT_LOD_LEVELS, leaf_size=0.0, voxel_mode='centroid',
+                  encoding='binary', workers=1, progress=None, advance=None, cancel=None):
+    """由分割输出目录 (全分辨率网格和网格索引) 自底向上生成 LOD 金字塔, 返回清单文件路径
+
+    leaf_size 为全分辨率网格的降采样体素大小 (0 表示未降采样, 此时以 DEFAULT_BASE_LEAF_SIZE 为基础);
+    没有网格索引时由元数据重建; 已有的 {prefix}_lod 目录会被删除后重新生成
+    """
+    emit = progress or (lambda message: None)
+    levels = max(0, min(levels, MAX_LOD_LEVELS))
+    base_index = tile_index.load_index(output_dir, prefix, progress=progress)
+    if not np.count_nonzero(base_index.records['points']):
+        raise ValueError(f"没有可用于生成 LOD 的网格: {output_dir}")
+
+    first = base_index.name(int(np.flatnonzero(base_index.records['points'])[0]))
+    point_type = pcd_io.detect_point_type(pcd_io.read_header(os.path.join(output_dir, first)))
+    base_leaf = leaf_size if leaf_size > 0 else DEFAULT_BASE_LEAF_SIZE
+
+    shutil.rmtree(os.path.join(output_dir, f'{prefix}_lod'), ignore_errors=True)
+    entries = [level_entry(prefix, 0, leaf_size, base_index)]
+    if base_index.records['level'].any():
+        entries[0]['tiling'] = 'quadtree'
+    emit(f"LOD 0 (全分辨率): {entries[0]['tiles']} 块, {entries[0]['points']:,} 点")
+
+    source, source_dir = base_index, output_dir
+    for level in range(1, levels + 1):
+        level_leaf = base_leaf * (1 << level)
+        grid_size_x = base_index.grid_size_x * (1 << level)
+        grid_size_y = base_index.grid_size_y * (1 << level)
+        level_dir = os.path.join(output_dir, level_directory(prefix, level))
+        source, points_in = build_level(source, source_dir, level_dir, prefix, grid_size_x, grid_size_y,
+                                        level_leaf, point_type, voxel_mode, encoding, workers, advance,
+                                        cancel, f'LOD {level}')
+        source_dir = level_dir
+        entry = level_entry(prefix, level, level_leaf, source)
+        entries.append(entry)
+        emit(f"LOD {level} (体素 {level_leaf:g}m, 网格 {grid_size_x:g}m): {entry['tiles']} 块, "
+             f"{points_in:,} → {entry['points']:,} 点, {entry['bytes'] / 1024 / 1024:.1f} MB")
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'prefix': prefix,
+        'point_type': point_type,
+        'encoding': encoding,
+        'voxel_mode': voxel_mode,
+        'levels': entries,
+    }
+    path = os.path.join(output_dir, manifest_file_name(prefix))
+    write_manifest(path, manifest)
+    return path
+
+
+def load_manifest(output_dir, prefix):
+    with open(os.path.join(output_dir, manifest_file_name(prefix)), 'r') as f:
+        return json.load(f)
+
+
+def select_level(manifest, error_budget):
+    """误差上限不超过 error_budget 的最粗一级 (点数最少), 都不满足时返回第 0 级"""
+    fitting = [entry for entry in manifest['levels'] if entry['max_error'] <= error_budget]
+    if not fitting:
+        return manifest['levels'][0]
+    return min(fitting, key=lambda entry: entry['points'])
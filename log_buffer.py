@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+任务日志缓冲
+工作线程逐行写入 (不发 Qt 信号), 界面定时取出一批一次性显示;
+完整日志同时写入日志文件, 界面只保留最近的若干行
+"""
+
+import os
+import time
+import threading
+
+from metadata_cache import default_cache_dir
+
+# 日志目录中最多保留的日志文件数
+MAX_LOG_FILES = 100
+
+
+def default_log_dir():
+    """日志目录 ($XDG_CACHE_HOME/pointcloud_converter/logs)"""
+    return os.path.join(default_cache_dir(), 'logs')
+
+
+def new_log_path(task_type, log_dir=None):
+    """新日志文件路径 (<任务>_<时间>.log), 并删除超出数量上限的旧日志"""
+    log_dir = log_dir or default_log_dir()
+    os.makedirs(log_dir, exist_ok=True)
+    prune_logs(log_dir, MAX_LOG_FILES - 1)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(log_dir, f'{task_type}_{stamp}.log')
+    index = 1
+    while os.path.exists(path):
+        index += 1
+        path = os.path.join(log_dir, f'{task_type}_{stamp}_{index}.log')
+    return path
+
+
+def prune_logs(log_dir, keep):
+    """只保留最新的 keep 个日志文件"""
+    try:
+        logs = [os.path.join(log_dir, name) for name in os.listdir(log_dir) if name.endswith('.log')]
+        logs.sort(key=os.path.getmtime, reverse=True)
+        for path in logs[keep:]:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+class LogBuffer:
+    """线程安全的日志缓冲: append 可在任意线程调用, drain 取出全部待显示的行"""
+
+    def __init__(self, log_file=None):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.log_file = log_file
+        self.file = None
+        if log_file:
+            try:
+                self.file = open(log_file, 'w', encoding='utf-8')
+            except OSError as e:
+                print(f"日志文件创建失败, 只在界面中显示日志: {e}")
+                self.log_file = None
+
+    def append(self, line):
+        with self.lock:
+            self.pending.append(line)
+            if self.file is not None:
+                self.file.write(line + '\n')
+
+    def drain(self):
+        """取出待显示的行, 并把日志文件刷新到磁盘"""
+        with self.lock:
+            lines, self.pending = self.pending, []
+            if self.file is not None:
+                self.file.flush()
+        return lines
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+LZF 压缩 / 解压 (PCD binary_compressed 使用的编码)
+- 安装了 python-lzf 时使用其 C 实现
+- 否则使用纯 Python 实现 (与 liblzf 的数据格式兼容, 约 1 MB/s), 只允许压缩 FALLBACK_MAX_BYTES 以内的数据
+"""
+
+import bisect
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import lzf
+except ImportError:
+    lzf = None
+
+# 回溯引用的最大距离和最大长度 (liblzf 格式限制)
+MAX_OFFSET = 1 << 13
+MAX_REF = (1 << 8) + (1 << 3)
+MAX_LITERAL = 1 << 5
+
+# 纯 Python 实现每次批量查找候选引用的字节数
+COMPRESS_BLOCK = 1 << 20
+
+# 纯 Python 实现允许压缩的最大字节数 (约 2 分钟), 更大的数据需要安装 python-lzf
+FALLBACK_MAX_BYTES = 128 * 1024 * 1024
+
+NATIVE_LZF = lzf is not None
+
+FALLBACK_WARNING = ("未安装 python-lzf, binary_compressed 使用纯 Python LZF 压缩 (约 1 MB/s), "
+                    f"每个文件的点数据不能超过 {FALLBACK_MAX_BYTES // (1024 * 1024)} MB; "
+                    "安装 python-lzf (pip install python-lzf) 使用 C 实现")
+
+
+def max_compressed_size(size):
+    """最坏情况 (全部为字面量) 下的压缩后大小"""
+    return size + size // MAX_LITERAL + 1
+
+
+def check_compress_size(size):
+    """纯 Python 实现下拒绝过大的数据 (压缩需要数小时), 提示安装 python-lzf"""
+    if lzf is None and size > FALLBACK_MAX_BYTES:
+        raise ValueError(f"点数据 {size / (1024 * 1024):.0f} MB 超过纯 Python LZF 压缩的上限 "
+                         f"({FALLBACK_MAX_BYTES // (1024 * 1024)} MB): 请安装 python-lzf "
+                         f"(pip install python-lzf) 或改用 binary 编码")
+
+
+def compress(data, progress=None):
+    """LZF 压缩 bytes 或 uint8 数组, 返回 bytes / bytearray
+
+    progress(已压缩字节数) 在纯 Python 实现中每块调用一次
+    """
+    size = len(data)
+    if size == 0:
+        return b''
+    if lzf is not None:
+        # 直接传入输入缓冲区的只读视图, 不复制整个输入
+        out = lzf.compress(memoryview(data).toreadonly(), max_compressed_size(size))
+        if progress is not None:
+            progress(size)
+        return out
+    check_compress_size(size)
+    return _compress(bytes(data), progress)
+
+
+def decompress(data, size):
+    """LZF 解压, size 为解压后的字节数"""
+    if size == 0:
+        return b''
+    if lzf is not None:
+        out = lzf.decompress(bytes(data), size)
+    else:
+        out = _decompress(data)
+    if len(out) != size:
+        raise ValueError(f"LZF 解压后大小不符: 期望 {size}, 实际 {len(out)}")
+    return out
+
+
+def _flush_literals(out, data, start, end):
+    """写出字面量段, 每段最多 32 字节"""
+    while start < end:
+        length = min(MAX_LITERAL, end - start)
+        out.append(length - 1)
+        out += data[start:start + length]
+        start += length
+
+
+def _match_candidates(buf, start, end):
+    """[start, end) 中可以回溯引用的位置及其引用位置 (同一 3 字节序列的上一次出现)
+
+    向量化计算: 3 字节键稳定排序后, 相邻的相同键即为上一次出现
+    """
+    lo = max(0, start - MAX_OFFSET)
+    b = buf[lo:end + 2].astype(np.uint32)
+    keys = (b[:-2] << 16) | (b[1:-1] << 8) | b[2:]
+    order = np.argsort(keys, kind='stable')
+    same = keys[order[1:]] == keys[order[:-1]]
+    positions = order[1:][same] + lo
+    refs = order[:-1][same] + lo
+    keep = (positions >= start) & (positions - refs <= MAX_OFFSET)
+    positions, refs = positions[keep], refs[keep]
+    by_position = np.argsort(positions)
+    return positions[by_position].tolist(), refs[by_position].tolist()
+
+
+def _match_length(data, ref, pos, max_length):
+    """匹配长度 (已知前 3 字节相同): 整段比较后二分查找"""
+    if data[ref + 3:ref + max_length] == data[pos + 3:pos + max_length]:
+        return max_length
+    lo, hi = 3, max_length
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if data[ref + lo:ref + mid] == data[pos + lo:pos + mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _compress(data, progress=None):
+    """纯 Python LZF 压缩 (贪心匹配), 候选引用按块用 NumPy 批量查找"""
+    n = len(data)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    out = bytearray()
+    literal_start = 0
+    i = 0
+
+    for block_start in range(0, n - 2, COMPRESS_BLOCK):
+        block_end = min(block_start + COMPRESS_BLOCK, n - 2)
+        if i >= block_end:
+            continue
+        positions, refs = _match_candidates(buf, block_start, block_end)
+        j = bisect.bisect_left(positions, i)
+        while j < len(positions):
+            pos = positions[j]
+            ref = refs[j]
+            length = _match_length(data, ref, pos, min(MAX_REF, n - pos))
+
+            _flush_literals(out, data, literal_start, pos)
+            offset = pos - ref - 1
+            if length - 2 < 7:
+                out.append(((length - 2) << 5) | (offset >> 8))
+            else:
+                out.append((7 << 5) | (offset >> 8))
+                out.append(length - 2 - 7)
+            out.append(offset & 0xFF)
+
+            i = literal_start = pos + length
+            j = bisect.bisect_left(positions, i, j)
+
+        if progress is not None:
+            progress(min(block_end, i))
+
+    _flush_literals(out, data, literal_start, n)
+    if progress is not None:
+        progress(n)
+    return out
+
+
+def _decompress(data):
+    """纯 Python LZF 解压"""
+    data = memoryview(bytes(data))
+    n = len(data)
+    out = bytearray()
+    i = 0
+
+    while i < n:
+        ctrl = data[i]
+        i += 1
+        if ctrl < MAX_LITERAL:
+            length = ctrl + 1
+            if i + length > n:
+                raise ValueError("LZF 数据损坏: 字面量越界")
+            out += data[i:i + length]
+            i += length
+            continue
+
+        length = ctrl >> 5
+        if length == 7:
+            length += data[i]
+            i += 1
+        length += 2
+        if i >= n:
+            raise ValueError("LZF 数据损坏: 引用不完整")
+        ref = len(out) - ((ctrl & 0x1F) << 8) - data[i] - 1
+        i += 1
+        if ref < 0:
+            raise ValueError("LZF 数据损坏: 引用越界")
+
+        if ref + length <= len(out):
+            out += out[ref:ref + length]
+        else:
+            # 引用与输出重叠时按周期重复
+            period = out[ref:]
+            out += (period * (length // len(period) + 1))[:length]
+
+    return bytes(out)
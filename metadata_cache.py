@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+LAS 元数据持久化缓存
+以 (绝对路径, 文件大小, 修改时间) 为键保存在用户缓存目录的 SQLite 数据库中,
+文件变化后自动失效, 超过容量上限时按最近访问时间淘汰
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import closing
+
+# 默认最多缓存的文件数
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def default_cache_dir():
+    """用户缓存目录 ($XDG_CACHE_HOME/pointcloud_converter)"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pointcloud_converter')
+
+
+class MetadataCache:
+    """LAS 元数据缓存 (LRU, 线程安全: 每次操作使用独立连接)"""
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path or os.path.join(default_cache_dir(), 'las_metadata.sqlite')
+        self.max_entries = max_entries
+        self.ready = False
+
+    def _connect(self):
+        if not self.ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        # 缓存可以重建, 不需要每次提交都 fsync
+        conn.execute('PRAGMA synchronous = OFF')
+        if not self.ready:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS metadata ('
+                ' path TEXT PRIMARY KEY,'
+                ' size INTEGER NOT NULL,'
+                ' mtime_ns INTEGER NOT NULL,'
+                ' data TEXT NOT NULL,'
+                ' last_access REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS metadata_last_access ON metadata (last_access)')
+            self.ready = True
+        return conn
+
+    @staticmethod
+    def _file_key(las_file):
+        stat = os.stat(las_file)
+        return os.path.abspath(las_file), stat.st_size, stat.st_mtime_ns
+
+    def get(self, las_file):
+        """查询缓存, 未命中或文件已变化时返回 None"""
+        try:
+            path, size, mtime_ns = self._file_key(las_file)
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute('SELECT size, mtime_ns, data FROM metadata WHERE path = ?',
+                                   (path,)).fetchone()
+                if row is None:
+                    return None
+                if row[0] != size or row[1] != mtime_ns:
+                    conn.execute('DELETE FROM metadata WHERE path = ?', (path,))
+                    return None
+                conn.execute('UPDATE metadata SET last_access = ? WHERE path = ?', (time.time(), path))
+            return json.loads(row[2])
+        except (OSError, sqlite3.Error, ValueError) as e:
+            print(f"元数据缓存读取失败: {e}")
+            return None
+
+    def put(self, las_file, metadata):
+        """写入缓存, 并淘汰超出容量的最久未访问条目"""
+        try:
+            path, size, mtime_ns = self._file_key(las_file)
+            with closing(self._connect()) as conn, conn:
+                conn.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)',
+                             (path, size, mtime_ns, json.dumps(metadata), time.time()))
+                conn.execute(
+                    'DELETE FROM metadata WHERE path IN ('
+                    ' SELECT path FROM metadata ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,))
+        except (OSError, sqlite3.Error, TypeError) as e:
+            print(f"元数据缓存写入失败: {e}")
+
+    def clear(self):
+        """清空缓存"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM metadata')
+        except (OSError, sqlite3.Error) as e:
+            print(f"元数据缓存清空失败: {e}")
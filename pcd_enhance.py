@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+内置 PCD 增强 (替代 pcd_enhancer)
+- 以 uint8 视图直接访问打包在 rgb 字段中的 B/G/R 通道
+- 通过 256 项查找表执行 Gamma 校正和对比度调整
+- 自动 Gamma: 根据整片点云的亮度直方图选择曲线
+- 输出编码与输入相同时原样保留其他字段, 否则重新编码为 PointXYZRGB
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import pcd_io
+
+# 与 pcd_enhancer 相同的默认 Gamma
+DEFAULT_GAMMA = 0.8
+
+# 自动 Gamma 的取值范围
+AUTO_GAMMA_RANGE = (0.3, 3.0)
+
+
+def build_lut(gamma=DEFAULT_GAMMA, contrast=1.0):
+    """生成 256 项查找表: 先 Gamma 校正, 再以 0.5 为中心拉伸对比度"""
+    values = np.arange(256, dtype=np.float64) / 255.0
+    values = np.power(values, gamma)
+    values = (values - 0.5) * contrast + 0.5
+    return np.rint(np.clip(values, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+def auto_gamma(histogram):
+    """根据通道直方图选择 Gamma, 使平均亮度映射到 0.5"""
+    total = histogram.sum()
+    if total == 0:
+        return 1.0
+    mean = float((histogram * np.arange(256)).sum()) / total / 255.0
+    if mean <= 0.0 or mean >= 1.0:
+        return 1.0
+    gamma = math.log(0.5) / math.log(mean)
+    return min(max(gamma, AUTO_GAMMA_RANGE[0]), AUTO_GAMMA_RANGE[1])
+
+
+def apply_lut(packed, lut):
+    """对打包颜色 (每点 4 字节, 小端 B/G/R/alpha) 查表, 返回新数组"""
+    packed = np.array(packed)
+    channels = packed.view(np.uint8).reshape(-1, 4)
+    channels[:, :3] = lut[channels[:, :3]]
+    return packed
+
+
+def _rgb_offset(header):
+    """rgb 字段在 binary 记录中的字节偏移"""
+    fields = header['fields']
+    name = 'rgb' if 'rgb' in fields else 'rgba' if 'rgba' in fields else None
+    if name is None:
+        raise ValueError("仅支持RGB点云 (PCD 中没有 rgb 字段)")
+
+    dtype = pcd_io.record_dtype(header)
+    if dtype[name].itemsize != 4:
+        raise pcd_io.UnsupportedPCDError(f"不支持的 rgb 字段大小: {dtype[name].itemsize}")
+    return dtype, dtype.fields[name][1]
+
+
+def _iter_binary_blocks(pcd_file, header, chunk_points):
+    """按块读取 binary 点记录, 产出 (n, 记录字节数) 的 uint8 视图"""
+    dtype = pcd_io.record_dtype(header)
+    total = header['points']
+    if total == 0:
+        return
+    records = np.memmap(pcd_file, dtype=np.uint8, mode='r', offset=header['data_offset'],
+                        shape=(total, dtype.itemsize))
+    for begin in range(0, total, chunk_points):
+        yield records[begin:begin + chunk_points]
+
+
+def rgb_histogram(pcd_file, chunk_points=pcd_io.DEFAULT_CHUNK_POINTS):
+    """流式统计 R/G/B 通道的合并直方图 (256 项)"""
+    header = pcd_io.read_header(pcd_file)
+    histogram = np.zeros(256, dtype=np.int64)
+
+    if header['data'] == 'binary':
+        _, offset = _rgb_offset(header)
+        for block in _iter_binary_blocks(pcd_file, header, chunk_points):
+            histogram += np.bincount(block[:, offset:offset + 3].ravel(), minlength=256)
+    else:
+        for chunk in pcd_io.iter_point_chunks(pcd_file, 'rgb', chunk_points, header):
+            channels = np.ascontiguousarray(chunk['rgb']).view(np.uint8).reshape(-1, 4)[:, :3]
+            histogram += np.bincount(channels.ravel(), minlength=256)
+    return histogram
+
+
+def auto_gamma_for_files(pcd_files):
+    """多个文件 (如同一地图的全部网格) 合并统计直方图, 保证各网格使用同一条曲线"""
+    histogram = np.zeros(256, dtype=np.int64)
+    for pcd_file in pcd_files:
+        histogram += rgb_histogram(pcd_file)
+    return auto_gamma(histogram)
+
+
+def enhance_pcd(input_file, output_file, gamma=DEFAULT_GAMMA, contrast=1.0, auto=False,
+                chunk_points=pcd_io.DEFAULT_CHUNK_POINTS, progress=None, encoding=None, advance=None):
+    """增强 RGB 点云, 返回实际使用的 Gamma
+
+    auto 为 True 时先扫描一遍直方图自动选择 Gamma (忽略 gamma 参数)
+    encoding 为输出编码, None 表示与输入相同
+    advance 为进度回调 advance(阶段, 已完成点数, 总点数, 单位)
+    """
+    emit = progress or (lambda message: None)
+    step = advance or (lambda *args: None)
+    header = pcd_io.read_header(input_file)
+    if header['data'] not in pcd_io.PCD_ENCODINGS:
+        raise pcd_io.UnsupportedPCDError(f"不支持的 PCD 数据格式: {header['data']}")
+    if encoding is None:
+        encoding = header['data']
+
+    if auto:
+        gamma = auto_gamma(rgb_histogram(input_file, chunk_points))
+        emit(f"自动 Gamma: {gamma:.3f}")
+    lut = build_lut(gamma, contrast)
+    emit(f"Gamma = {gamma:.3f}, 对比度 = {contrast:.2f}, 点数 {header['points']:,}")
+    emit(f"输出编码: {encoding}")
+
+    total = header['points']
+    if encoding != header['data']:
+        _enhance_reencode(input_file, output_file, header, lut, chunk_points, encoding, step)
+    elif header['data'] == 'binary':
+        _, offset = _rgb_offset(header)
+        with open(input_file, 'rb') as src, open(output_file, 'wb') as out:
+            # 原样保留文件头
+            out.write(src.read(header['data_offset']))
+            done = 0
+            for block in _iter_binary_blocks(input_file, header, chunk_points):
+                block = np.array(block)
+                # 小端存储: 字节 0/1/2 分别为 B/G/R, 字节 3 (alpha) 不变
+                channels = block[:, offset:offset + 3]
+                channels[...] = lut[channels]
+                block.tofile(out)
+                done += len(block)
+                step('增强', done, total, 'points')
+    elif header['data'] == 'binary_compressed':
+        _rgb_offset(header)
+        name = 'rgb' if 'rgb' in header['fields'] else 'rgba'
+        records = pcd_io.read_compressed_records(input_file, header)
+        records[name] = apply_lut(records[name], lut).view(records.dtype[name])
+        with open(input_file, 'rb') as src, open(output_file, 'wb') as out:
+            out.write(src.read(header['data_offset']))
+            pcd_io.write_compressed(out, records, step)
+        step('增强', total, total, 'points')
+    else:
+        _enhance_ascii(input_file, output_file, header, lut, chunk_points, step)
+
+    return gamma
+
+
+def _enhance_reencode(input_file, output_file, header, lut, chunk_points, encoding, step):
+    """输出编码与输入不同: 读取为 PointXYZRGB, 查表后以新编码写出"""
+    _rgb_offset(header)
+    done = 0
+    with pcd_io.PCDWriter(output_file, 'rgb', header['points'], encoding, step) as writer:
+        for chunk in pcd_io.iter_point_chunks(input_file, 'rgb', chunk_points, header):
+            chunk['rgb'] = apply_lut(chunk['rgb'], lut)
+            writer.write(chunk)
+            done += len(chunk)
+            step('增强', done, header['points'], 'points')
+
+
+def _enhance_ascii(input_file, output_file, header, lut, chunk_points, step):
+    """ascii PCD: 按块解析 rgb 列并替换, 其他列原样保留"""
+    _rgb_offset(header)
+    column = 0
+    for name, count in zip(header['fields'], header['counts']):
+        if name in ('rgb', 'rgba'):
+            break
+        column += count
+    is_float = header['types'][header['fields'].index(name)] == 'F'
+
+    done = 0
+    with open(input_file, 'rb') as src, open(output_file, 'wb') as out:
+        out.write(src.read(header['data_offset']))
+        while True:
+            lines = src.readlines(chunk_points * 64)
+            if not lines:
+                break
+            rows = [line.split() for line in lines if line.strip()]
+            values = np.array([row[column] for row in rows], dtype=np.float64)
+            packed = pcd_io.ascii_rgb_to_packed(values) if is_float else values.astype('<u4')
+            packed = apply_lut(packed, lut)
+            # 保持输入的写法: 旧版 PCL 的 float 位模式 / 新版的 uint32 整数
+            texts = ['%.9g' % f if is_float and v < 1.0 else str(p)
+                     for v, f, p in zip(values, packed.view('<f4'), packed)]
+            for row, text in zip(rows, texts):
+                row[column] = text.encode('ascii')
+                out.write(b' '.join(row) + b'\n')
+            done += len(rows)
+            step('增强', done, header['points'], 'points')
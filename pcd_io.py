@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+PCD 文件读写
+- PointXYZRGB / PointXYZI / PointXYZ 点记录布局
+- 解析 PCD 文件头, 按块读取 ascii / binary / binary_compressed 点数据
+- 写入 ascii / binary / binary_compressed PCD (binary_compressed 为按字段排列后 LZF 压缩)
+- 拼接 binary / ascii PCD 的数据段 (内核内复制, 不重新解析点数据), 合并多个 PCD 文件
+"""
+
+import os
+import struct
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import lzf_codec
+
+# 每块读取的点数
+DEFAULT_CHUNK_POINTS = 2 * 1024 * 1024
+
+# 内核复制不可用时按块读写的块大小
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+# 每次内核复制的最大字节数 (两次复制之间报告进度 / 检查取消)
+COPY_STEP_BYTES = 256 * 1024 * 1024
+
+# 支持写出的 DATA 编码
+PCD_ENCODINGS = ('binary', 'binary_compressed', 'ascii')
+
+# PCD 的 TYPE/SIZE → NumPy 类型
+NUMPY_TYPES = {
+    ('F', 4): '<f4', ('F', 8): '<f8',
+    ('I', 1): 'i1', ('I', 2): '<i2', ('I', 4): '<i4', ('I', 8): '<i8',
+    ('U', 1): 'u1', ('U', 2): '<u2', ('U', 4): '<u4', ('U', 8): '<u8',
+}
+
+# 点类型 → 字段 (名称, TYPE, SIZE); rgb 按 PCL 约定以 float 存放打包的 0x00RRGGBB
+POINT_FIELDS = {
+    'rgb': (('x', 'F', 4), ('y', 'F', 4), ('z', 'F', 4), ('rgb', 'F', 4)),
+    'intensity': (('x', 'F', 4), ('y', 'F', 4), ('z', 'F', 4), ('intensity', 'F', 4)),
+    'xyz': (('x', 'F', 4), ('y', 'F', 4), ('z', 'F', 4)),
+}
+
+
+class UnsupportedPCDError(ValueError):
+    """内置引擎无法处理的 PCD 文件, 调用方应回退到外部程序"""
+
+
+def point_dtype(point_type):
+    """PCD 点记录的 NumPy dtype (rgb 以 uint32 形式保存位模式)"""
+    if point_type == 'rgb':
+        return np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('rgb', '<u4')])
+    if point_type == 'intensity':
+        return np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('intensity', '<f4')])
+    return np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+
+
+def read_header(pcd_file):
+    """解析 PCD 文件头, 返回字段字典 (data_offset 为点数据起始字节)"""
+    header = {}
+    with open(pcd_file, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"PCD 文件头不完整: {pcd_file}")
+            text = line.decode('ascii', errors='replace').strip()
+            if not text or text.startswith('#'):
+                continue
+
+            key, _, value = text.partition(' ')
+            header[key.upper()] = value.split()
+            if key.upper() == 'DATA':
+                header['data_offset'] = f.tell()
+                break
+
+    fields = header.get('FIELDS', [])
+    if not fields or 'x' not in fields:
+        raise ValueError(f"PCD 文件缺少坐标字段: {pcd_file}")
+
+    counts = [int(c) for c in header.get('COUNT', ['1'] * len(fields))]
+    width = int(header.get('WIDTH', ['0'])[0])
+    height = int(header.get('HEIGHT', ['1'])[0])
+    return {
+        'fields': fields,
+        'sizes': [int(v) for v in header['SIZE']],
+        'types': [t.upper() for t in header['TYPE']],
+        'counts': counts,
+        'points': int(header.get('POINTS', [width * height])[0]),
+        'data': header['DATA'][0].lower(),
+        'viewpoint': header.get('VIEWPOINT', ['0', '0', '0', '1', '0', '0', '0']),
+        'data_offset': header['data_offset'],
+    }
+
+
+def record_dtype(header):
+    """按文件头字段构造点记录 dtype (binary 布局)"""
+    names, formats = [], []
+    for idx, (name, type_, size, count) in enumerate(
+            zip(header['fields'], header['types'], header['sizes'], header['counts'])):
+        if (type_, size) not in NUMPY_TYPES:
+            raise UnsupportedPCDError(f"不支持的字段类型: {name} {type_}{size}")
+        # PCL 用 "_" 表示填充字段, 可能重复出现
+        names.append(name if name != '_' else f'_pad{idx}')
+        formats.append((NUMPY_TYPES[(type_, size)], count) if count > 1 else NUMPY_TYPES[(type_, size)])
+    return np.dtype({'names': names, 'formats': formats})
+
+
+def detect_point_type(header):
+    """根据字段判断点类型: rgb / intensity / xyz"""
+    fields = header['fields']
+    if 'rgb' in fields or 'rgba' in fields:
+        return 'rgb'
+    if 'intensity' in fields:
+        return 'intensity'
+    return 'xyz'
+
+
+def to_point_records(records, point_type):
+    """把文件中的点记录转换为 point_dtype(point_type) 布局"""
+    out = np.empty(len(records), dtype=point_dtype(point_type))
+    for axis in ('x', 'y', 'z'):
+        out[axis] = records[axis]
+
+    if point_type == 'rgb':
+        rgb = records['rgb'] if 'rgb' in records.dtype.names else records['rgba']
+        # float 类型的 rgb 按位模式解释
+        packed = rgb.view('<u4') if rgb.dtype.itemsize == 4 else rgb.astype('<u4')
+        out['rgb'] = packed & 0xFFFFFF
+    elif point_type == 'intensity':
+        out['intensity'] = records['intensity']
+    return out
+
+
+def ascii_rgb_to_packed(column):
+    """ascii 中的 rgb 列转为打包颜色
+
+    旧版 PCL 以 float 文本写出位模式 (值远小于 1), 新版直接写出 uint32 整数
+    """
+    packed = column.astype('<f4').view('<u4')
+    integer = column >= 1.0
+    packed[integer] = column[integer].astype('<u4')
+    return packed
+
+
+def read_compressed_records(pcd_file, header):
+    """读取 binary_compressed 点数据: LZF 解压后按字段还原为点记录"""
+    dtype = record_dtype(header)
+    total = header['points']
+    with open(pcd_file, 'rb') as f:
+        f.seek(header['data_offset'])
+        sizes = f.read(8)
+        if len(sizes) < 8:
+            raise ValueError(f"PCD 压缩数据不完整: {pcd_file}")
+        compressed_size, size = struct.unpack('<II', sizes)
+        payload = f.read(compressed_size)
+
+    if size != total * dtype.itemsize:
+        raise ValueError(f"PCD 压缩数据大小不符: 期望 {total * dtype.itemsize}, 文件头 {size}")
+    if len(payload) < compressed_size:
+        raise ValueError(f"PCD 压缩数据被截断: {pcd_file}")
+
+    raw = lzf_codec.decompress(payload, size)
+    records = np.empty(total, dtype=dtype)
+    position = 0
+    for name in dtype.names:
+        field = dtype[name]
+        records[name] = np.frombuffer(raw, dtype=field, count=total, offset=position)
+        position += total * field.itemsize
+    return records
+
+
+def scatter_fields(raw, records, start, total):
+    """把点记录 [start, start + len(records)) 按字段写入字段排列的缓冲区 raw (uint8, 共 total 个点)"""
+    position = 0
+    for name in records.dtype.names:
+        field = records.dtype[name]
+        begin = position + start * field.itemsize
+        raw[begin:begin + len(records) * field.itemsize].view(field)[:] = records[name]
+        position += total * field.itemsize
+
+
+def write_compressed(f, records, advance=None):
+    """点记录按字段排列后 LZF 压缩, 写出 binary_compressed 数据段 (含两个 uint32 大小)
+
+    records 为点记录, 或已按字段排列的 uint8 缓冲区 (PCDWriter 逐块写入, 不再复制整个点云);
+    advance 为进度回调 advance(阶段, 已压缩字节数, 总字节数, 单位)
+    """
+    if records.dtype.names:
+        raw = np.empty(records.nbytes, dtype=np.uint8)
+        scatter_fields(raw, records, 0, len(records))
+    else:
+        raw = records
+    progress = None
+    if advance is not None:
+        progress = lambda done: advance('LZF 压缩', done, len(raw), 'bytes')
+    payload = lzf_codec.compress(raw, progress)
+    if len(raw) >= 1 << 32 or len(payload) >= 1 << 32:
+        raise ValueError("点数据超过 4 GB, 无法写出 binary_compressed PCD")
+    f.write(struct.pack('<II', len(payload), len(raw)))
+    f.write(payload)
+
+
+def _ascii_columns(header):
+    """ascii 每个字段对应的列号 (COUNT>1 的字段占多列, 只取第一列)"""
+    columns = {}
+    col = 0
+    for name, count in zip(header['fields'], header['counts']):
+        columns.setdefault(name, col)
+        col += count
+    return columns
+
+
+def iter_point_chunks(pcd_file, point_type=None, chunk_points=DEFAULT_CHUNK_POINTS, header=None):
+    """按块读取 PCD 点数据, 产出 point_dtype(point_type) 结构化数组"""
+    if header is None:
+        header = read_header(pcd_file)
+    if point_type is None:
+        point_type = detect_point_type(header)
+    total = header['points']
+
+    if header['data'] == 'binary':
+        dtype = record_dtype(header)
+        if total == 0:
+            return
+        records = np.memmap(pcd_file, dtype=dtype, mode='r',
+                            offset=header['data_offset'], shape=(total,))
+        for begin in range(0, total, chunk_points):
+            yield to_point_records(records[begin:begin + chunk_points], point_type)
+
+    elif header['data'] == 'ascii':
+        columns = _ascii_columns(header)
+        wanted = [name for name in point_dtype(point_type).names]
+        source = {'rgb': 'rgb' if 'rgb' in columns else 'rgba'}
+        with open(pcd_file, 'rb') as f:
+            f.seek(header['data_offset'])
+            lines = (line for line in f if line.strip())
+            while True:
+                block = list(itertools.islice(lines, chunk_points))
+                if not block:
+                    break
+                values = np.loadtxt(block, dtype=np.float64, ndmin=2)
+                out = np.empty(len(values), dtype=point_dtype(point_type))
+                for name in wanted:
+                    column = values[:, columns[source.get(name, name)]]
+                    if name == 'rgb':
+                        # ascii 中 rgb 以 float 表示打包的颜色
+                        packed = ascii_rgb_to_packed(column) if source['rgb'] == 'rgb' \
+                            else column.astype('<u4')
+                        out[name] = packed & 0xFFFFFF
+                    else:
+                        out[name] = column
+                yield out
+
+    elif header['data'] == 'binary_compressed':
+        records = read_compressed_records(pcd_file, header)
+        for begin in range(0, total, chunk_points):
+            yield to_point_records(records[begin:begin + chunk_points], point_type)
+
+    else:
+        raise UnsupportedPCDError(f"不支持的 PCD 数据格式: {header['data']}")
+
+
+def make_header(point_type, point_count, data='binary'):
+    """生成 PCD v0.7 文件头"""
+    fields = POINT_FIELDS[point_type]
+    lines = [
+        '# .PCD v0.7 - Point Cloud Data file format',
+        'VERSION 0.7',
+        'FIELDS ' + ' '.join(name for name, _, _ in fields),
+        'SIZE ' + ' '.join(str(size) for _, _, size in fields),
+        'TYPE ' + ' '.join(type_ for _, type_, _ in fields),
+        'COUNT ' + ' '.join('1' for _ in fields),
+        f'WIDTH {point_count}',
+        'HEIGHT 1',
+        'VIEWPOINT 0 0 0 1 0 0 0',
+        f'POINTS {point_count}',
+        f'DATA {data}',
+    ]
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+
+def write_ascii_records(f, records):
+    """以文本写出点记录; rgb 与新版 PCL 一致写为 uint32 整数"""
+    if len(records) == 0:
+        return
+    columns = []
+    formats = []
+    for name in records.dtype.names:
+        columns.append(records[name].astype(np.float64))
+        formats.append('%d' if name == 'rgb' else '%.9g')
+    np.savetxt(f, np.column_stack(columns), fmt=formats)
+
+
+def _copy_file_range(in_fd, out_fd, offset, length):
+    return os.copy_file_range(in_fd, out_fd, length, offset)
+
+
+def _sendfile(in_fd, out_fd, offset, length):
+    return os.sendfile(out_fd, in_fd, offset, length)
+
+
+def append_file_data(dst, src_path, offset=0, length=None, step=None):
+    """把 src_path 从 offset 开始的 length 字节 (默认到文件末尾) 追加到已打开的二进制文件 dst 末尾, 返回字节数
+
+    依次尝试 os.copy_file_range (内核内复制, 支持的文件系统上共享数据块) 和 os.sendfile,
+    都不可用 (旧内核 / 跨文件系统 / 非 Linux) 时按块读写; step(字节数) 在每复制一段后调用
+    """
+    report = step or (lambda count: None)
+    dst.flush()
+    dst.seek(0, os.SEEK_END)
+    out_fd = dst.fileno()
+    with open(src_path, 'rb') as src:
+        in_fd = src.fileno()
+        if length is None:
+            length = os.fstat(in_fd).st_size - offset
+        copied = 0
+        for copy in (_copy_file_range, _sendfile):
+            try:
+                while copied < length:
+                    count = copy(in_fd, out_fd, offset + copied, min(length - copied, COPY_STEP_BYTES))
+                    if count == 0:
+                        break
+                    copied += count
+                    report(count)
+            except (AttributeError, OSError):
+                continue
+            break
+        if copied < length:
+            src.seek(offset + copied)
+            dst.seek(0, os.SEEK_END)
+            while copied < length:
+                block = src.read(min(COPY_BLOCK_SIZE, length - copied))
+                if not block:
+                    break
+                dst.write(block)
+                copied += len(block)
+                report(len(block))
+            dst.flush()
+    dst.seek(0, os.SEEK_END)
+    return copied
+
+
+def concat_pcd_data(part_files, output_file, point_type, point_count, encoding='binary'):
+    """写出一个文件头 (POINTS / WIDTH 为总点数), 再依次追加各分片的数据段
+
+    分片必须是 point_type 布局、编码为 encoding (binary / ascii) 的 PCD
+    """
+    if encoding not in ('binary', 'ascii'):
+        raise ValueError(f"无法直接拼接 {encoding} 编码的 PCD")
+    with open(output_file, 'wb') as f:
+        f.write(make_header(point_type, point_count, encoding))
+        for part_file in part_files:
+            append_file_data(f, part_file, read_header(part_file)['data_offset'])
+
+
+def layout_key(header):
+    """字段布局 (字段、大小、类型、个数、视点), 相同时数据段可以直接拼接"""
+    return (tuple(header['fields']), tuple(header['sizes']), tuple(header['types']),
+            tuple(header['counts']), tuple(header['viewpoint']), header['data'])
+
+
+def data_length(pcd_file, header):
+    """数据段字节数: binary 按点数 × 记录大小 (忽略文件末尾多余的字节), ascii 到文件末尾"""
+    available = os.path.getsize(pcd_file) - header['data_offset']
+    if header['data'] != 'binary':
+        return available
+    length = header['points'] * sum(size * count for size, count in zip(header['sizes'], header['counts']))
+    if length > available:
+        raise ValueError(f"PCD 文件被截断: {pcd_file}")
+    return length
+
+
+def header_with_points(pcd_file, header, point_count):
+    """原文件头文本, WIDTH / POINTS 改为 point_count, HEIGHT 改为 1 (合并后为无序点云)"""
+    with open(pcd_file, 'rb') as f:
+        raw = f.read(header['data_offset'])
+    lines = []
+    for line in raw.split(b'\n'):
+        key = line.strip().split(b' ', 1)[0].upper()
+        if key in (b'WIDTH', b'POINTS'):
+            line = key + b' %d' % point_count
+        elif key == b'HEIGHT':
+            line = b'HEIGHT 1'
+        lines.append(line)
+    return b'\n'.join(lines)
+
+
+def merge_pcd_files(input_files, output_file, encoding='binary', progress=None, advance=None):
+    """把多个 PCD 合并为一个, 返回点数
+
+    全部输入与输出编码相同 (binary / ascii) 且字段布局一致时, 写一个文件头后用内核复制拼接各文件的数据段;
+    否则逐块读取并按输出编码重新写出 (点类型需一致)
+    """
+    if not input_files:
+        raise ValueError("没有要合并的 PCD 文件")
+    emit = progress or (lambda message: None)
+    step = advance or (lambda *args: None)
+    headers = [read_header(path) for path in input_files]
+    total = sum(header['points'] for header in headers)
+
+    if encoding in ('binary', 'ascii') and len({layout_key(header) for header in headers}) == 1 \
+            and headers[0]['data'] == encoding:
+        lengths = [data_length(path, header) for path, header in zip(input_files, headers)]
+        total_bytes = sum(lengths)
+        emit(f"零拷贝合并: {len(input_files)} 个 {encoding} 文件, {total:,} 点, {total_bytes / 1024**2:.1f} MB")
+        done = [0]
+
+        def report(count):
+            done[0] += count
+            step('合并', done[0], total_bytes, 'bytes')
+
+        with open(output_file, 'wb') as f:
+            f.write(header_with_points(input_files[0], headers[0], total))
+            for path, header, length in zip(input_files, headers, lengths):
+                append_file_data(f, path, header['data_offset'], length, report)
+                if encoding == 'ascii' and length:
+                    # 最后一行没有换行符时补上, 否则与下一个文件的第一行连在一起
+                    with open(path, 'rb') as src:
+                        src.seek(header['data_offset'] + length - 1)
+                        if src.read(1) != b'\n':
+                            f.write(b'\n')
+        return total
+
+    point_types = {detect_point_type(header) for header in headers}
+    if len(point_types) > 1:
+        raise ValueError(f"输入文件的点类型不一致: {', '.join(sorted(point_types))}")
+    point_type = point_types.pop()
+    emit(f"重新编码合并: {len(input_files)} 个文件 → {encoding}, {total:,} 点")
+    written = 0
+    with PCDWriter(output_file, point_type, total, encoding, advance) as writer:
+        for path, header in zip(input_files, headers):
+            for chunk in iter_point_chunks(path, point_type, header=header):
+                writer.write(chunk)
+                written += len(chunk)
+                step('合并', written, total, 'points')
+    return written
+
+
+class PCDWriter:
+    """流式 PCD 写入器, 点数需预先已知
+
+    encoding: binary (按块追加) / ascii (按块追加文本) /
+    binary_compressed (点数据按字段排列写入预分配的缓冲区, close 时 LZF 压缩, 压缩进度回调 advance;
+    未安装 python-lzf 时超过 lzf_codec.FALLBACK_MAX_BYTES 的点云在创建时报错)
+    """
+
+    def __init__(self, path, point_type, point_count, encoding='binary', advance=None):
+        if encoding not in PCD_ENCODINGS:
+            raise ValueError(f"未知的 PCD 编码: {encoding}")
+        self.path = path
+        self.point_type = point_type
+        self.point_count = point_count
+        self.encoding = encoding
+        self.advance = advance
+        self.dtype = point_dtype(point_type)
+        self.written = 0
+        self.buffer = None
+        if encoding == 'binary_compressed':
+            lzf_codec.check_compress_size(point_count * self.dtype.itemsize)
+            self.buffer = np.empty(point_count * self.dtype.itemsize, dtype=np.uint8)
+        self.file = open(path, 'wb')
+        self.file.write(make_header(point_type, point_count, encoding))
+
+    def write(self, records):
+        """追加一块点记录 (结构化数组, 布局与 point_dtype 一致)"""
+        records = np.ascontiguousarray(records, dtype=self.dtype)
+        if self.encoding == 'binary':
+            records.tofile(self.file)
+        elif self.encoding == 'ascii':
+            write_ascii_records(self.file, records)
+        else:
+            if self.written + len(records) > self.point_count:
+                raise ValueError(f"PCD 点数超出文件头声明的 {self.point_count}")
+            scatter_fields(self.buffer, records, self.written, self.point_count)
+        self.written += len(records)
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.encoding == 'binary_compressed' and self.written == self.point_count:
+            write_compressed(self.file, self.buffer, self.advance)
+        self.buffer = None
+        self.file.close()
+        self.file = None
+        if self.written != self.point_count:
+            raise ValueError(f"PCD 点数不一致: 文件头 {self.point_count}, 实际写入 {self.written}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # 出错时只关闭文件, 保留原始异常
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                self.buffer = None
+            return False
+        self.close()
+        return False
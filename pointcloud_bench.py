@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+- 生成合成 LAS 文件 (点数、点格式、范围、密度分布可配置, 按块写出, 支持数亿点)
+- 逐阶段计时: 元数据读取、LAS→PCD、分割 (有/无降采样)、增强、完整一键流程
+- 每个阶段在独立子进程中运行, 分别统计峰值内存
+- 结果保存为 JSON, 可与基线比较, 超过阈值的性能回退返回非零退出码
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+
+import las_io
+import grid_divider
+import pcd_enhance
+import pcd_io
+import pointcloud_jobs
+
+RESULT_VERSION = 1
+
+# 全部阶段 (按执行顺序)
+STAGES = ('metadata', 'las2pcd', 'divide', 'divide_leaf', 'enhance', 'pipeline')
+
+DENSITY_PATTERNS = ('uniform', 'clustered', 'strips')
+
+# 合成点云的坐标原点 (UTM 量级, 检验大坐标精度处理)
+SYNTHETIC_OFFSET = (500000.0, 4000000.0, 0.0)
+SYNTHETIC_SCALE = (0.001, 0.001, 0.001)
+
+# 元数据读取阶段重复次数 (单次耗时在微秒级)
+METADATA_CALLS = 1000
+
+
+def parse_count(text):
+    """解析点数: 1000000 / 10k / 2.5M / 1G"""
+    text = str(text).strip().upper()
+    factor = {'K': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9}.get(text[-1:], 1)
+    if factor > 1:
+        text = text[:-1]
+    return int(float(text) * factor)
+
+
+def synthetic_xyz(rng, n, extent, density, seed):
+    """生成一块点的局部坐标 (n, 3)"""
+    ex, ey, ez = extent
+    xyz = np.empty((n, 3))
+
+    if density == 'clustered':
+        # 固定的 16 个聚类中心 (所有块相同), 模拟城区等高密度区域
+        centers = np.random.default_rng(seed).uniform((0, 0), (ex, ey), (16, 2))
+        which = rng.integers(0, len(centers), n)
+        xyz[:, 0] = rng.normal(centers[which, 0], ex / 20)
+        xyz[:, 1] = rng.normal(centers[which, 1], ey / 20)
+    elif density == 'strips':
+        # 8 条沿 x 方向的航带 / 道路, 点集中在带中心附近
+        strips = (np.arange(8) + 0.5) * ey / 8
+        xyz[:, 0] = rng.uniform(0, ex, n)
+        xyz[:, 1] = rng.normal(strips[rng.integers(0, len(strips), n)], ey / 64)
+    else:
+        xyz[:, 0] = rng.uniform(0, ex, n)
+        xyz[:, 1] = rng.uniform(0, ey, n)
+
+    np.clip(xyz[:, 0], 0, ex, out=xyz[:, 0])
+    np.clip(xyz[:, 1], 0, ey, out=xyz[:, 1])
+    # 起伏地面 + 随机高度
+    xyz[:, 2] = ez * 0.25 * (1 + np.sin(xyz[:, 0] / ex * 2 * np.pi)) + rng.uniform(0, ez * 0.5, n)
+    return xyz
+
+
+def las_header_bytes(point_format, record_length, point_count, mins, maxs):
+    """构造 LAS 公共文件头 (格式 6 以上使用 LAS 1.4)"""
+    version = (1, 4) if point_format >= 6 else (1, 2)
+    header_size = 375 if version >= (1, 4) else 227
+    header = bytearray(header_size)
+    header[0:4] = b'LASF'
+    header[24:26] = bytes(version)
+    header[26:26 + 9] = b'SYNTHETIC'
+    header[58:58 + 16] = b'pointcloud_bench'
+    legacy_count = point_count if point_format < 6 and point_count < 1 << 32 else 0
+    struct.pack_into('<HIIBHI', header, 94, header_size, header_size, 0,
+                     point_format, record_length, legacy_count)
+    struct.pack_into('<3d', header, 131, *SYNTHETIC_SCALE)
+    struct.pack_into('<3d', header, 155, *SYNTHETIC_OFFSET)
+    struct.pack_into('<6d', header, 179, maxs[0], mins[0], maxs[1], mins[1], maxs[2], mins[2])
+    if version >= (1, 4):
+        struct.pack_into('<Q', header, 247, point_count)
+    return bytes(header)
+
+
+def write_synthetic_las(path, point_count, point_format=3, extent=(1000.0, 1000.0, 50.0),
+                        density='uniform', seed=0, chunk_points=las_io.DEFAULT_CHUNK_POINTS,
+                        progress=None):
+    """按块生成合成 LAS 文件 (内存只与块大小相关), 返回文件大小"""
+    emit = progress or (lambda message: None)
+    if density not in DENSITY_PATTERNS:
+        raise ValueError(f"未知的密度分布: {density}")
+
+    record_length = las_io.POINT_FORMATS[point_format][0]
+    dtype = las_io.point_dtype(point_format, record_length)
+    header_size = len(las_header_bytes(point_format, record_length, 0, (0, 0, 0), (0, 0, 0)))
+    mins = np.full(3, np.inf)
+    maxs = np.full(3, -np.inf)
+
+    with open(path, 'wb') as f:
+        f.write(bytes(header_size))
+        for idx, begin in enumerate(range(0, point_count, chunk_points)):
+            n = min(chunk_points, point_count - begin)
+            rng = np.random.default_rng([seed, idx])
+            xyz = synthetic_xyz(rng, n, extent, density, seed)
+
+            records = np.zeros(n, dtype=dtype)
+            for axis, name in enumerate(('X', 'Y', 'Z')):
+                records[name] = np.rint(xyz[:, axis] / SYNTHETIC_SCALE[axis])
+            records['intensity'] = rng.integers(0, 65536, n)
+            if 'red' in dtype.names:
+                # 颜色随高度渐变并叠加噪声 (16 位)
+                shade = (xyz[:, 2] / extent[2] * 40000).astype(np.int64)
+                for name in ('red', 'green', 'blue'):
+                    records[name] = np.clip(shade + rng.integers(0, 25000, n), 0, 65535)
+            records.tofile(f)
+
+            coords = records[['X', 'Y', 'Z']]
+            for axis, name in enumerate(('X', 'Y', 'Z')):
+                values = coords[name]
+                mins[axis] = min(mins[axis], values.min() * SYNTHETIC_SCALE[axis] + SYNTHETIC_OFFSET[axis])
+                maxs[axis] = max(maxs[axis], values.max() * SYNTHETIC_SCALE[axis] + SYNTHETIC_OFFSET[axis])
+
+            done = begin + n
+            if idx % 16 == 15 or done == point_count:
+                emit(f"已生成 {done:,} / {point_count:,} 点")
+
+        if point_count == 0:
+            mins[:] = maxs[:] = 0
+        f.seek(0)
+        f.write(las_header_bytes(point_format, record_length, point_count, mins, maxs))
+
+    return os.path.getsize(path)
+
+
+def peak_rss_mb():
+    """当前进程及其已结束子进程的峰值内存 (MB)"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss 在 Linux 上单位为 KB, macOS 上为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_stage(stage, config, paths):
+    """子进程中执行一个阶段, 返回测量结果"""
+    las_file, pcd_file, out_dir = paths['las'], paths['pcd'], paths['out']
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    conversion_type = config['conversion_type']
+    workers = config['workers']
+
+    started = time.perf_counter()
+    if stage == 'metadata':
+        for _ in range(METADATA_CALLS):
+            metadata = las_io.read_las_metadata(las_file)
+        points = metadata['point_count']
+        data_bytes = None
+    elif stage == 'las2pcd':
+        points = las_io.convert_las_to_pcd(las_file, pcd_file, conversion_type,
+                                           encoding=config['encoding'])
+        data_bytes = os.path.getsize(las_file)
+    elif stage in ('divide', 'divide_leaf'):
+        leaf_size = config['leaf_size'] if stage == 'divide_leaf' else 0.0
+        grid_divider.divide_pcd_files([pcd_file], out_dir, 'bench', config['grid_size'],
+                                      config['grid_size'], leaf_size, workers=workers,
+                                      encoding=config['encoding'])
+        points = pcd_io.read_header(pcd_file)['points']
+        data_bytes = os.path.getsize(pcd_file)
+    elif stage == 'enhance':
+        pcd_enhance.enhance_pcd(pcd_file, os.path.join(out_dir, 'enhanced.pcd'))
+        points = pcd_io.read_header(pcd_file)['points']
+        data_bytes = os.path.getsize(pcd_file)
+    elif stage == 'pipeline':
+        job = pointcloud_jobs.ConversionJob('pipeline', {
+            'input_file': las_file, 'output_dir': out_dir, 'conversion_type': conversion_type,
+            'grid_size': config['grid_size'], 'leaf_size': config['leaf_size'],
+            'enhance': conversion_type == 'rgb', 'workers': workers, 'encoding': config['encoding'],
+        })
+        result = {}
+        job.finished.connect(lambda success, message: result.update(success=success, message=message))
+        job.run()
+        if not result.get('success'):
+            raise RuntimeError(result.get('message', '一键流程失败'))
+        points = las_io.read_las_header(las_file)['point_count']
+        data_bytes = os.path.getsize(las_file)
+    else:
+        raise ValueError(f"未知的阶段: {stage}")
+    seconds = time.perf_counter() - started
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    if stage == 'metadata':
+        # 报告单次读取耗时
+        seconds /= METADATA_CALLS
+    return {
+        'seconds': seconds,
+        'points': points,
+        'bytes': data_bytes,
+        'points_per_sec': points / seconds if data_bytes is not None and seconds > 0 else None,
+        'mb_per_sec': data_bytes / seconds / (1024 * 1024) if data_bytes and seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def measure_stage(stage, config, paths, repeat):
+    """每次在新的子进程中执行, 取最快的一次 (峰值内存取最大值)"""
+    best = None
+    peak = None
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_stage, stage, config, paths).result()
+        if result['peak_rss_mb'] is not None:
+            peak = max(peak or 0, result['peak_rss_mb'])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    best['peak_rss_mb'] = peak
+    best['repeat'] = repeat
+    return best
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """与基线比较, 返回 ({阶段: 相对耗时}, [回退的阶段])
+
+    有吞吐量时按每点耗时比较 (点数不同时仍有参考意义), 否则按耗时比较
+    """
+    ratios = {}
+    regressions = []
+    for stage, result in results['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if not base or not base.get('seconds'):
+            continue
+        if base.get('points_per_sec') and result['points_per_sec']:
+            ratios[stage] = base['points_per_sec'] / result['points_per_sec']
+        else:
+            ratios[stage] = result['seconds'] / base['seconds']
+        if ratios[stage] > 1 + threshold:
+            regressions.append(stage)
+    return ratios, regressions
+
+
+def format_table(results, ratios=None):
+    """结果汇总表"""
+    ratios = ratios or {}
+    lines = [f"{'阶段':<12}{'耗时 (s)':>12}{'点/秒':>14}{'MB/s':>10}{'峰值内存 (MB)':>15}{'相对基线':>10}"]
+    for stage, r in results['stages'].items():
+        pps = f"{r['points_per_sec']:,.0f}" if r['points_per_sec'] else '-'
+        mbs = f"{r['mb_per_sec']:.1f}" if r['mb_per_sec'] else '-'
+        rss = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else '-'
+        ratio = f"{ratios[stage]:.2f}x" if stage in ratios else '-'
+        seconds = f"{r['seconds'] * 1e6:.1f} µs" if stage == 'metadata' else f"{r['seconds']:.3f}"
+        lines.append(f"{stage:<12}{seconds:>12}{pps:>14}{mbs:>10}{rss:>15}{ratio:>10}")
+    return '\n'.join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="点云转换性能基准测试")
+    parser.add_argument('--points', default='1M', help="合成点数, 如 1M / 50M / 500M (默认 1M)")
+    parser.add_argument('--format', dest='point_format', type=int, default=3,
+                        choices=sorted(las_io.POINT_FORMATS), help="LAS 点格式 (默认 3)")
+    parser.add_argument('--extent', type=float, nargs=3, default=(1000.0, 1000.0, 50.0),
+                        metavar=('X', 'Y', 'Z'), help="范围 (米, 默认 1000 1000 50)")
+    parser.add_argument('--density', choices=DENSITY_PATTERNS, default='uniform', help="密度分布")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--grid', dest='grid_size', type=float, default=20.0, help="网格大小 (默认 20)")
+    parser.add_argument('--leaf', dest='leaf_size', type=float, default=0.2,
+                        help="divide_leaf / pipeline 的降采样大小 (默认 0.2)")
+    parser.add_argument('--workers', type=int, default=pointcloud_jobs.default_workers())
+    parser.add_argument('--encoding', choices=pcd_io.PCD_ENCODINGS, default='binary')
+    parser.add_argument('--repeat', type=int, default=1, help="每个阶段重复次数, 取最快一次")
+    parser.add_argument('--work-dir', help="工作目录 (默认临时目录, 结束后删除)")
+    parser.add_argument('--output', help="结果 JSON 文件")
+    parser.add_argument('--baseline', help="基线结果 JSON, 用于比较")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="允许的耗时增加比例, 超过即视为回退 (默认 0.15)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    point_count = parse_count(args.points)
+    has_rgb = las_io.POINT_FORMATS[args.point_format][1] is not None
+    config = {
+        'points': point_count,
+        'point_format': args.point_format,
+        'extent': list(args.extent),
+        'density': args.density,
+        'seed': args.seed,
+        'conversion_type': 'rgb' if has_rgb else 'intensity',
+        'grid_size': args.grid_size,
+        'leaf_size': args.leaf_size,
+        'workers': args.workers,
+        'encoding': args.encoding,
+    }
+    stages = [stage for stage in STAGES if stage in args.stages]
+    if not has_rgb and 'enhance' in stages:
+        print(f"点格式 {args.point_format} 不含颜色, 跳过 enhance 阶段")
+        stages.remove('enhance')
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pointcloud_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    paths = {
+        'las': os.path.join(work_dir, 'synthetic.las'),
+        'pcd': os.path.join(work_dir, 'synthetic.pcd'),
+        'out': os.path.join(work_dir, 'out'),
+    }
+
+    try:
+        print(f"生成合成 LAS: {point_count:,} 点, 格式 {args.point_format}, {args.density}")
+        started = time.perf_counter()
+        size = write_synthetic_las(paths['las'], point_count, args.point_format, args.extent,
+                                   args.density, args.seed, progress=print)
+        print(f"✓ {paths['las']} ({size / (1024 * 1024):.1f} MB, {time.perf_counter() - started:.1f}s)")
+
+        results = {
+            'version': RESULT_VERSION,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'cpu_count': os.cpu_count(),
+            },
+            'config': config,
+            'stages': {},
+        }
+
+        for stage in stages:
+            # 分割 / 增强需要 PCD 输入, 未测 las2pcd 时先生成 (不计时)
+            if stage in ('divide', 'divide_leaf', 'enhance') and not os.path.exists(paths['pcd']):
+                las_io.convert_las_to_pcd(paths['las'], paths['pcd'], config['conversion_type'],
+                                          encoding=config['encoding'])
+            print(f"运行阶段: {stage}")
+            results['stages'][stage] = measure_stage(stage, config, paths, args.repeat)
+
+        ratios = {}
+        regressions = []
+        if args.baseline:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+            if baseline.get('config') != config:
+                print("⚠️  基线的测试配置与本次不同, 比较结果仅供参考")
+            ratios, regressions = compare_with_baseline(results, baseline, args.threshold)
+
+        print()
+        print(format_table(results, ratios))
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"\n结果已保存: {args.output}")
+
+        if regressions:
+            print(f"\n✗ 性能回退 (超过 {args.threshold:.0%}): {', '.join(regressions)}")
+            return 1
+        return 0
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
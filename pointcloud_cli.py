@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+点云地图转换工具 - 命令行版本
+不导入 PyQt5, 可在无图形界面的渲染节点或 cron 中运行, 与图形界面共用 pointcloud_jobs.ConversionJob
+
+子命令: las2pcd / divide / enhance / batch / pipeline / info / tiles (查询网格索引 / LOD 级别) / run (执行 YAML/JSON 任务文件)
+进度默认以 JSON lines 输出到标准输出 (每行一个事件), --text 输出纯文本日志
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+import yaml
+
+import grid_divider
+import las_metadata
+import lod_pyramid
+import pcd_io
+import job_memory
+import job_scheduler
+import pointcloud_jobs
+import tile_index
+from metadata_cache import MetadataCache
+
+# 各任务的默认参数 (与图形界面的默认值一致)
+DEFAULTS = {
+    'las2pcd': {'conversion_type': 'rgb', 'engine': 'native', 'encoding': 'binary', 'origin': None,
+                'workers': None},
+    'divide': {'prefix': 'pointcloud_map', 'grid_size_x': 20, 'grid_size_y': 20, 'leaf_size': 0.2,
+               'merge_pcds': False, 'voxel_mode': 'centroid', 'engine': 'native', 'workers': None,
+               'encoding': 'binary', 'tiling': 'grid', 'max_tile_points': None, 'max_tile_mb': None,
+               'memory_limit_mb': None},
+    'enhance': {'gamma': 0.8, 'contrast': 1.0, 'auto_gamma': False, 'engine': 'native', 'encoding': None},
+    'batch': {'conversion_type': 'rgb', 'engine': 'native', 'encoding': 'binary', 'workers': None,
+              'incremental': True},
+    'pipeline': {'conversion_type': 'rgb', 'grid_size': 20, 'leaf_size': 0.2, 'enhance': False,
+                 'auto_gamma': False, 'fused': True, 'voxel_mode': 'centroid', 'workers': None,
+                 'encoding': 'binary', 'tiling': 'grid', 'max_tile_points': None, 'max_tile_mb': None,
+                 'lod_levels': 0, 'memory_limit_mb': None},
+}
+
+# 各任务的必填参数
+REQUIRED = {
+    'las2pcd': ('input_file', 'output_file'),
+    'divide': ('input_files', 'output_dir'),
+    'enhance': ('input_file', 'output_file'),
+    'batch': ('input_files', 'output_dir'),
+    'pipeline': ('input_file', 'output_dir'),
+}
+
+# 任务文件中按任务文件所在目录解析的路径参数
+PATH_KEYS = ('input_file', 'output_file', 'output_dir')
+
+
+class Reporter:
+    """输出事件: JSON lines (默认) 或纯文本"""
+
+    def __init__(self, stream, text=False):
+        self.stream = stream
+        self.text = text
+
+    def event(self, kind, **fields):
+        if self.text:
+            line = self.format_text(kind, fields)
+            if line is None:
+                return
+        else:
+            record = {'event': kind, 'time': round(time.time(), 3)}
+            record.update(fields)
+            line = json.dumps(record, ensure_ascii=False)
+        self.stream.write(line + '\n')
+        self.stream.flush()
+
+    @staticmethod
+    def format_text(kind, fields):
+        if kind == 'progress':
+            return fields['message']
+        if kind == 'start':
+            return f"=== {fields['task']} ==="
+        if kind == 'finished':
+            mark = '✓' if fields['success'] else '✗'
+            return f"{mark} {fields['message']} ({fields['elapsed']:.1f}s)"
+        if kind == 'info':
+            return f"{fields['file']}:\n{json.dumps(fields['metadata'], ensure_ascii=False, indent=2)}"
+        if kind == 'tile':
+            return fields['path']
+        if kind == 'query':
+            level = '' if fields.get('lod_level') is None else f"LOD {fields['lod_level']}, "
+            return f"{fields['tiles']} / {fields['total']} 个网格 ({level}查询 {fields['elapsed_us']} µs)"
+        if kind == 'error':
+            return f"✗ {fields['message']}"
+        return None
+
+
+def prepare_params(task_type, values):
+    """合并默认参数并检查必填项, 返回 ConversionJob 参数"""
+    if task_type not in DEFAULTS:
+        raise ValueError(f"未知的任务类型: {task_type}")
+
+    params = dict(DEFAULTS[task_type])
+    params.update({key: value for key, value in values.items() if value is not None})
+    missing = [key for key in REQUIRED[task_type] if not params.get(key)]
+    if missing:
+        raise ValueError(f"{task_type} 缺少参数: {', '.join(missing)}")
+    if params['encoding'] is not None and params['encoding'] not in pcd_io.PCD_ENCODINGS:
+        raise ValueError(f"未知的 PCD 编码: {params['encoding']}")
+
+    if 'output_dir' in params:
+        os.makedirs(params['output_dir'], exist_ok=True)
+    if params.get('output_file'):
+        os.makedirs(os.path.dirname(os.path.abspath(params['output_file'])), exist_ok=True)
+    if task_type == 'batch':
+        params['tasks'] = pointcloud_jobs.build_batch_tasks(
+            params['input_files'], params['output_dir'], params['conversion_type'],
+            params['encoding'], params['engine'])
+    if params.get('origin') is not None:
+        params['origin'] = tuple(float(v) for v in params['origin'])
+    return params
+
+
+def run_job(task_type, params, reporter):
+    """执行一个任务, 返回是否成功"""
+    job = pointcloud_jobs.ConversionJob(task_type, params)
+    result = {}
+    job.progress.connect(lambda message: reporter.event('progress', task=task_type, message=message))
+    job.finished.connect(lambda success, message: result.update(success=success, message=message))
+    job.progress_value.connect(lambda state: reporter.event('progress_value', task=task_type, **state))
+    job.stage_event.connect(lambda record: reporter.event(
+        record['event'], **{key: value for key, value in record.items() if key != 'event'}))
+
+    # 任务依次运行, 实测内存可以直接用于修正内存估算
+    with contextlib.redirect_stdout(sys.stderr):
+        memory_model = job_memory.MemoryModel()
+        estimate = memory_model.estimate(task_type, params)
+    reporter.event('start', task=task_type,
+                   params={key: value for key, value in params.items() if key != 'tasks'},
+                   estimated_memory_mb=round(estimate) if estimate is not None else None)
+    started = time.time()
+    # 任务中零散的 print 输出到 stderr, 保证 stdout 只有事件
+    with contextlib.redirect_stdout(sys.stderr):
+        job.run()
+
+    success = result.get('success', False)
+    if success:
+        workers = job_scheduler.job_resources(task_type, params)['cpu']
+        with contextlib.redirect_stdout(sys.stderr):
+            memory_model.learn(task_type, params, job_memory.measured_memory_mb(job.metrics, workers))
+    reporter.event('finished', task=task_type, success=success,
+                   message=result.get('message', '任务没有报告结果'),
+                   elapsed=round(time.time() - started, 3), report=job.report_file)
+    return success
+
+
+def run_info(files, reporter, use_cache=True):
+    """输出 LAS 元数据"""
+    cache = MetadataCache() if use_cache else None
+    ok = True
+    for las_file in files:
+        with contextlib.redirect_stdout(sys.stderr):
+            metadata = las_metadata.read_metadata(las_file, cache)
+        if metadata:
+            reporter.event('info', file=las_file, metadata=metadata)
+        else:
+            reporter.event('error', file=las_file, message=f"无法读取元数据: {las_file}")
+            ok = False
+    return ok
+
+
+def run_tiles(args, reporter):
+    """查询与矩形 / 圆形范围相交的网格, 逐个输出后输出汇总
+
+    指定 --max-error 时按 LOD 清单选择误差上限满足要求的最粗一级, 在该级的网格中查询
+    """
+    directory = args.directory
+    lod_level = None
+    if args.max_error is not None:
+        level = lod_pyramid.select_level(lod_pyramid.load_manifest(directory, args.prefix), args.max_error)
+        directory = os.path.normpath(os.path.join(directory, level['directory']))
+        lod_level = level['level']
+    with contextlib.redirect_stdout(sys.stderr):
+        index = tile_index.load_index(directory, args.prefix, args.rebuild, print)
+    start = time.perf_counter()
+    if args.bbox:
+        indices = index.query_bbox(*args.bbox)
+    else:
+        indices = index.query_radius(*args.radius)
+    elapsed = time.perf_counter() - start
+    for idx in indices:
+        entry = index.entry(idx)
+        reporter.event('tile', path=os.path.join(directory, entry['file']), **entry)
+    reporter.event('query', tiles=len(indices), total=len(index), elapsed_us=round(elapsed * 1e6, 1),
+                   lod_level=lod_level)
+
+
+def load_job_file(job_file):
+    """读取 YAML/JSON 任务文件, 返回 [(任务类型, 参数)]
+
+    格式: {'jobs': [{'task': 'pipeline', 'input_file': ..., ...}, ...]},
+    也可以是单个任务或任务列表; 相对路径按任务文件所在目录解析
+    """
+    with open(job_file, 'r') as f:
+        data = yaml.safe_load(f)
+
+    if isinstance(data, dict):
+        data = data.get('jobs', [data])
+    if not isinstance(data, list):
+        raise ValueError(f"任务文件格式错误: {job_file}")
+
+    base_dir = os.path.dirname(os.path.abspath(job_file))
+    jobs = []
+    for entry in data:
+        values = dict(entry)
+        task_type = values.pop('task', None)
+        for key in PATH_KEYS:
+            if key in values:
+                values[key] = os.path.join(base_dir, os.path.expanduser(values[key]))
+        if 'input_files' in values:
+            values['input_files'] = [os.path.join(base_dir, os.path.expanduser(path))
+                                     for path in values['input_files']]
+        jobs.append((task_type, values))
+    return jobs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="点云地图转换工具 (命令行版本)")
+    parser.add_argument('--text', action='store_true', help="输出纯文本日志 (默认输出 JSON lines)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    # 子命令之后也可以写 --text
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('--text', action='store_true', default=argparse.SUPPRESS,
+                        help="输出纯文本日志 (默认输出 JSON lines)")
+
+    def add_tiling(p):
+        p.add_argument('--tiling', choices=['grid', 'adaptive'],
+                       help="分块方式: 固定网格 (默认) / 自适应四叉树 (网格大小为最大分块)")
+        p.add_argument('--max-tile-points', type=int, help="自适应分块每块最大点数")
+        p.add_argument('--max-tile-mb', type=float, help="自适应分块每块最大 MB (默认不限制)")
+        p.add_argument('--memory-limit', dest='memory_limit_mb', type=float,
+                       help=f"分桶缓存上限 (MB, 超过后落盘, 默认 {grid_divider.DEFAULT_MEMORY_LIMIT // grid_divider.MB})")
+
+    def add_common(p, workers=False):
+        p.add_argument('--engine', choices=['native', 'external'], help="转换引擎 (默认 native)")
+        p.add_argument('--encoding', choices=pcd_io.PCD_ENCODINGS, help="输出 PCD 编码 (默认 binary)")
+        p.add_argument('--timeout', type=float, help="外部程序超时 (秒, 默认不限)")
+        if workers:
+            p.add_argument('--workers', type=int, help="并行数 (默认 CPU 核数)")
+
+    p = sub.add_parser('las2pcd', parents=[output], help="LAS → PCD 转换")
+    p.add_argument('input_file')
+    p.add_argument('output_file')
+    p.add_argument('--type', dest='conversion_type', choices=['rgb', 'intensity'])
+    p.add_argument('--origin', nargs=3, type=float, metavar=('X0', 'Y0', 'Z0'), help="自定义原点")
+    add_common(p, workers=True)
+
+    p = sub.add_parser('divide', parents=[output], help="点云分割")
+    p.add_argument('input_files', nargs='+')
+    p.add_argument('-o', '--output-dir', dest='output_dir', required=True)
+    p.add_argument('--prefix')
+    p.add_argument('--grid-x', dest='grid_size_x', type=float)
+    p.add_argument('--grid-y', dest='grid_size_y', type=float)
+    p.add_argument('--leaf', dest='leaf_size', type=float, help="降采样叶子大小, 0 跳过")
+    p.add_argument('--voxel-mode', choices=['centroid', 'first'])
+    p.add_argument('--merge', dest='merge_pcds', action='store_true', default=None)
+    add_tiling(p)
+    add_common(p, workers=True)
+
+    p = sub.add_parser('enhance', parents=[output], help="PCD 增强")
+    p.add_argument('input_file')
+    p.add_argument('output_file')
+    p.add_argument('--gamma', type=float)
+    p.add_argument('--contrast', type=float)
+    p.add_argument('--auto-gamma', action='store_true', default=None)
+    add_common(p)
+
+    p = sub.add_parser('batch', parents=[output], help="批量 LAS → PCD 转换")
+    p.add_argument('input_files', nargs='+')
+    p.add_argument('-o', '--output-dir', dest='output_dir', required=True)
+    p.add_argument('--type', dest='conversion_type', choices=['rgb', 'intensity'])
+    p.add_argument('--no-incremental', dest='incremental', action='store_false', default=None,
+                   help="忽略 batch_manifest.json, 全部重新转换")
+    add_common(p, workers=True)
+
+    p = sub.add_parser('pipeline', parents=[output], help="一键流程: LAS → 分割 → 增强 (可选)")
+    p.add_argument('input_file')
+    p.add_argument('-o', '--output-dir', dest='output_dir', required=True)
+    p.add_argument('--type', dest='conversion_type', choices=['rgb', 'intensity'])
+    p.add_argument('--grid', dest='grid_size', type=float)
+    p.add_argument('--leaf', dest='leaf_size', type=float, help="降采样叶子大小, 0 跳过")
+    p.add_argument('--voxel-mode', choices=['centroid', 'first'])
+    p.add_argument('--enhance', action='store_true', default=None)
+    p.add_argument('--auto-gamma', action='store_true', default=None)
+    p.add_argument('--no-fused', dest='fused', action='store_false', default=None,
+                   help="先生成中间 PCD 再分割")
+    p.add_argument('--lod-levels', type=int,
+                   help=f"LOD 金字塔级数 (体素 2x, 4x, 8x…, 默认 0 不生成, 最多 {lod_pyramid.MAX_LOD_LEVELS})")
+    add_tiling(p)
+    add_common(p, workers=True)
+
+    p = sub.add_parser('info', parents=[output], help="读取 LAS 元数据")
+    p.add_argument('files', nargs='+')
+    p.add_argument('--no-cache', action='store_true', help="不使用元数据缓存")
+
+    p = sub.add_parser('tiles', parents=[output], help="查询覆盖指定范围的网格 (网格索引)")
+    p.add_argument('directory', help="分割输出目录")
+    p.add_argument('--prefix', default='pointcloud_map')
+    area = p.add_mutually_exclusive_group(required=True)
+    area.add_argument('--bbox', nargs=4, type=float, metavar=('MIN_X', 'MIN_Y', 'MAX_X', 'MAX_Y'),
+                      help="矩形范围 (分割坐标系)")
+    area.add_argument('--radius', nargs=3, type=float, metavar=('X', 'Y', 'R'), help="圆形范围")
+    p.add_argument('--rebuild', action='store_true', help="由元数据和网格文件重建索引")
+    p.add_argument('--max-error', type=float,
+                   help="允许的误差 (米): 在 LOD 清单中误差上限满足要求的最粗一级查询")
+
+    p = sub.add_parser('run', parents=[output], help="执行 YAML/JSON 任务文件")
+    p.add_argument('job_file')
+    p.add_argument('--keep-going', action='store_true', help="某个任务失败后继续执行后续任务")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(sys.stdout, args.text)
+
+    try:
+        if args.command == 'info':
+            return 0 if run_info(args.files, reporter, not args.no_cache) else 1
+        if args.command == 'tiles':
+            run_tiles(args, reporter)
+            return 0
+
+        if args.command == 'run':
+            jobs = load_job_file(args.job_file)
+        else:
+            values = {key: value for key, value in vars(args).items() if key not in ('command', 'text')}
+            jobs = [(args.command, values)]
+
+        failed = 0
+        for task_type, values in jobs:
+            if not run_job(task_type, prepare_params(task_type, values), reporter):
+                failed += 1
+                if not getattr(args, 'keep_going', False):
+                    break
+        return 1 if failed else 0
+
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        reporter.event('error', message=str(e))
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
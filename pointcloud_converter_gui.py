@@ -6,396 +6,131 @@
 
 import sys
 import os
-import subprocess
-import yaml
-import re
-import json
-from pathlib import Path
+from functools import partial
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QLineEdit, QTextEdit, QFileDialog,
+    QPushButton, QLabel, QLineEdit, QTextEdit, QPlainTextEdit, QFileDialog,
     QGroupBox, QProgressBar, QMessageBox, QTabWidget, QCheckBox,
     QListWidget, QSpinBox, QDoubleSpinBox, QComboBox, QGridLayout,
     QRadioButton, QButtonGroup, QFrame, QTableWidget, QTableWidgetItem,
     QHeaderView
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QThreadPool, QRunnable, QObject, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QTextCursor
 
+import job_memory
+import job_progress
+import job_scheduler
+import las_metadata
+import lod_pyramid
+import pcd_enhance
+import pointcloud_jobs
+import quadtree_tiling
+import tile_index
+from log_buffer import LogBuffer, new_log_path
+from metadata_cache import MetadataCache
+
+# 日志合并显示的间隔 (毫秒) 和日志窗口保留的最大行数
+LOG_FLUSH_INTERVAL = 100
+LOG_MAX_LINES = 5000
+
+# 任务面板刷新运行时间的间隔 (毫秒)
+JOBS_REFRESH_INTERVAL = 1000
+
+# 任务等待的资源名称
+RESOURCE_LABELS = {'cpu': 'CPU 槽位', 'disk': '磁盘槽位', 'memory': '内存', 'task': '同类任务结束'}
+
+
+def format_memory(mb):
+    """内存大小文本 (MB / GB)"""
+    return f"{mb / 1024:.1f} GB" if mb >= 1024 else f"{mb:.0f} MB"
+
 
 class ConversionWorker(QThread):
-    """后台转换线程"""
+    """后台转换线程, 在线程中执行 pointcloud_jobs.ConversionJob
+
+    日志行先写入 LogBuffer (同时写入日志文件), 每 LOG_FLUSH_INTERVAL 毫秒合并为一次 progress 信号,
+    避免外部程序大量输出时逐行发信号阻塞界面
+    """
     progress = pyqtSignal(str)
     finished = pyqtSignal(bool, str)
+    stage_event = pyqtSignal(dict)
+    progress_value = pyqtSignal(dict)
 
     def __init__(self, task_type, params):
         super().__init__()
         self.task_type = task_type
         self.params = params
+        self.log = LogBuffer(new_log_path(task_type))
+        if self.log.log_file:
+            self.log.append(f"完整日志: {self.log.log_file}")
+
+        self.reported = False
+        self.job = pointcloud_jobs.ConversionJob(task_type, params)
+        self.job.progress.connect(self.log.append)
+        self.job.finished.connect(self.on_job_finished)
+        self.job.stage_event.connect(self.stage_event.emit)
+        self.job.progress_value.connect(self.progress_value.emit)
+
+        # 定时器在界面线程中运行
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_FLUSH_INTERVAL)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.finished.connect(self.log_timer.stop)
+
+    def start(self):
+        self.log_timer.start()
+        super().start()
 
     def run(self):
         try:
-            if self.task_type == 'las2pcd':
-                self.convert_las_to_pcd()
-            elif self.task_type == 'divide':
-                self.divide_pointcloud()
-            elif self.task_type == 'enhance':
-                self.enhance_pcd()
-            elif self.task_type == 'batch':
-                self.batch_process()
-            elif self.task_type == 'pipeline':
-                self.pipeline_process()
+            self.job.run()
         except Exception as e:
-            self.finished.emit(False, f"处理失败: {str(e)}")
-
-    def convert_las_to_pcd(self):
-        """LAS转PCD"""
-        input_file = self.params['input_file']
-        output_file = self.params['output_file']
-        conversion_type = self.params['conversion_type']
-
-        # 选择转换程序
-        if conversion_type == 'rgb':
-            cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd']
-        else:
-            cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd_intensity']
-
-        cmd.extend([input_file, output_file])
-
-        self.progress.emit(f"执行命令: {' '.join(cmd)}")
-        self.progress.emit("开始转换...")
-
-        # 执行转换
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        # 实时输出
-        for line in process.stdout:
-            self.progress.emit(line.strip())
-
-        process.wait()
-
-        if process.returncode == 0:
-            # 检查输出文件
-            if os.path.exists(output_file):
-                size = os.path.getsize(output_file) / (1024 * 1024)  # MB
-                self.finished.emit(True, f"转换成功！输出文件: {output_file} ({size:.2f} MB)")
-            else:
-                self.finished.emit(False, "转换完成但未找到输出文件")
-        else:
-            stderr = process.stderr.read()
-            self.finished.emit(False, f"转换失败: {stderr}")
-
-    def divide_pointcloud(self):
-        """点云分割"""
-        input_files = self.params['input_files']
-        output_dir = self.params['output_dir']
-        prefix = self.params['prefix']
-        grid_size_x = self.params['grid_size_x']
-        grid_size_y = self.params['grid_size_y']
-        leaf_size = self.params['leaf_size']
-        merge_pcds = self.params['merge_pcds']
-
-        # 确保输出目录以斜杠结尾
-        if not output_dir.endswith('/'):
-            output_dir = output_dir + '/'
-
-        # 创建临时配置文件
-        config_file = '/tmp/pointcloud_divider_temp.yaml'
-        config = {
-            'pointcloud_divider': {
-                'grid_size_x': grid_size_x,
-                'grid_size_y': grid_size_y,
-                'leaf_size': leaf_size,
-                'merge_pcds': merge_pcds,
-                'use_large_grid': False
-            }
-        }
-
-        with open(config_file, 'w') as f:
-            yaml.dump(config, f)
-
-        self.progress.emit(f"配置参数:")
-        self.progress.emit(f"  输出目录: {output_dir}")
-        self.progress.emit(f"  文件前缀: {prefix}")
-        self.progress.emit(f"  网格大小: {grid_size_x}m x {grid_size_y}m")
-        self.progress.emit(f"  降采样: {'是 ('+str(leaf_size)+'m)' if leaf_size > 0 else '否'}")
-        self.progress.emit(f"  合并模式: {'是' if merge_pcds else '否'}")
-        self.progress.emit("")
-
-        # 构建命令
-        cmd = [
-            '/home/luo/map_ws/pointcloud_divider-master/build/pointcloud_divider',
-            str(len(input_files))
-        ]
-        cmd.extend(input_files)
-        cmd.extend([output_dir, prefix, config_file])
-
-        self.progress.emit(f"处理 {len(input_files)} 个文件...")
-        self.progress.emit("")
-
-        # 执行分割
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        # 实时输出
-        for line in process.stdout:
-            self.progress.emit(line.strip())
-
-        process.wait()
-
-        if process.returncode == 0:
-            # 统计输出文件
-            output_files = list(Path(output_dir).glob('*.pcd'))
-            metadata_file = os.path.join(output_dir, f'{prefix}_metadata.yaml')
-
-            msg = f"分割成功！\n"
-            msg += f"输出目录: {output_dir}\n"
-            msg += f"生成文件: {len(output_files)} 个PCD文件"
-
-            if os.path.exists(metadata_file):
-                msg += f"\n元数据文件: {prefix}_metadata.yaml"
-
-            self.finished.emit(True, msg)
-        else:
-            stderr = process.stderr.read()
-            self.finished.emit(False, f"分割失败: {stderr}")
-
-    def enhance_pcd(self):
-        """PCD增强"""
-        input_file = self.params['input_file']
-        output_file = self.params['output_file']
-
-        cmd = [
-            '/home/luo/map_ws/las2pcd/build/pcd_enhancer',
-            input_file,
-            output_file
-        ]
-
-        self.progress.emit(f"执行命令: {' '.join(cmd)}")
-        self.progress.emit("开始增强处理...")
-
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        for line in process.stdout:
-            self.progress.emit(line.strip())
-
-        process.wait()
-
-        if process.returncode == 0:
-            self.finished.emit(True, f"增强成功！输出文件: {output_file}")
-        else:
-            stderr = process.stderr.read()
-            self.finished.emit(False, f"增强失败: {stderr}")
-
-    def batch_process(self):
-        """批量处理"""
-        tasks = self.params['tasks']
-        total = len(tasks)
-        success_count = 0
-        fail_count = 0
-
-        for idx, task in enumerate(tasks):
-            self.progress.emit(f"\n{'='*60}")
-            self.progress.emit(f"[{idx+1}/{total}] 处理: {task['input_file']}")
-            self.progress.emit('='*60)
-
-            # 根据任务类型执行
-            if task['type'] == 'las2pcd':
-                cmd = [task['executable'], task['input_file'], task['output_file']]
-                if 'offsets' in task:
-                    cmd.extend(task['offsets'])
-            elif task['type'] == 'enhance':
-                cmd = [task['executable'], task['input_file'], task['output_file']]
-            else:
-                continue
-
-            process = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-
-            if process.returncode == 0:
-                success_count += 1
-                self.progress.emit(f"✓ 成功")
-            else:
-                fail_count += 1
-                self.progress.emit(f"✗ 失败: {process.stderr}")
-
-        self.progress.emit(f"\n{'='*60}")
-        self.progress.emit(f"批量处理完成:")
-        self.progress.emit(f"  总数: {total}")
-        self.progress.emit(f"  成功: {success_count}")
-        self.progress.emit(f"  失败: {fail_count}")
-        self.progress.emit('='*60)
-
-        self.finished.emit(True, f"批量处理完成\n成功: {success_count} / 失败: {fail_count}")
-
-    def pipeline_process(self):
-        """一键流程处理: LAS→PCD→分割→(可选)增强"""
-        input_file = self.params['input_file']
-        output_dir = self.params['output_dir']
-        conversion_type = self.params['conversion_type']
-        grid_size = self.params['grid_size']
-        leaf_size = self.params['leaf_size']
-        enhance = self.params['enhance']
-
-        # 确保输出目录以斜杠结尾
-        if not output_dir.endswith('/'):
-            output_dir = output_dir + '/'
+            # 任务未能报告结果时也要发出 finished, 否则调度器不会释放任务占用的资源
+            if not self.reported:
+                self.on_job_finished(False, f"处理失败: {str(e)}")
 
-        # 创建输出目录
-        os.makedirs(output_dir, exist_ok=True)
+    def cancel(self):
+        """取消任务: 结束子进程, 任务线程在下一次进度回调时停止"""
+        self.job.cancel()
 
-        # 阶段1: LAS → PCD
-        self.progress.emit("\n" + "="*60)
-        self.progress.emit("阶段 1/3: LAS → PCD 转换")
-        self.progress.emit("="*60)
+    def flush_log(self):
+        """一次性发出缓冲中的全部日志行"""
+        lines = self.log.drain()
+        if lines:
+            self.progress.emit('\n'.join(lines))
 
-        base_name = os.path.basename(input_file).rsplit('.', 1)[0]
-        temp_pcd = os.path.join(output_dir, base_name + '_temp.pcd')
+    def on_job_finished(self, success, message):
+        # 在工作线程中: 先发出剩余日志 (含结果) 再报告结果
+        self.reported = True
+        self.log.append(f"{'✓' if success else '✗'} {message}")
+        self.flush_log()
+        self.log.close()
+        self.finished.emit(success, message)
 
-        # 选择转换程序
-        if conversion_type == 'rgb':
-            las2pcd_cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd']
-        else:
-            las2pcd_cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd_intensity']
 
-        las2pcd_cmd.extend([input_file, temp_pcd])
-        self.progress.emit(f"执行命令: {' '.join(las2pcd_cmd)}")
+class MetadataSignals(QObject):
+    """元数据读取结果信号 (request_id, 文件路径, 元数据)"""
+    loaded = pyqtSignal(int, str, object)
 
-        process = subprocess.run(
-            las2pcd_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        if process.returncode != 0:
-            self.finished.emit(False, f"LAS转PCD失败: {process.stderr}")
-            return
 
-        self.progress.emit("✓ LAS转PCD完成")
-
-        # 阶段2: 点云分割
-        self.progress.emit("\n" + "="*60)
-        self.progress.emit("阶段 2/3: 点云分割")
-        self.progress.emit("="*60)
-
-        # 创建临时配置文件
-        config_file = '/tmp/pointcloud_divider_pipeline.yaml'
-        config = {
-            'pointcloud_divider': {
-                'grid_size_x': grid_size,
-                'grid_size_y': grid_size,
-                'leaf_size': leaf_size,
-                'merge_pcds': False,
-                'use_large_grid': False
-            }
-        }
+class MetadataLoader(QRunnable):
+    """在线程池中读取LAS元数据"""
 
-        with open(config_file, 'w') as f:
-            yaml.dump(config, f)
-
-        divide_cmd = [
-            '/home/luo/map_ws/pointcloud_divider-master/build/pointcloud_divider',
-            '1',
-            temp_pcd,
-            output_dir,
-            'pointcloud_map',
-            config_file
-        ]
-
-        self.progress.emit(f"网格大小: {grid_size}m x {grid_size}m")
-        self.progress.emit(f"降采样: {'是 ('+str(leaf_size)+'m)' if leaf_size > 0 else '否'}")
-
-        process = subprocess.run(
-            divide_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-
-        if process.returncode != 0:
-            self.finished.emit(False, f"点云分割失败: {process.stderr}")
-            return
-
-        self.progress.emit("✓ 点云分割完成")
-
-        # 删除临时PCD文件
-        if os.path.exists(temp_pcd):
-            os.remove(temp_pcd)
-            self.progress.emit(f"✓ 已清理临时文件")
-
-        # 阶段3: (可选) PCD增强
-        if enhance:
-            self.progress.emit("\n" + "="*60)
-            self.progress.emit("阶段 3/3: PCD增强处理")
-            self.progress.emit("="*60)
-
-            # 找到所有分割后的PCD文件
-            pcd_files = list(Path(output_dir).glob('pointcloud_map_*.pcd'))
-            total = len(pcd_files)
-            self.progress.emit(f"找到 {total} 个PCD文件需要增强")
-
-            success_count = 0
-            for idx, pcd_file in enumerate(pcd_files):
-                pcd_path = str(pcd_file)
-                enhanced_path = pcd_path.rsplit('.', 1)[0] + '_enhanced.pcd'
-
-                enhance_cmd = [
-                    '/home/luo/map_ws/las2pcd/build/pcd_enhancer',
-                    pcd_path,
-                    enhanced_path
-                ]
-
-                process = subprocess.run(
-                    enhance_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True
-                )
-
-                if process.returncode == 0:
-                    # 用增强后的文件替换原文件
-                    os.replace(enhanced_path, pcd_path)
-                    success_count += 1
-                    self.progress.emit(f"[{idx+1}/{total}] ✓ {os.path.basename(pcd_path)}")
-                else:
-                    self.progress.emit(f"[{idx+1}/{total}] ✗ {os.path.basename(pcd_path)} - {process.stderr}")
-
-            self.progress.emit(f"✓ 增强处理完成: 成功 {success_count}/{total}")
-        else:
-            self.progress.emit("\n阶段 3/3: 跳过增强处理")
-
-        # 统计最终结果
-        output_files = list(Path(output_dir).glob('pointcloud_map_*.pcd'))
-        metadata_file = os.path.join(output_dir, 'pointcloud_map_metadata.yaml')
-
-        self.progress.emit("\n" + "="*60)
-        self.progress.emit("一键流程处理完成!")
-        self.progress.emit("="*60)
-        self.progress.emit(f"输出目录: {output_dir}")
-        self.progress.emit(f"生成文件: {len(output_files)} 个PCD文件")
-        if os.path.exists(metadata_file):
-            self.progress.emit(f"元数据文件: pointcloud_map_metadata.yaml")
+    def __init__(self, request_id, las_file, reader, signals):
+        super().__init__()
+        self.request_id = request_id
+        self.las_file = las_file
+        self.reader = reader
+        self.signals = signals
 
-        self.finished.emit(True, f"一键流程完成！\n输出目录: {output_dir}\n生成 {len(output_files)} 个PCD文件")
+    def run(self):
+        try:
+            metadata = self.reader(self.las_file)
+        except Exception as e:
+            print(f"读取元数据失败: {e}")
+            metadata = None
+        self.signals.loaded.emit(self.request_id, self.las_file, metadata)
 
 
 class PointCloudConverterGUI(QMainWindow):
@@ -403,9 +138,44 @@ class PointCloudConverterGUI(QMainWindow):
 
     def __init__(self):
         super().__init__()
-        self.worker = None
+        self.metadata_cache = MetadataCache()
+
+        # 任务调度: 各选项卡提交任务, 按优先级、槽位数和内存预算启动; workers 保存运行中的线程
+        # 每个选项卡只有一个日志和进度条, 同类型的任务依次运行, 不同选项卡的任务可以同时运行
+        self.memory_model = job_memory.MemoryModel()
+        self.scheduler = job_scheduler.JobScheduler(
+            self.launch_job, memory_budget=job_memory.default_memory_budget(),
+            memory_model=self.memory_model, one_per_type=True)
+        self.scheduler.changed.connect(self.on_job_changed)
+        self.workers = {}
+
+        # 后台读取元数据: 输入防抖 + 请求编号 (忽略过期结果)
+        self.metadata_pool = QThreadPool()
+        self.metadata_pool.setMaxThreadCount(2)
+        self.metadata_signals = MetadataSignals()
+        self.metadata_signals.loaded.connect(self.on_las_metadata_loaded)
+        self.las_metadata_request = 0
+        self.las_metadata_timer = QTimer()
+        self.las_metadata_timer.setSingleShot(True)
+        self.las_metadata_timer.setInterval(300)
+        self.las_metadata_timer.timeout.connect(self.load_las_metadata)
+
         self.init_ui()
 
+        # 各任务类型对应的选项卡: (日志, 进度条, 日志回调, 完成回调, 状态栏文字)
+        self.job_views = {
+            'las2pcd': (self.las2pcd_log, self.las2pcd_progress, self.las2pcd_log.appendPlainText,
+                        self.on_las2pcd_finished, "正在转换..."),
+            'divide': (self.divide_log, self.divide_progress, self.divide_log.appendPlainText,
+                       self.on_divide_finished, "正在分割..."),
+            'enhance': (self.enhance_log, self.enhance_progress, self.enhance_log.appendPlainText,
+                        self.on_enhance_finished, "正在增强..."),
+            'batch': (self.batch_log, self.batch_progress, self.batch_log.appendPlainText,
+                      self.on_batch_finished, "正在批量处理..."),
+            'pipeline': (self.pipeline_log, self.pipeline_progress, self.on_pipeline_progress,
+                         self.on_pipeline_finished, "正在执行一键流程..."),
+        }
+
     def init_ui(self):
         self.setWindowTitle("点云地图转换工具")
         self.setGeometry(100, 100, 1200, 800)
@@ -451,8 +221,14 @@ class PointCloudConverterGUI(QMainWindow):
         self.pipeline_tab = self.create_pipeline_tab()
         self.tabs.addTab(self.pipeline_tab, "一键流程")
 
+        # 选项卡6: 任务队列
+        self.jobs_tab = self.create_jobs_tab()
+        self.tabs.addTab(self.jobs_tab, "任务队列")
+
         # 状态栏
         self.statusBar().showMessage("就绪")
+        self.jobs_status = QLabel()
+        self.statusBar().addPermanentWidget(self.jobs_status)
 
     def create_las2pcd_tab(self):
         """创建LAS转PCD选项卡"""
@@ -564,6 +340,24 @@ class PointCloudConverterGUI(QMainWindow):
         self.conversion_type.addItems(['RGB点云 (las2pcd)', '强度点云 (las2pcd_intensity)'])
         options_layout.addWidget(self.conversion_type, 0, 1, 1, 3)
 
+        # 转换引擎
+        options_layout.addWidget(QLabel("转换引擎:"), 1, 0)
+        self.conversion_engine = QComboBox()
+        self.conversion_engine.addItems(['内置引擎 (NumPy 内存映射)', '外部程序 (las2pcd)'])
+        options_layout.addWidget(self.conversion_engine, 1, 1, 1, 3)
+
+        # 输出编码
+        options_layout.addWidget(QLabel("输出编码:"), 2, 0)
+        self.conversion_encoding = self.create_encoding_combo()
+        options_layout.addWidget(self.conversion_encoding, 2, 1, 1, 3)
+
+        # 并行数
+        options_layout.addWidget(QLabel("并行数:"), 3, 0)
+        self.conversion_workers = QSpinBox()
+        self.conversion_workers.setRange(1, 256)
+        self.conversion_workers.setValue(pointcloud_jobs.default_workers())
+        self.conversion_workers.setToolTip("内置引擎把大文件按点范围切片, 由多个进程并行转换后拼接")
+        options_layout.addWidget(self.conversion_workers, 3, 1)
 
         layout.addWidget(options_group)
 
@@ -584,8 +378,9 @@ class PointCloudConverterGUI(QMainWindow):
         log_layout = QVBoxLayout()
         log_group.setLayout(log_layout)
 
-        self.las2pcd_log = QTextEdit()
+        self.las2pcd_log = QPlainTextEdit()
         self.las2pcd_log.setReadOnly(True)
+        self.las2pcd_log.setMaximumBlockCount(LOG_MAX_LINES)
         log_layout.addWidget(self.las2pcd_log)
 
         layout.addWidget(log_group)
@@ -670,11 +465,28 @@ class PointCloudConverterGUI(QMainWindow):
 
         info_label = QLabel("(设为0跳过降采样)")
         info_label.setStyleSheet("color: gray; font-size: 10px;")
-        params_layout.addWidget(info_label, 1, 2, 1, 2)
+        params_layout.addWidget(info_label, 1, 2)
+
+        self.divide_voxel_mode = QComboBox()
+        self.divide_voxel_mode.addItems(['质心 (centroid)', '首点 (first)'])
+        self.divide_voxel_mode.setToolTip("每个体素保留质心或第一个点 (仅内置引擎)")
+        params_layout.addWidget(self.divide_voxel_mode, 1, 3)
 
         self.merge_pcds_check = QCheckBox("合并为单个文件 (否则按网格分割)")
+        self.merge_pcds_check.setToolTip("降采样为 0 时直接拼接输入文件; 字段布局一致的 binary PCD 不重新解析点数据")
         params_layout.addWidget(self.merge_pcds_check, 2, 0, 1, 4)
 
+        params_layout.addWidget(QLabel("分割引擎:"), 3, 0)
+        self.divide_engine = QComboBox()
+        self.divide_engine.addItems(['内置引擎 (NumPy 向量化)', '外部程序 (pointcloud_divider)'])
+        params_layout.addWidget(self.divide_engine, 3, 1, 1, 3)
+
+        params_layout.addWidget(QLabel("输出编码:"), 4, 0)
+        self.divide_encoding = self.create_encoding_combo()
+        params_layout.addWidget(self.divide_encoding, 4, 1, 1, 3)
+
+        self.divide_tiling = self.create_tiling_widgets(params_layout, 5)
+
         layout.addWidget(params_group)
 
         # 分割按钮
@@ -689,13 +501,40 @@ class PointCloudConverterGUI(QMainWindow):
         self.divide_progress.setTextVisible(False)  # 不显示文字
         layout.addWidget(self.divide_progress)
 
+        # 网格查询 (读取输出目录中的网格索引)
+        query_group = QGroupBox("网格查询")
+        query_layout = QHBoxLayout()
+        query_group.setLayout(query_layout)
+
+        self.tile_query_mode = QComboBox()
+        self.tile_query_mode.addItems(['矩形 (min_x min_y max_x max_y)', '圆形 (x y 半径)'])
+        self.tile_query_mode.currentIndexChanged.connect(self.on_tile_query_mode_changed)
+        query_layout.addWidget(self.tile_query_mode)
+
+        self.tile_query_values = []
+        for _ in range(4):
+            spin = QDoubleSpinBox()
+            spin.setRange(-1e7, 1e7)
+            spin.setDecimals(2)
+            query_layout.addWidget(spin)
+            self.tile_query_values.append(spin)
+
+        query_btn = QPushButton("查询网格")
+        query_btn.setToolTip("在输出目录的网格索引中查找与范围相交的网格 (分割坐标系)")
+        query_btn.clicked.connect(self.query_tiles)
+        query_layout.addWidget(query_btn)
+
+        layout.addWidget(query_group)
+        self.tile_index_cache = {}
+
         # 日志
         log_group = QGroupBox("分割日志")
         log_layout = QVBoxLayout()
         log_group.setLayout(log_layout)
 
-        self.divide_log = QTextEdit()
+        self.divide_log = QPlainTextEdit()
         self.divide_log.setReadOnly(True)
+        self.divide_log.setMaximumBlockCount(LOG_MAX_LINES)
         log_layout.addWidget(self.divide_log)
 
         layout.addWidget(log_group)
@@ -738,15 +577,51 @@ class PointCloudConverterGUI(QMainWindow):
 
         layout.addWidget(output_group)
 
+        # 增强参数
+        params_group = QGroupBox("3. 增强参数")
+        params_layout = QGridLayout()
+        params_group.setLayout(params_layout)
+
+        params_layout.addWidget(QLabel("Gamma:"), 0, 0)
+        self.enhance_gamma = QDoubleSpinBox()
+        self.enhance_gamma.setRange(0.1, 5.0)
+        self.enhance_gamma.setDecimals(2)
+        self.enhance_gamma.setSingleStep(0.05)
+        self.enhance_gamma.setValue(pcd_enhance.DEFAULT_GAMMA)
+        params_layout.addWidget(self.enhance_gamma, 0, 1)
+
+        params_layout.addWidget(QLabel("对比度:"), 0, 2)
+        self.enhance_contrast = QDoubleSpinBox()
+        self.enhance_contrast.setRange(0.1, 5.0)
+        self.enhance_contrast.setDecimals(2)
+        self.enhance_contrast.setSingleStep(0.05)
+        self.enhance_contrast.setValue(1.0)
+        params_layout.addWidget(self.enhance_contrast, 0, 3)
+
+        self.enhance_auto_gamma = QCheckBox("自动 Gamma (根据颜色直方图选择)")
+        self.enhance_auto_gamma.toggled.connect(lambda checked: self.enhance_gamma.setEnabled(not checked))
+        params_layout.addWidget(self.enhance_auto_gamma, 1, 0, 1, 2)
+
+        params_layout.addWidget(QLabel("增强引擎:"), 1, 2)
+        self.enhance_engine = QComboBox()
+        self.enhance_engine.addItems(['内置引擎 (查找表)', '外部程序 (pcd_enhancer)'])
+        params_layout.addWidget(self.enhance_engine, 1, 3)
+
+        params_layout.addWidget(QLabel("输出编码:"), 2, 0)
+        self.enhance_encoding = self.create_encoding_combo(keep_input=True)
+        params_layout.addWidget(self.enhance_encoding, 2, 1, 1, 3)
+
+        layout.addWidget(params_group)
+
         # 说明
         info_group = QGroupBox("增强说明")
         info_layout = QVBoxLayout()
         info_group.setLayout(info_layout)
 
         info_text = QLabel(
-            "PCD增强功能将对RGB点云进行Gamma校正 (gamma=0.8)\n"
+            "PCD增强功能将对RGB点云进行Gamma校正和对比度调整\n"
             "这将提高点云的对比度和可视化效果\n"
-            "仅适用于RGB格式的点云文件"
+            "仅适用于RGB格式的点云文件 (外部程序 pcd_enhancer 固定 gamma=0.8)"
         )
         info_text.setStyleSheet("color: #555; padding: 10px;")
         info_layout.addWidget(info_text)
@@ -770,8 +645,9 @@ class PointCloudConverterGUI(QMainWindow):
         log_layout = QVBoxLayout()
         log_group.setLayout(log_layout)
 
-        self.enhance_log = QTextEdit()
+        self.enhance_log = QPlainTextEdit()
         self.enhance_log.setReadOnly(True)
+        self.enhance_log.setMaximumBlockCount(LOG_MAX_LINES)
         log_layout.addWidget(self.enhance_log)
 
         layout.addWidget(log_group)
@@ -811,6 +687,25 @@ class PointCloudConverterGUI(QMainWindow):
         self.batch_conversion_type.addItems(['RGB点云', '强度点云'])
         btn_layout.addWidget(self.batch_conversion_type)
 
+        # 并行任务数
+        btn_layout.addWidget(QLabel("并行数:"))
+        self.batch_workers = QSpinBox()
+        self.batch_workers.setRange(1, 256)
+        self.batch_workers.setValue(pointcloud_jobs.default_workers())
+        self.batch_workers.setToolTip("同时转换的文件数, 默认等于CPU核数")
+        btn_layout.addWidget(self.batch_workers)
+
+        # 输出编码
+        btn_layout.addWidget(QLabel("输出编码:"))
+        self.batch_encoding = self.create_encoding_combo()
+        btn_layout.addWidget(self.batch_encoding)
+
+        # 增量处理
+        self.batch_incremental = QCheckBox("跳过未变化的文件")
+        self.batch_incremental.setChecked(True)
+        self.batch_incremental.setToolTip("根据输出目录中的 batch_manifest.json 跳过已转换且未变化的文件, 中断后可继续")
+        btn_layout.addWidget(self.batch_incremental)
+
         layout.addLayout(btn_layout)
 
         # 文件列表表格
@@ -899,8 +794,9 @@ class PointCloudConverterGUI(QMainWindow):
         log_layout = QVBoxLayout()
         log_group.setLayout(log_layout)
 
-        self.batch_log = QTextEdit()
+        self.batch_log = QPlainTextEdit()
         self.batch_log.setReadOnly(True)
+        self.batch_log.setMaximumBlockCount(LOG_MAX_LINES)
         log_layout.addWidget(self.batch_log)
 
         layout.addWidget(log_group)
@@ -971,6 +867,10 @@ class PointCloudConverterGUI(QMainWindow):
         self.pipeline_enhance = QCheckBox("执行增强处理")
         options_layout.addWidget(self.pipeline_enhance, 0, 2)
 
+        self.pipeline_auto_gamma = QCheckBox("自动 Gamma")
+        self.pipeline_auto_gamma.setToolTip("根据全部网格的颜色直方图选择 Gamma (默认固定 0.8)")
+        options_layout.addWidget(self.pipeline_auto_gamma, 0, 3)
+
         options_layout.addWidget(QLabel("网格大小:"), 1, 0)
         self.pipeline_grid = QSpinBox()
         self.pipeline_grid.setRange(1, 1000)
@@ -986,6 +886,36 @@ class PointCloudConverterGUI(QMainWindow):
         self.pipeline_leaf.setSuffix(" m")
         options_layout.addWidget(self.pipeline_leaf, 1, 3)
 
+        self.pipeline_fused = QCheckBox("流式分割 (LAS 直接分割为网格, 不生成中间PCD)")
+        self.pipeline_fused.setChecked(True)
+        options_layout.addWidget(self.pipeline_fused, 2, 0, 1, 2)
+
+        options_layout.addWidget(QLabel("降采样方式:"), 2, 2)
+        self.pipeline_voxel_mode = QComboBox()
+        self.pipeline_voxel_mode.addItems(['质心 (centroid)', '首点 (first)'])
+        options_layout.addWidget(self.pipeline_voxel_mode, 2, 3)
+
+        options_layout.addWidget(QLabel("并行数:"), 3, 0)
+        self.pipeline_workers = QSpinBox()
+        self.pipeline_workers.setRange(1, 256)
+        self.pipeline_workers.setValue(pointcloud_jobs.default_workers())
+        self.pipeline_workers.setToolTip("降采样和增强阶段同时处理的网格数, 默认等于CPU核数")
+        options_layout.addWidget(self.pipeline_workers, 3, 1)
+
+        options_layout.addWidget(QLabel("输出编码:"), 3, 2)
+        self.pipeline_encoding = self.create_encoding_combo()
+        options_layout.addWidget(self.pipeline_encoding, 3, 3)
+
+        self.pipeline_tiling = self.create_tiling_widgets(options_layout, 4)
+
+        options_layout.addWidget(QLabel("LOD 级数:"), 5, 0)
+        self.pipeline_lod_levels = QSpinBox()
+        self.pipeline_lod_levels.setRange(0, lod_pyramid.MAX_LOD_LEVELS)
+        self.pipeline_lod_levels.setSpecialValueText("不生成")
+        self.pipeline_lod_levels.setToolTip("由全分辨率网格逐级生成体素 2x, 4x, 8x… 的低分辨率网格 "
+                                            "(pointcloud_map_lod/) 和清单 pointcloud_map_lod.json")
+        options_layout.addWidget(self.pipeline_lod_levels, 5, 1)
+
         layout.addWidget(options_group)
 
         # 开始按钮
@@ -1005,8 +935,9 @@ class PointCloudConverterGUI(QMainWindow):
         log_layout = QVBoxLayout()
         log_group.setLayout(log_layout)
 
-        self.pipeline_log = QTextEdit()
+        self.pipeline_log = QPlainTextEdit()
         self.pipeline_log.setReadOnly(True)
+        self.pipeline_log.setMaximumBlockCount(LOG_MAX_LINES)
         log_layout.addWidget(self.pipeline_log)
 
         layout.addWidget(log_group)
@@ -1015,174 +946,161 @@ class PointCloudConverterGUI(QMainWindow):
 
     # ==================== 辅助函数 ====================
 
-    def get_las_metadata(self, las_file):
-        """读取LAS文件元数据 - 优先使用pdal,备用lasinfo"""
+    def create_jobs_tab(self):
+        """创建任务队列选项卡"""
+        widget = QWidget()
+        layout = QVBoxLayout()
+        widget.setLayout(layout)
 
-        # 方法1: 尝试使用 pdal (更可靠,JSON格式)
-        metadata = self.get_las_metadata_pdal(las_file)
-        if metadata and len(metadata) > 0:
-            return metadata
+        # 说明文本
+        info_label = QLabel("各选项卡的任务在这里排队; 槽位不足时按优先级等待, 空闲后自动启动")
+        info_label.setStyleSheet("color: #555; font-style: italic; padding: 5px;")
+        layout.addWidget(info_label)
 
-        # 方法2: 回退到 lasinfo
-        metadata = self.get_las_metadata_lasinfo(las_file)
-        if metadata and len(metadata) > 0:
-            return metadata
+        # 调度设置
+        settings_group = QGroupBox("调度设置")
+        settings_layout = QHBoxLayout()
+        settings_group.setLayout(settings_layout)
+
+        settings_layout.addWidget(QLabel("CPU 槽位:"))
+        self.cpu_slots = QSpinBox()
+        self.cpu_slots.setRange(1, 1024)
+        self.cpu_slots.setValue(self.scheduler.limits['cpu'])
+        self.cpu_slots.setToolTip("同时运行的任务占用的 CPU 核数上限; 并行任务按并行数占用")
+        self.cpu_slots.valueChanged.connect(lambda value: self.scheduler.set_limits(cpu_slots=value))
+        settings_layout.addWidget(self.cpu_slots)
+
+        settings_layout.addWidget(QLabel("磁盘槽位:"))
+        self.disk_slots = QSpinBox()
+        self.disk_slots.setRange(1, 64)
+        self.disk_slots.setValue(self.scheduler.limits['disk'])
+        self.disk_slots.setToolTip("同时运行的大量读写任务 (分割 / 批量 / 一键流程) 数量上限")
+        self.disk_slots.valueChanged.connect(lambda value: self.scheduler.set_limits(disk_slots=value))
+        settings_layout.addWidget(self.disk_slots)
+
+        settings_layout.addWidget(QLabel("内存预算:"))
+        self.memory_budget = QDoubleSpinBox()
+        self.memory_budget.setRange(0, 65536)
+        self.memory_budget.setDecimals(1)
+        self.memory_budget.setSuffix(" GB")
+        self.memory_budget.setSpecialValueText("不限制")
+        self.memory_budget.setValue((self.scheduler.limits['memory'] or 0) / 1024)
+        self.memory_budget.setToolTip("同时运行的任务估算峰值内存之和的上限, 默认为物理内存的 70%;\n"
+                                      "估算按输入文件头的点数计算, 并根据以往任务的实测内存修正")
+        self.memory_budget.valueChanged.connect(
+            lambda value: self.scheduler.set_limits(memory_budget=int(value * 1024)))
+        settings_layout.addWidget(self.memory_budget)
+
+        settings_layout.addWidget(QLabel("分桶缓存:"))
+        self.binning_memory = QSpinBox()
+        self.binning_memory.setRange(64, 1024 * 1024)
+        self.binning_memory.setSingleStep(256)
+        self.binning_memory.setSuffix(" MB")
+        self.binning_memory.setValue(job_memory.default_binning_limit_mb(self.scheduler.limits['memory']))
+        self.binning_memory.setToolTip("分割 / 一键流程中网格缓存的内存上限, 超过后写入临时文件;\n"
+                                       "默认不超过内存预算的 1/4, 内存估算按此上限计算")
+        settings_layout.addWidget(self.binning_memory)
+
+        settings_layout.addWidget(QLabel("新任务优先级:"))
+        self.job_priority = QComboBox()
+        for priority in (job_scheduler.PRIORITY_HIGH, job_scheduler.PRIORITY_NORMAL,
+                         job_scheduler.PRIORITY_LOW):
+            self.job_priority.addItem(job_scheduler.PRIORITY_LABELS[priority], priority)
+        self.job_priority.setCurrentIndex(1)
+        settings_layout.addWidget(self.job_priority)
+        settings_layout.addStretch()
+
+        layout.addWidget(settings_group)
+
+        # 任务列表
+        jobs_group = QGroupBox("任务列表")
+        jobs_layout = QVBoxLayout()
+        jobs_group.setLayout(jobs_layout)
+
+        self.jobs_table = QTableWidget()
+        self.jobs_table.setColumnCount(9)
+        self.jobs_table.setHorizontalHeaderLabels(
+            ['编号', '任务', '输入 → 输出', '优先级', '占用', '状态', '等待', '运行时间', '结果'])
+        self.jobs_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.jobs_table.setSelectionBehavior(QTableWidget.SelectRows)
+        header = self.jobs_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.Stretch)
+        header.setSectionResizeMode(8, QHeaderView.Stretch)
+        jobs_layout.addWidget(self.jobs_table)
+
+        # 操作按钮
+        btn_layout = QHBoxLayout()
+        cancel_btn = QPushButton("取消所选")
+        cancel_btn.clicked.connect(self.cancel_selected_jobs)
+        btn_layout.addWidget(cancel_btn)
 
-        return None
+        raise_btn = QPushButton("提高优先级")
+        raise_btn.clicked.connect(lambda: self.change_selected_priority(1))
+        btn_layout.addWidget(raise_btn)
 
-    def get_las_metadata_pdal(self, las_file):
-        """使用 pdal 读取 LAS 元数据"""
-        try:
-            result = subprocess.run(
-                ['pdal', 'info', '--metadata', las_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                timeout=30
-            )
-
-            if result.returncode != 0:
-                return None
-
-            # 解析 JSON 输出
-            data = json.loads(result.stdout)
-
-            # 提取 metadata 部分
-            if 'metadata' not in data:
-                return None
-
-            meta = data['metadata']
-            metadata = {}
-
-            # 提取各项信息
-            if 'count' in meta:
-                metadata['point_count'] = int(meta['count'])
-
-            # 提取版本
-            if 'major_version' in meta and 'minor_version' in meta:
-                metadata['version'] = f"{meta['major_version']}.{meta['minor_version']}"
-
-            # 提取边界
-            if 'minx' in meta:
-                metadata['min_x'] = float(meta['minx'])
-                metadata['min_y'] = float(meta['miny'])
-                metadata['min_z'] = float(meta['minz'])
-
-            if 'maxx' in meta:
-                metadata['max_x'] = float(meta['maxx'])
-                metadata['max_y'] = float(meta['maxy'])
-                metadata['max_z'] = float(meta['maxz'])
-
-            # 提取 Offset (重要!)
-            if 'offset_x' in meta:
-                metadata['offset_x'] = float(meta['offset_x'])
-                metadata['offset_y'] = float(meta['offset_y'])
-                metadata['offset_z'] = float(meta['offset_z'])
-
-            # 提取 Scale
-            if 'scale_x' in meta:
-                metadata['scale_x'] = float(meta['scale_x'])
-                metadata['scale_y'] = float(meta['scale_y'])
-                metadata['scale_z'] = float(meta['scale_z'])
-
-            # 提取其他信息
-            if 'software_id' in meta:
-                metadata['software'] = meta['software_id']
-
-            if 'system_id' in meta:
-                metadata['system'] = meta['system_id']
-
-            metadata['source'] = 'pdal'
-            return metadata
-
-        except subprocess.TimeoutExpired:
-            print(f"pdal 读取超时: {las_file}")
-            return None
-        except json.JSONDecodeError as e:
-            print(f"pdal JSON 解析失败: {e}")
-            return None
-        except Exception as e:
-            print(f"pdal 读取失败: {e}")
-            return None
+        lower_btn = QPushButton("降低优先级")
+        lower_btn.clicked.connect(lambda: self.change_selected_priority(-1))
+        btn_layout.addWidget(lower_btn)
 
-    def get_las_metadata_lasinfo(self, las_file):
-        """使用 lasinfo 读取 LAS 元数据 (备用方案)"""
-        try:
-            result = subprocess.run(
-                ['lasinfo', las_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                timeout=10
-            )
-
-            if result.returncode != 0:
-                return None
-
-            output = result.stdout
-
-            # 解析关键信息
-            metadata = {}
-
-            # 提取点数量
-            match = re.search(r'Number of Point Records:\s+(\d+)', output, re.IGNORECASE)
-            if match:
-                metadata['point_count'] = int(match.group(1))
-
-            # 提取版本
-            match = re.search(r'Version:\s+([\d.]+)', output, re.IGNORECASE)
-            if match:
-                metadata['version'] = match.group(1)
-
-            # 提取边界 - 注意格式: "Min X Y Z:   635619.85 848899.70 406.59"
-            match = re.search(r'Min X Y Z:\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)', output, re.IGNORECASE)
-            if match:
-                metadata['min_x'] = float(match.group(1))
-                metadata['min_y'] = float(match.group(2))
-                metadata['min_z'] = float(match.group(3))
-
-            match = re.search(r'Max X Y Z:\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)', output, re.IGNORECASE)
-            if match:
-                metadata['max_x'] = float(match.group(1))
-                metadata['max_y'] = float(match.group(2))
-                metadata['max_z'] = float(match.group(3))
-
-            # 提取Offset (原点坐标) - 注意格式: "Offset X Y Z:  -0.00 -0.00 -0.00"
-            match = re.search(r'Offset X Y Z:\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)', output, re.IGNORECASE)
-            if match:
-                metadata['offset_x'] = float(match.group(1))
-                metadata['offset_y'] = float(match.group(2))
-                metadata['offset_z'] = float(match.group(3))
-
-            # 提取Scale - 注意格式: "Scale Factor X Y Z:  0.01 0.01 0.01"
-            match = re.search(r'Scale Factor X Y Z:\s+([\d.e-]+)\s+([\d.e-]+)\s+([\d.e-]+)', output, re.IGNORECASE)
-            if match:
-                metadata['scale_x'] = float(match.group(1))
-                metadata['scale_y'] = float(match.group(2))
-                metadata['scale_z'] = float(match.group(3))
-
-            metadata['source'] = 'lasinfo'
-            return metadata
-
-        except subprocess.TimeoutExpired:
-            print(f"lasinfo 读取超时: {las_file}")
-            return None
-        except Exception as e:
-            print(f"lasinfo 读取失败: {e}")
-            return None
+        btn_layout.addStretch()
+
+        clear_btn = QPushButton("清除已结束")
+        clear_btn.clicked.connect(self.clear_finished_jobs)
+        btn_layout.addWidget(clear_btn)
+
+        jobs_layout.addLayout(btn_layout)
+        layout.addWidget(jobs_group)
+
+        # 运行中的任务每秒刷新一次时间
+        self.jobs_timer = QTimer()
+        self.jobs_timer.setInterval(JOBS_REFRESH_INTERVAL)
+        self.jobs_timer.timeout.connect(self.refresh_jobs_table)
+
+        return widget
+
+    def get_las_metadata(self, las_file):
+        """读取LAS文件元数据 - 优先直接解析文件头,备用pdal和lasinfo"""
+        return las_metadata.read_metadata(las_file, self.metadata_cache)
 
     def on_las_file_changed(self, file_path):
         """当LAS文件路径改变时"""
-        if not file_path or not os.path.exists(file_path):
+        # 使正在进行的读取结果失效
+        self.las_metadata_request += 1
+        self.las_metadata_timer.stop()
+        self.metadata_pool.clear()
+
+        if not file_path or not os.path.isfile(file_path):
             self.las_info_text.clear()
             return
 
         # 更新输出文件路径
         self.on_pcd_output_dir_changed()
 
-        # 读取元数据
-        metadata = self.get_las_metadata(file_path)
+        # 防抖: 停止输入 300ms 后再读取元数据
+        self.las_info_text.setPlainText(f"📁 文件: {os.path.basename(file_path)}\n\n⏳ 正在读取元数据...")
+        self.las_metadata_timer.start()
+
+    def load_las_metadata(self):
+        """在后台线程池中读取当前LAS文件的元数据"""
+        file_path = self.las_input.text()
+        if not file_path or not os.path.isfile(file_path):
+            return
+
+        self.las_metadata_request += 1
+        loader = MetadataLoader(self.las_metadata_request, file_path,
+                                self.get_las_metadata, self.metadata_signals)
+        self.metadata_pool.start(loader)
 
+    def on_las_metadata_loaded(self, request_id, file_path, metadata):
+        """元数据读取完成回调 (主线程)"""
+        if request_id != self.las_metadata_request or file_path != self.las_input.text():
+            return  # 过期结果
+
+        self.show_las_metadata(file_path, metadata)
+
+    def show_las_metadata(self, file_path, metadata):
+        """在信息面板中显示LAS元数据"""
         if metadata and len(metadata) > 0:
             info_lines = []
             info_lines.append(f"📁 文件: {os.path.basename(file_path)}")
@@ -1203,6 +1121,9 @@ class PointCloudConverterGUI(QMainWindow):
             if 'point_count' in metadata:
                 info_lines.append(f"📍 点数量: {metadata['point_count']:,}")
 
+            if 'point_format' in metadata:
+                info_lines.append(f"🧩 点格式: {metadata['point_format']}")
+
             # 显示软件信息
             if 'software' in metadata:
                 info_lines.append(f"💻 生成软件: {metadata['software']}")
@@ -1238,8 +1159,8 @@ class PointCloudConverterGUI(QMainWindow):
 
             info_lines.append(f"\n⚠️  无法读取详细的LAS文件元数据")
             info_lines.append(f"\n可能原因:")
+            info_lines.append(f"  • LAS 文件格式不正确 (文件头无法解析)")
             info_lines.append(f"  • pdal 或 lasinfo 工具未正确安装")
-            info_lines.append(f"  • LAS 文件格式不正确")
             info_lines.append(f"  • 文件权限问题")
             info_lines.append(f"\n解决方法:")
             info_lines.append(f"  1. 检查 pdal: which pdal")
@@ -1349,6 +1270,44 @@ class PointCloudConverterGUI(QMainWindow):
         if directory:
             self.divide_output_dir.setText(directory)
 
+    def on_tile_query_mode_changed(self, index):
+        """圆形范围只用前三个输入框"""
+        self.tile_query_values[3].setEnabled(index == 0)
+
+    def query_tiles(self):
+        """查询与矩形 / 圆形范围相交的网格, 结果输出到分割日志"""
+        output_dir = self.divide_output_dir.text()
+        prefix = self.divide_prefix.text() or 'pointcloud_map'
+        path = os.path.join(output_dir, tile_index.index_file_name(prefix))
+        if not output_dir or not os.path.exists(path):
+            QMessageBox.warning(self, "错误", f"输出目录中没有网格索引 {tile_index.index_file_name(prefix)}\n"
+                                            f"请先分割, 或用命令行 tiles --rebuild 重建")
+            return
+
+        # 索引文件未变化时复用已读取的索引
+        cache_key = (path, os.path.getmtime(path))
+        index = self.tile_index_cache.get(cache_key)
+        if index is None:
+            try:
+                index = tile_index.TileIndex.load(path)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "错误", f"网格索引读取失败: {e}")
+                return
+            self.tile_index_cache = {cache_key: index}
+
+        values = [spin.value() for spin in self.tile_query_values]
+        if self.tile_query_mode.currentIndex() == 0:
+            indices = index.query_bbox(*values)
+        else:
+            indices = index.query_radius(*values[:3])
+
+        self.divide_log.appendPlainText(f"\n网格查询: {len(indices)} / {len(index)} 个网格")
+        for idx in indices:
+            entry = index.entry(idx)
+            self.divide_log.appendPlainText(f"  {entry['file']} ({entry['points']:,} 点, "
+                                            f"{entry['bytes'] / 1024 ** 2:.2f} MB)")
+        self.statusBar().showMessage(f"网格查询: {len(indices)} 个网格")
+
     def browse_enhance_input(self):
         """浏览增强输入文件"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -1604,6 +1563,57 @@ class PointCloudConverterGUI(QMainWindow):
 
     # ==================== 处理函数 ====================
 
+    def create_encoding_combo(self, keep_input=False):
+        """PCD 输出编码下拉框 (itemData 为 DATA 编码, None 表示与输入相同)"""
+        combo = QComboBox()
+        if keep_input:
+            combo.addItem('与输入相同', None)
+        combo.addItem('binary', 'binary')
+        combo.addItem('binary_compressed (LZF 压缩)', 'binary_compressed')
+        combo.addItem('ascii', 'ascii')
+        combo.setToolTip("仅内置引擎支持; binary_compressed 体积更小, 从网络存储读取更快")
+        return combo
+
+    def create_tiling_widgets(self, layout, row):
+        """分块方式、每块最大点数 (万) 和最大 MB, 放在 layout 的 row 行; 返回控件元组"""
+        combo = QComboBox()
+        combo.addItem('固定网格', 'grid')
+        combo.addItem('自适应四叉树 (网格大小为最大分块)', 'adaptive')
+        combo.setToolTip("自适应: 按点密度逐级四分, 密集区域细分为小块, 每块点数不超过上限 (仅内置引擎)")
+        layout.addWidget(QLabel("分块方式:"), row, 0)
+        layout.addWidget(combo, row, 1)
+
+        points = QSpinBox()
+        points.setRange(1, 100000)
+        points.setValue(quadtree_tiling.DEFAULT_MAX_TILE_POINTS // 10000)
+        points.setSuffix(" 万点")
+        layout.addWidget(QLabel("每块最多:"), row, 2)
+
+        megabytes = QSpinBox()
+        megabytes.setRange(0, 100000)
+        megabytes.setSuffix(" MB")
+        megabytes.setSpecialValueText("不限 MB")
+        limits = QHBoxLayout()
+        limits.addWidget(points)
+        limits.addWidget(megabytes)
+        layout.addLayout(limits, row, 3)
+
+        def update(index):
+            points.setEnabled(combo.itemData(index) == 'adaptive')
+            megabytes.setEnabled(combo.itemData(index) == 'adaptive')
+        combo.currentIndexChanged.connect(update)
+        update(0)
+        return combo, points, megabytes
+
+    @staticmethod
+    def tiling_params(widgets):
+        combo, points, megabytes = widgets
+        return {
+            'tiling': combo.currentData(),
+            'max_tile_points': points.value() * 10000,
+            'max_tile_mb': megabytes.value() or None,
+        }
+
     def start_las2pcd_conversion(self):
         """开始LAS转PCD转换"""
         input_file = self.las_input.text()
@@ -1619,26 +1629,160 @@ class PointCloudConverterGUI(QMainWindow):
 
         # 获取转换类型
         conversion_type = 'rgb' if self.conversion_type.currentIndex() == 0 else 'intensity'
+        engine = 'native' if self.conversion_engine.currentIndex() == 0 else 'external'
 
         # 准备参数
         params = {
             'input_file': input_file,
             'output_file': output_file,
-            'conversion_type': conversion_type
+            'conversion_type': conversion_type,
+            'engine': engine,
+            'encoding': self.conversion_encoding.currentData(),
+            'workers': self.conversion_workers.value()
         }
 
-        # 清空日志
-        self.las2pcd_log.clear()
-        self.las2pcd_progress.setVisible(True)
-        self.las2pcd_progress.setRange(0, 0)  # 无限滚动模式
-
-        # 启动转换线程
-        self.worker = ConversionWorker('las2pcd', params)
-        self.worker.progress.connect(self.las2pcd_log.append)
-        self.worker.finished.connect(self.on_las2pcd_finished)
-        self.worker.start()
-
-        self.statusBar().showMessage("正在转换...")
+        self.submit_job('las2pcd', params)
+
+    def submit_job(self, task_type, params):
+        """把任务加入队列; 有空闲槽位时立即启动, 否则在选项卡日志中提示排队位置"""
+        job = self.scheduler.submit(task_type, params, self.job_priority.currentData())
+        if job.state == job_scheduler.QUEUED:
+            log = self.job_views[task_type][0]
+            position = self.scheduler.queue_position(job)
+            waiting = '/'.join(RESOURCE_LABELS[name] for name in self.scheduler.waiting_for(job)) or '前面的任务'
+            log.appendPlainText(f"任务 #{job.job_id} 已加入队列 (第 {position} 个), 等待{waiting}... "
+                                f"(见「任务队列」选项卡)")
+            if self.scheduler.over_budget(job):
+                log.appendPlainText(f"⚠️  预计内存 {format_memory(job.resources['memory'])} 超过内存预算, "
+                                    f"将在没有其他任务运行时单独运行")
+            self.statusBar().showMessage(f"任务 #{job.job_id} 排队中")
+
+    def launch_job(self, job):
+        """调度器启动任务: 创建后台线程并连接到对应选项卡"""
+        log, bar, on_progress, _, status = self.job_views[job.task_type]
+        log.clear()
+        self.reset_progress_bar(bar)
+
+        worker = ConversionWorker(job.task_type, job.params)
+        worker.progress_value.connect(partial(self.update_progress_bar, bar))
+        worker.progress.connect(on_progress)
+        worker.finished.connect(partial(self.on_worker_finished, job))
+        self.workers[job.job_id] = worker
+        worker.start()
+
+        self.statusBar().showMessage(status)
+        return worker
+
+    def on_worker_finished(self, job, success, message):
+        """任务线程结束: 通知调度器 (启动排队中的任务), 再交给选项卡的完成回调"""
+        worker = self.workers.pop(job.job_id, None)
+        if worker is not None:
+            worker.wait()
+            # 单独运行的任务用实测峰值内存修正估算
+            if success and not job.overlapped:
+                measured = job_memory.measured_memory_mb(worker.job.metrics, job.resources['cpu'])
+                self.memory_model.learn(job.task_type, job.params, measured)
+        self.scheduler.job_finished(job, success, message)
+
+        _, bar, _, on_finished, _ = self.job_views[job.task_type]
+        if job.state == job_scheduler.CANCELLED:
+            bar.setVisible(False)
+            self.statusBar().showMessage(f"任务 #{job.job_id} 已取消")
+        else:
+            on_finished(success, message)
+
+    def on_job_changed(self, job):
+        """任务状态变化: 刷新任务面板和状态栏"""
+        self.refresh_jobs_table()
+        active = self.scheduler.running() or self.scheduler.queued()
+        if active and not self.jobs_timer.isActive():
+            self.jobs_timer.start()
+        elif not active:
+            self.jobs_timer.stop()
+
+    def refresh_jobs_table(self):
+        """按调度器中的任务重建任务列表"""
+        jobs = self.scheduler.jobs
+        self.jobs_table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            run_seconds = job.run_seconds()
+            resources = f"CPU {job.resources['cpu']}"
+            if job.resources['disk']:
+                resources += f" / 磁盘 {job.resources['disk']}"
+            if job.resources.get('memory'):
+                resources += f" / 内存 {format_memory(job.resources['memory'])}"
+            state = job_scheduler.STATE_LABELS[job.state]
+            if job.state == job_scheduler.QUEUED:
+                state += f" ({self.scheduler.queue_position(job)})"
+                waiting = self.scheduler.waiting_for(job)
+                if waiting:
+                    state += f" 等待{'/'.join(RESOURCE_LABELS[name] for name in waiting)}"
+            cells = [
+                str(job.job_id), job.label, job.description,
+                job_scheduler.PRIORITY_LABELS.get(job.priority, str(job.priority)), resources, state,
+                job_progress.format_duration(job.wait_seconds()),
+                job_progress.format_duration(run_seconds) if run_seconds is not None else '-',
+                job.message.split('\n')[0],
+            ]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column == 2 or column == 8:
+                    item.setToolTip(job.message if column == 8 else text)
+                self.jobs_table.setItem(row, column, item)
+
+        running = len(self.scheduler.running())
+        queued = len(self.scheduler.queue)
+        status = f"运行 {running} / 排队 {queued}" if running or queued else ""
+        if running and self.scheduler.limits['memory']:
+            status += (f" · 内存 {format_memory(self.scheduler.used['memory'])}"
+                       f" / {format_memory(self.scheduler.limits['memory'])}")
+        self.jobs_status.setText(status)
+
+    def selected_jobs(self):
+        rows = sorted({index.row() for index in self.jobs_table.selectedIndexes()})
+        return [self.scheduler.jobs[row] for row in rows if row < len(self.scheduler.jobs)]
+
+    def cancel_selected_jobs(self):
+        """取消所选任务 (运行中的任务会结束其全部子进程)"""
+        for job in self.selected_jobs():
+            self.scheduler.cancel(job)
+        self.refresh_jobs_table()
+
+    def change_selected_priority(self, delta):
+        """调整所选排队任务的优先级"""
+        for job in self.selected_jobs():
+            priority = max(job_scheduler.PRIORITY_LOW, min(job_scheduler.PRIORITY_HIGH, job.priority + delta))
+            self.scheduler.set_priority(job, priority)
+
+    def clear_finished_jobs(self):
+        self.scheduler.clear_finished()
+        self.refresh_jobs_table()
+
+    def closeEvent(self, event):
+        """关闭窗口: 有任务时确认后取消全部任务并等待线程结束"""
+        if self.scheduler.running() or self.scheduler.queued():
+            reply = QMessageBox.question(self, "确认退出", "还有任务在运行或排队, 取消全部任务并退出?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+            self.scheduler.cancel_all()
+            for worker in list(self.workers.values()):
+                worker.wait()
+        event.accept()
+
+    def reset_progress_bar(self, bar):
+        """显示进度条: 收到第一个进度前为滚动模式 (外部程序没有进度信息)"""
+        bar.setVisible(True)
+        bar.setRange(0, 0)
+        bar.setTextVisible(False)
+
+    def update_progress_bar(self, bar, state):
+        """按当前阶段的进度更新进度条, 显示百分比、吞吐量和剩余时间"""
+        bar.setRange(0, 1000)
+        bar.setValue(int(state['percent'] * 10))
+        bar.setFormat(job_progress.format_progress(state))
+        bar.setTextVisible(True)
 
     def on_las2pcd_finished(self, success, message):
         """LAS转PCD完成回调"""
@@ -1679,21 +1823,15 @@ class PointCloudConverterGUI(QMainWindow):
             'grid_size_x': self.grid_size_x.value(),
             'grid_size_y': self.grid_size_y.value(),
             'leaf_size': self.leaf_size.value(),
-            'merge_pcds': self.merge_pcds_check.isChecked()
+            'merge_pcds': self.merge_pcds_check.isChecked(),
+            'voxel_mode': 'centroid' if self.divide_voxel_mode.currentIndex() == 0 else 'first',
+            'engine': 'native' if self.divide_engine.currentIndex() == 0 else 'external',
+            'encoding': self.divide_encoding.currentData(),
+            'memory_limit_mb': self.binning_memory.value(),
+            **self.tiling_params(self.divide_tiling)
         }
 
-        # 清空日志
-        self.divide_log.clear()
-        self.divide_progress.setVisible(True)
-        self.divide_progress.setRange(0, 0)  # 无限滚动模式
-
-        # 启动分割线程
-        self.worker = ConversionWorker('divide', params)
-        self.worker.progress.connect(self.divide_log.append)
-        self.worker.finished.connect(self.on_divide_finished)
-        self.worker.start()
-
-        self.statusBar().showMessage("正在分割...")
+        self.submit_job('divide', params)
 
     def on_divide_finished(self, success, message):
         """点云分割完成回调"""
@@ -1720,21 +1858,15 @@ class PointCloudConverterGUI(QMainWindow):
 
         params = {
             'input_file': input_file,
-            'output_file': output_file
+            'output_file': output_file,
+            'gamma': self.enhance_gamma.value(),
+            'contrast': self.enhance_contrast.value(),
+            'auto_gamma': self.enhance_auto_gamma.isChecked(),
+            'engine': 'native' if self.enhance_engine.currentIndex() == 0 else 'external',
+            'encoding': self.enhance_encoding.currentData()
         }
 
-        # 清空日志
-        self.enhance_log.clear()
-        self.enhance_progress.setVisible(True)
-        self.enhance_progress.setRange(0, 0)  # 无限滚动模式
-
-        # 启动增强线程
-        self.worker = ConversionWorker('enhance', params)
-        self.worker.progress.connect(self.enhance_log.append)
-        self.worker.finished.connect(self.on_enhance_finished)
-        self.worker.start()
-
-        self.statusBar().showMessage("正在增强...")
+        self.submit_job('enhance', params)
 
     def on_enhance_finished(self, success, message):
         """增强完成回调"""
@@ -1781,23 +1913,19 @@ class PointCloudConverterGUI(QMainWindow):
                 'type': 'las2pcd',
                 'input_file': input_file,
                 'output_file': output_file,
-                'executable': executable
+                'conversion_type': conversion_type,
+                'executable': executable,
+                'encoding': self.batch_encoding.currentData()
             })
 
-        params = {'tasks': tasks}
-
-        # 清空日志
-        self.batch_log.clear()
-        self.batch_progress.setVisible(True)
-        self.batch_progress.setRange(0, 0)  # 无限滚动模式
-
-        # 启动批量处理
-        self.worker = ConversionWorker('batch', params)
-        self.worker.progress.connect(self.batch_log.append)
-        self.worker.finished.connect(self.on_batch_finished)
-        self.worker.start()
+        params = {
+            'tasks': tasks,
+            'output_dir': output_dir,
+            'workers': self.batch_workers.value(),
+            'incremental': self.batch_incremental.isChecked()
+        }
 
-        self.statusBar().showMessage("正在批量处理...")
+        self.submit_job('batch', params)
 
     def on_batch_finished(self, success, message):
         """批量处理完成回调"""
@@ -1832,25 +1960,22 @@ class PointCloudConverterGUI(QMainWindow):
             'conversion_type': conversion_type,
             'grid_size': grid_size,
             'leaf_size': leaf_size,
-            'enhance': enhance
+            'enhance': enhance,
+            'auto_gamma': self.pipeline_auto_gamma.isChecked(),
+            'fused': self.pipeline_fused.isChecked(),
+            'voxel_mode': 'centroid' if self.pipeline_voxel_mode.currentIndex() == 0 else 'first',
+            'workers': self.pipeline_workers.value(),
+            'encoding': self.pipeline_encoding.currentData(),
+            'lod_levels': self.pipeline_lod_levels.value(),
+            'memory_limit_mb': self.binning_memory.value(),
+            **self.tiling_params(self.pipeline_tiling)
         }
 
-        # 清空日志
-        self.pipeline_log.clear()
-        self.pipeline_progress.setVisible(True)
-        self.pipeline_progress.setRange(0, 0)  # 无限滚动模式
-
-        # 启动一键流程线程
-        self.worker = ConversionWorker('pipeline', params)
-        self.worker.progress.connect(self.on_pipeline_progress)
-        self.worker.finished.connect(self.on_pipeline_finished)
-        self.worker.start()
-
-        self.statusBar().showMessage("正在执行一键流程...")
+        self.submit_job('pipeline', params)
 
     def on_pipeline_progress(self, message):
         """一键流程进度消息"""
-        self.pipeline_log.append(message)
+        self.pipeline_log.appendPlainText(message)
         # 自动滚动到底部
         self.pipeline_log.moveCursor(QTextCursor.End)
 
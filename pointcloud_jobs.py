@@ -0,0 +1,910 @@
+#!/usr/bin/env python3
+"""
+不依赖 Qt 的转换任务
+- 批量处理中的单个任务在进程池 / 线程池中执行, 日志按任务缓存后整体返回
+- ConversionJob: 图形界面后台线程和命令行共用的转换流程
+"""
+
+import os
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+
+import yaml
+
+import las_io
+import grid_divider
+import lod_pyramid
+import lzf_codec
+import pcd_enhance
+import pcd_io
+import process_runner
+import quadtree_tiling
+import tile_index
+from batch_manifest import BatchManifest
+from job_metrics import JobMetrics, files_size
+from job_progress import ProgressMeter
+
+
+# 批量 LAS→PCD 的外部程序
+BATCH_EXECUTABLES = {
+    'rgb': '/home/luo/map_ws/las2pcd/build/las2pcd',
+    'intensity': '/home/luo/map_ws/las2pcd/build/las2pcd_intensity',
+}
+
+
+def default_workers():
+    """默认并行任务数: CPU 核数"""
+    return os.cpu_count() or 1
+
+
+def las_points(las_files):
+    """LAS 文件的总点数 (只读文件头), 无法读取时返回 None"""
+    try:
+        return sum(las_io.read_las_header(las_file)['point_count'] for las_file in las_files)
+    except (OSError, ValueError):
+        return None
+
+
+def pcd_points(pcd_files):
+    """PCD 文件的总点数 (只读文件头), 无法读取时返回 None"""
+    try:
+        return sum(pcd_io.read_header(pcd_file)['points'] for pcd_file in pcd_files)
+    except (OSError, ValueError):
+        return None
+
+
+def run_batch_task(task, cancel=None):
+    """执行单个批量任务, 返回 (task, success, log_lines, error)
+
+    cancel 为 process_runner.CancelToken (只在线程池中传入, 进程池的工作进程由 pool_tracking 登记后结束)
+    """
+    log = []
+    if cancel is not None and cancel.cancelled:
+        return task, False, log, "任务已取消"
+
+    if task['type'] == 'las2pcd' and task.get('engine', 'native') == 'native' and las_io.NATIVE_AVAILABLE:
+        origin = tuple(float(v) for v in task['offsets']) if 'offsets' in task else None
+        try:
+            las_io.convert_las_to_pcd(task['input_file'], task['output_file'],
+                                      task.get('conversion_type', 'rgb'),
+                                      origin=origin, progress=log.append,
+                                      encoding=task.get('encoding', 'binary'))
+            return task, True, log, ''
+        except las_io.UnsupportedLASError as e:
+            log.append(f"内置引擎不支持该文件 ({e}), 改用外部转换程序")
+        except Exception as e:
+            return task, False, log, str(e)
+
+    # 外部程序
+    if task['type'] in ('las2pcd', 'enhance'):
+        cmd = [task['executable'], task['input_file'], task['output_file']]
+        if task['type'] == 'las2pcd' and 'offsets' in task:
+            cmd.extend(task['offsets'])
+    else:
+        return task, False, log, f"未知任务类型: {task['type']}"
+
+    if task.get('encoding', 'binary') != 'binary':
+        log.append(f"⚠️  外部程序不支持输出编码选项 ({task['encoding']}), 输出编码由程序决定")
+    log.append(f"执行命令: {' '.join(cmd)}")
+    try:
+        process = process_runner.run_process(cmd, timeout=task.get('timeout'), cancel=cancel)
+    except subprocess.TimeoutExpired as e:
+        return task, False, log, f"外部程序超时 (超过 {e.timeout} 秒), 已终止"
+    except (OSError, process_runner.JobCancelled) as e:
+        return task, False, log, str(e)
+
+    log.extend(line for line in process.stdout.splitlines() if line.strip())
+    return task, process.returncode == 0, log, process.stderr.strip()
+
+
+def run_batch_tasks(tasks, workers=None, cancel=None):
+    """并行执行批量任务, 按完成顺序逐个产出 run_batch_task 的结果
+
+    内置引擎在独立进程中运行 (绕开 GIL); 只调用外部程序时用线程池等待子进程即可
+    cancel 为取消标记, 取消时结束工作进程和外部程序, 未开始的任务直接记为失败
+    """
+    workers = max(1, min(workers or default_workers(), len(tasks) or 1))
+
+    uses_native = las_io.NATIVE_AVAILABLE and any(
+        task['type'] == 'las2pcd' and task.get('engine', 'native') == 'native' for task in tasks)
+
+    if uses_native and workers > 1:
+        # GUI 进程中有多个线程, 使用 spawn 避免 fork 后子进程死锁
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        task_cancel = None
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        task_cancel = cancel
+
+    with executor:
+        futures = {executor.submit(run_batch_task, task, task_cancel): task for task in tasks}
+        tracked = cancel if isinstance(executor, ProcessPoolExecutor) else None
+        with process_runner.pool_tracking(tracked, executor):
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # 子进程异常退出等情况, 只记为该任务失败
+                    yield futures[future], False, [], str(e)
+
+
+def build_batch_tasks(input_files, output_dir, conversion_type='rgb', encoding='binary', engine='native'):
+    """按默认命名 (<输入文件名>.pcd) 生成批量 LAS→PCD 任务"""
+    executable = BATCH_EXECUTABLES[conversion_type]
+    tasks = []
+    for input_file in input_files:
+        output_name = os.path.splitext(os.path.basename(input_file))[0] + '.pcd'
+        tasks.append({
+            'type': 'las2pcd',
+            'input_file': input_file,
+            'output_file': os.path.join(output_dir, output_name),
+            'conversion_type': conversion_type,
+            'executable': executable,
+            'encoding': encoding,
+            'engine': engine,
+        })
+    return tasks
+
+
+def enhance_tile(pcd_path, executable, options=None, timeout=None, cancel=None):
+    """增强单个网格并原子替换原文件, 返回 (pcd_path, success, error)
+
+    options 为内置增强参数 {'gamma', 'contrast', 'encoding'}; 为 None 或内置引擎不支持时调用外部程序,
+    timeout 为外部程序的超时 (秒), cancel 为取消标记
+    """
+    if cancel is not None and cancel.cancelled:
+        return pcd_path, False, "任务已取消"
+    enhanced_path = pcd_path.rsplit('.', 1)[0] + '_enhanced.pcd'
+    if options is not None and las_io.NATIVE_AVAILABLE:
+        try:
+            pcd_enhance.enhance_pcd(pcd_path, enhanced_path, options['gamma'], options['contrast'],
+                                    encoding=options.get('encoding'))
+            os.replace(enhanced_path, pcd_path)
+            return pcd_path, True, ''
+        except pcd_io.UnsupportedPCDError:
+            pass
+        except (OSError, ValueError) as e:
+            return pcd_path, False, str(e)
+
+    try:
+        process = process_runner.run_process([executable, pcd_path, enhanced_path], timeout=timeout,
+                                             tail_lines=process_runner.ERROR_TAIL_LINES, cancel=cancel)
+    except subprocess.TimeoutExpired as e:
+        return pcd_path, False, f"外部程序超时 (超过 {e.timeout} 秒), 已终止"
+    except (OSError, process_runner.JobCancelled) as e:
+        return pcd_path, False, str(e)
+
+    if process.returncode != 0:
+        return pcd_path, False, process.stderr.strip()
+
+    # 用增强后的文件替换原文件
+    os.replace(enhanced_path, pcd_path)
+    return pcd_path, True, ''
+
+
+def enhance_tiles(pcd_paths, executable, workers=None, options=None, timeout=None, cancel=None):
+    """并行增强网格文件 (并发数受 workers 限制), 按完成顺序产出 enhance_tile 的结果"""
+    workers = max(1, min(workers or default_workers(), len(pcd_paths) or 1))
+    # 外部程序在子进程中运行, 线程只负责等待; 内置引擎的查表运算在 NumPy 中完成
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(enhance_tile, path, executable, options, timeout, cancel)
+                   for path in pcd_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+class JobSignal:
+    """与 pyqtSignal 用法相同的回调 (connect / emit), 让任务代码不依赖 Qt"""
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self, *args):
+        for slot in self.slots:
+            slot(*args)
+
+
+class ConversionJob:
+    """转换任务 (LAS→PCD / 分割 / 增强 / 批量 / 一键流程), 由图形界面的后台线程或命令行执行
+
+    progress.emit(str) 输出日志, finished.emit(bool, str) 报告结果,
+    stage_event.emit(dict) 输出阶段开始/结束事件 (耗时、CPU、内存、读写字节数、点数),
+    progress_value.emit(dict) 输出当前阶段的百分比、吞吐量和剩余时间 (见 job_progress)
+    cancel() 可在任意线程调用: 结束任务启动的子进程, 任务在下一次进度回调时停止
+    """
+
+    def __init__(self, task_type, params):
+        self.task_type = task_type
+        self.params = params
+        self.progress = JobSignal()
+        self.finished = JobSignal()
+        self.stage_event = JobSignal()
+        self.progress_value = JobSignal()
+        self.meter = ProgressMeter(self.progress_value.emit)
+        self.cancel_token = process_runner.CancelToken()
+        self.metrics = None
+        self.result = None
+        self.report_file = None
+
+    def run(self):
+        self.metrics = JobMetrics(self.task_type, self.stage_event.emit)
+        self.result = None
+        params = self.params
+        try:
+            self.emit_codec_warning()
+            if self.task_type == 'las2pcd':
+                with self.metrics.stage('las2pcd', [params['input_file']], [params['output_file']],
+                                        points=las_points([params['input_file']])):
+                    self.convert_las_to_pcd()
+            elif self.task_type == 'divide':
+                with self.metrics.stage('divide', params['input_files'],
+                                        points=pcd_points(params['input_files'])):
+                    self.divide_pointcloud()
+            elif self.task_type == 'enhance':
+                with self.metrics.stage('enhance', [params['input_file']], [params['output_file']],
+                                        points=pcd_points([params['input_file']])):
+                    self.enhance_pcd()
+            elif self.task_type == 'batch':
+                self.batch_process()
+            elif self.task_type == 'pipeline':
+                self.pipeline_process()
+        except subprocess.TimeoutExpired as e:
+            self.finish(False, f"外部程序超时 (超过 {e.timeout} 秒), 已终止: {e.cmd[0]}")
+        except Exception as e:
+            self.finish(False, f"处理失败: {str(e)}")
+
+        # 先输出阶段统计, 再报告结果; 统计出错也必须报告结果, 否则调度器不会释放任务占用的资源
+        try:
+            # 取消后子进程被结束, 各处的报错都按取消处理
+            if self.cancel_token.cancelled:
+                self.finish(False, "任务已取消")
+            self.metrics.close()
+            self.report_metrics()
+        except Exception as e:
+            self.progress.emit(f"⚠️  阶段统计输出失败: {str(e)}")
+        finally:
+            if self.result is None:
+                self.result = (False, "任务已结束, 但没有报告结果")
+            self.finished.emit(*self.result)
+
+    def cancel(self):
+        """取消任务 (可在任意线程调用)"""
+        self.cancel_token.cancel()
+
+    def advance(self, phase, done, total, unit='points'):
+        """内置引擎的进度回调: 更新进度, 任务已取消时抛出 JobCancelled 中止处理"""
+        self.cancel_token.check()
+        self.meter(phase, done, total, unit)
+
+    def finish(self, success, message):
+        """记录任务结果 (阶段统计输出后再发出 finished)"""
+        if not success:
+            self.metrics.update(status='error')
+        self.result = (success, message)
+
+    def report_path(self):
+        """JSON 报告路径: 输出文件旁的 <输出文件>.report.json, 或输出目录中的 <任务>_report.json"""
+        if self.params.get('output_file'):
+            return self.params['output_file'] + '.report.json'
+        if self.params.get('output_dir'):
+            return os.path.join(self.params['output_dir'], f'{self.task_type}_report.json')
+        return None
+
+    def report_metrics(self):
+        """在日志中输出阶段汇总表, 并在输出旁写出 JSON 报告"""
+        if not self.metrics.stages:
+            return
+
+        self.progress.emit("\n阶段统计:")
+        for line in self.metrics.summary_lines():
+            self.progress.emit(line)
+
+        path = self.report_path()
+        if path and os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            params = {key: value for key, value in self.params.items() if key != 'tasks'}
+            success, message = self.result or (None, None)
+            if self.metrics.write_report(path, params, success, message):
+                self.report_file = path
+                self.progress.emit(f"任务报告: {path}")
+
+    def convert_las_to_pcd(self):
+        """LAS转PCD"""
+        input_file = self.params['input_file']
+        output_file = self.params['output_file']
+        conversion_type = self.params['conversion_type']
+        engine = self.params.get('engine', 'native')
+
+        # 优先使用内置引擎, 不支持时回退到外部程序
+        encoding = self.params.get('encoding', 'binary')
+        origin = self.params.get('origin')
+        if engine == 'native' and self.convert_las_to_pcd_native(input_file, output_file, conversion_type,
+                                                                 origin, encoding):
+            size = os.path.getsize(output_file) / (1024 * 1024)  # MB
+            self.finish(True, f"转换成功！输出文件: {output_file} ({size:.2f} MB)")
+            return
+
+        # 选择转换程序
+        if conversion_type == 'rgb':
+            cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd']
+        else:
+            cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd_intensity']
+
+        cmd.extend([input_file, output_file])
+        if origin is not None:
+            cmd.extend(str(v) for v in origin)
+
+        self.metrics.update(engine='external')
+        self.emit_external_encoding_warning(encoding)
+        self.progress.emit(f"执行命令: {' '.join(cmd)}")
+        self.progress.emit("开始转换...")
+
+        # 执行转换 (实时输出)
+        process = self.run_tool(cmd)
+
+        if process.returncode == 0:
+            # 检查输出文件
+            if os.path.exists(output_file):
+                size = os.path.getsize(output_file) / (1024 * 1024)  # MB
+                self.finish(True, f"转换成功！输出文件: {output_file} ({size:.2f} MB)")
+            else:
+                self.finish(False, "转换完成但未找到输出文件")
+        else:
+            self.finish(False, f"转换失败: {process.stderr}")
+
+    def convert_las_to_pcd_native(self, input_file, output_file, conversion_type, origin=None,
+                                  encoding='binary'):
+        """使用内置引擎转换, 返回 False 表示需要回退到外部程序"""
+        if not las_io.NATIVE_AVAILABLE:
+            self.progress.emit("未安装 numpy, 使用外部转换程序")
+            return False
+
+        self.progress.emit("使用内置转换引擎 (NumPy 内存映射)")
+        try:
+            las_io.convert_las_to_pcd(input_file, output_file, conversion_type,
+                                      origin=origin, progress=self.progress.emit,
+                                      encoding=encoding, advance=self.advance,
+                                      workers=self.params.get('workers') or default_workers(),
+                                      cancel=self.cancel_token)
+        except las_io.UnsupportedLASError as e:
+            self.progress.emit(f"内置引擎不支持该文件 ({e}), 改用外部转换程序")
+            return False
+
+        self.metrics.update(engine='native')
+        return True
+
+    def divide_pointcloud(self):
+        """点云分割"""
+        input_files = self.params['input_files']
+        output_dir = self.params['output_dir']
+        prefix = self.params['prefix']
+        grid_size_x = self.params['grid_size_x']
+        grid_size_y = self.params['grid_size_y']
+        leaf_size = self.params['leaf_size']
+        merge_pcds = self.params['merge_pcds']
+
+        # 确保输出目录以斜杠结尾
+        if not output_dir.endswith('/'):
+            output_dir = output_dir + '/'
+
+        # 优先使用内置分割引擎, 不支持时回退到 pointcloud_divider
+        if self.params.get('engine', 'native') == 'native' and self.divide_pointcloud_native(
+                input_files, output_dir, prefix, grid_size_x, grid_size_y, leaf_size, merge_pcds):
+            return
+
+        # 创建临时配置文件
+        config_file = '/tmp/pointcloud_divider_temp.yaml'
+        config = {
+            'pointcloud_divider': {
+                'grid_size_x': grid_size_x,
+                'grid_size_y': grid_size_y,
+                'leaf_size': leaf_size,
+                'merge_pcds': merge_pcds,
+                'use_large_grid': False
+            }
+        }
+
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f)
+
+        self.progress.emit(f"配置参数:")
+        self.progress.emit(f"  输出目录: {output_dir}")
+        self.progress.emit(f"  文件前缀: {prefix}")
+        self.progress.emit(f"  网格大小: {grid_size_x}m x {grid_size_y}m")
+        self.progress.emit(f"  降采样: {'是 ('+str(leaf_size)+'m)' if leaf_size > 0 else '否'}")
+        self.progress.emit(f"  合并模式: {'是' if merge_pcds else '否'}")
+        self.emit_external_encoding_warning(self.params.get('encoding', 'binary'))
+        self.emit_external_tiling_warning()
+        self.progress.emit("")
+
+        # 构建命令
+        cmd = [
+            '/home/luo/map_ws/pointcloud_divider-master/build/pointcloud_divider',
+            str(len(input_files))
+        ]
+        cmd.extend(input_files)
+        cmd.extend([output_dir, prefix, config_file])
+
+        self.progress.emit(f"处理 {len(input_files)} 个文件...")
+        self.progress.emit("")
+
+        # 执行分割 (实时输出)
+        process = self.run_tool(cmd)
+
+        if process.returncode == 0:
+            # 统计输出文件
+            output_files = list(Path(output_dir).glob('*.pcd'))
+            self.metrics.update(engine='external', outputs=[str(f) for f in output_files])
+            metadata_file = os.path.join(output_dir, f'{prefix}_metadata.yaml')
+
+            msg = f"分割成功！\n"
+            msg += f"输出目录: {output_dir}\n"
+            msg += f"生成文件: {len(output_files)} 个PCD文件"
+
+            if os.path.exists(metadata_file):
+                msg += f"\n元数据文件: {prefix}_metadata.yaml"
+                if not merge_pcds:
+                    self.build_tile_index(output_dir, prefix)
+
+            self.finish(True, msg)
+        else:
+            self.finish(False, f"分割失败: {process.stderr}")
+
+    def divide_pointcloud_native(self, input_files, output_dir, prefix, grid_size_x, grid_size_y,
+                                 leaf_size, merge_pcds):
+        """使用内置引擎分割, 返回 False 表示需要回退到 pointcloud_divider"""
+        voxel_mode = self.params.get('voxel_mode', 'centroid')
+        if not las_io.NATIVE_AVAILABLE:
+            self.progress.emit("未安装 numpy, 使用 pointcloud_divider")
+            return False
+
+        self.progress.emit("使用内置分割引擎 (NumPy 向量化分桶)")
+        self.progress.emit(f"  输出目录: {output_dir}")
+        self.progress.emit(f"  文件前缀: {prefix}")
+        self.progress.emit(f"  网格大小: {grid_size_x}m x {grid_size_y}m")
+        self.progress.emit(f"  降采样: {'是 ('+str(leaf_size)+'m, '+voxel_mode+')' if leaf_size > 0 else '否'}")
+        self.progress.emit(f"  合并模式: {'是' if merge_pcds else '否'}")
+        self.progress.emit(f"  分块方式: {self.tiling_description()}")
+        self.progress.emit(f"  分桶缓存上限: {self.binning_memory_mb():g} MB")
+        self.progress.emit("")
+
+        try:
+            output_files = grid_divider.divide_pcd_files(
+                input_files, output_dir, prefix, grid_size_x, grid_size_y, leaf_size,
+                merge_pcds, voxel_mode, self.params.get('workers') or default_workers(),
+                memory_limit=grid_divider.memory_limit_bytes(self.params.get('memory_limit_mb')),
+                progress=self.progress.emit, encoding=self.params.get('encoding', 'binary'),
+                advance=self.advance, cancel=self.cancel_token, **self.tiling_options())
+        except pcd_io.UnsupportedPCDError as e:
+            self.progress.emit(f"内置引擎不支持该文件 ({e}), 改用 pointcloud_divider")
+            return False
+
+        self.metrics.update(engine='native',
+                            outputs=[os.path.join(output_dir, name) for name in output_files])
+
+        msg = f"分割成功！\n"
+        msg += f"输出目录: {output_dir}\n"
+        msg += f"生成文件: {len(output_files)} 个PCD文件"
+        if not merge_pcds:
+            msg += f"\n元数据文件: {prefix}_metadata.yaml"
+            msg += f"\n网格索引: {tile_index.index_file_name(prefix)}"
+
+        self.finish(True, msg)
+        return True
+
+    def enhance_pcd(self):
+        """PCD增强"""
+        input_file = self.params['input_file']
+        output_file = self.params['output_file']
+
+        # 优先使用内置增强, 不支持时回退到 pcd_enhancer
+        if self.params.get('engine', 'native') == 'native' and self.enhance_pcd_native(input_file, output_file):
+            self.finish(True, f"增强成功！输出文件: {output_file}")
+            return
+
+        cmd = [
+            '/home/luo/map_ws/las2pcd/build/pcd_enhancer',
+            input_file,
+            output_file
+        ]
+
+        self.metrics.update(engine='external')
+        self.emit_external_encoding_warning(self.params.get('encoding'))
+        self.progress.emit(f"执行命令: {' '.join(cmd)}")
+        self.progress.emit("开始增强处理...")
+
+        process = self.run_tool(cmd)
+
+        if process.returncode == 0:
+            self.finish(True, f"增强成功！输出文件: {output_file}")
+        else:
+            self.finish(False, f"增强失败: {process.stderr}")
+
+    def enhance_pcd_native(self, input_file, output_file):
+        """使用内置查找表增强, 返回 False 表示需要回退到 pcd_enhancer"""
+        if not las_io.NATIVE_AVAILABLE:
+            self.progress.emit("未安装 numpy, 使用 pcd_enhancer")
+            return False
+
+        self.progress.emit("使用内置增强引擎 (查找表)")
+        try:
+            pcd_enhance.enhance_pcd(
+                input_file, output_file,
+                gamma=self.params.get('gamma', pcd_enhance.DEFAULT_GAMMA),
+                contrast=self.params.get('contrast', 1.0),
+                auto=self.params.get('auto_gamma', False),
+                progress=self.progress.emit,
+                encoding=self.params.get('encoding'),
+                advance=self.advance)
+        except pcd_io.UnsupportedPCDError as e:
+            self.progress.emit(f"内置引擎不支持该文件 ({e}), 改用 pcd_enhancer")
+            return False
+
+        self.metrics.update(engine='native')
+        return True
+
+    def batch_process(self):
+        """批量处理"""
+        tasks = self.params['tasks']
+        workers = self.params.get('workers') or default_workers()
+        success_count = 0
+        fail_count = 0
+        skip_count = 0
+
+        # 增量模式: 跳过输入、参数和输出都未变化的任务 (也用于中断后继续)
+        manifest = BatchManifest(self.params['output_dir'])
+        if self.params.get('incremental', True):
+            tasks, skip_count = manifest.pending_tasks(tasks)
+            if skip_count:
+                self.progress.emit(f"增量模式: 跳过 {skip_count} 个已是最新的文件 (清单: {manifest.path})")
+        total = len(tasks)
+        if self.params.get('timeout'):
+            for task in tasks:
+                task.setdefault('timeout', self.params['timeout'])
+
+        self.progress.emit(f"共 {total} 个任务, 并行数: {workers}")
+
+        # 按完成顺序输出, 每个任务的日志整体输出, 避免交错
+        converted = []
+        with self.metrics.stage('batch', [task['input_file'] for task in tasks],
+                                tasks=total, skipped=skip_count, workers=workers):
+            # 进度按输入文件大小计算, 大小不一的文件也能给出合理的剩余时间
+            total_bytes = files_size(task['input_file'] for task in tasks)
+            done_bytes = 0
+            results = run_batch_tasks(tasks, workers, self.cancel_token)
+            for idx, (task, success, log, error) in enumerate(results):
+                done_bytes += files_size([task['input_file']])
+                self.advance('批量转换', done_bytes, total_bytes, 'bytes')
+                self.progress.emit(f"\n{'='*60}")
+                self.progress.emit(f"[{idx+1}/{total}] 处理: {task['input_file']}")
+                self.progress.emit('='*60)
+
+                for line in log:
+                    self.progress.emit(line)
+
+                # 每个任务完成后立即更新清单
+                if success:
+                    success_count += 1
+                    converted.append(task)
+                    manifest.record(task)
+                    self.progress.emit(f"✓ 成功")
+                else:
+                    fail_count += 1
+                    manifest.forget(task)
+                    self.progress.emit(f"✗ 失败: {error}")
+
+            self.metrics.update(
+                failed=fail_count, points=las_points([task['input_file'] for task in converted]),
+                outputs=[task['output_file'] for task in converted])
+
+        self.progress.emit(f"\n{'='*60}")
+        self.progress.emit(f"批量处理完成:")
+        self.progress.emit(f"  总数: {total + skip_count}")
+        self.progress.emit(f"  成功: {success_count}")
+        self.progress.emit(f"  失败: {fail_count}")
+        self.progress.emit(f"  跳过: {skip_count}")
+        self.progress.emit('='*60)
+
+        self.finish(True, f"批量处理完成\n成功: {success_count} / 失败: {fail_count} / 跳过: {skip_count}")
+
+    def pipeline_process(self):
+        """一键流程处理: LAS→PCD→分割→(可选)增强→(可选)LOD 金字塔"""
+        input_file = self.params['input_file']
+        output_dir = self.params['output_dir']
+        conversion_type = self.params['conversion_type']
+        grid_size = self.params['grid_size']
+        leaf_size = self.params['leaf_size']
+        enhance = self.params['enhance']
+
+        # 确保输出目录以斜杠结尾
+        if not output_dir.endswith('/'):
+            output_dir = output_dir + '/'
+
+        # 创建输出目录
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 阶段1+2: 流式模式下 LAS 直接分割为网格, 不生成全尺寸的中间PCD
+        fused = self.params.get('fused', True)
+        if not (fused and self.pipeline_divide_stream(input_file, output_dir, conversion_type,
+                                                       grid_size, leaf_size)):
+            if not self.pipeline_convert_and_divide(input_file, output_dir, conversion_type,
+                                                    grid_size, leaf_size):
+                return
+
+        # 阶段3: (可选) PCD增强
+        if enhance:
+            self.progress.emit("\n" + "="*60)
+            self.progress.emit("阶段 3/3: PCD增强处理")
+            self.progress.emit("="*60)
+
+            # 找到所有分割后的PCD文件
+            pcd_files = list(Path(output_dir).glob('pointcloud_map_*.pcd'))
+            total = len(pcd_files)
+            self.progress.emit(f"找到 {total} 个PCD文件需要增强")
+
+            workers = self.params.get('workers') or default_workers()
+            self.progress.emit(f"并行数: {workers}")
+
+            # 内置增强: 自动 Gamma 时先统计全部网格的直方图, 保证各网格颜色一致
+            options = None
+            if las_io.NATIVE_AVAILABLE:
+                gamma = pcd_enhance.DEFAULT_GAMMA
+                if self.params.get('auto_gamma', False):
+                    gamma = pcd_enhance.auto_gamma_for_files(pcd_files)
+                    self.progress.emit(f"自动 Gamma: {gamma:.3f}")
+                options = {'gamma': gamma, 'contrast': 1.0,
+                           'encoding': self.params.get('encoding', 'binary')}
+
+            # 按完成顺序汇报, 每个网格在工作线程中完成替换
+            success_count = 0
+            enhanced = []
+            with self.metrics.stage('enhance', pcd_files, points=pcd_points(pcd_files),
+                                    engine='native' if options else 'external', workers=workers):
+                results = enhance_tiles(
+                    [str(pcd_file) for pcd_file in pcd_files],
+                    '/home/luo/map_ws/las2pcd/build/pcd_enhancer', workers, options,
+                    self.params.get('timeout'), self.cancel_token)
+                for idx, (pcd_path, success, error) in enumerate(results):
+                    self.advance('增强网格', idx + 1, total, 'tiles')
+                    if success:
+                        success_count += 1
+                        enhanced.append(pcd_path)
+                        self.progress.emit(f"[{idx+1}/{total}] ✓ {os.path.basename(pcd_path)}")
+                    else:
+                        self.progress.emit(f"[{idx+1}/{total}] ✗ {os.path.basename(pcd_path)} - {error}")
+                self.metrics.update(outputs=enhanced, failed=total - success_count)
+
+            self.progress.emit(f"✓ 增强处理完成: 成功 {success_count}/{total}")
+            # 增强改写了网格文件, 更新索引中的字节数
+            tile_index.refresh_index_sizes(output_dir, 'pointcloud_map')
+        else:
+            self.progress.emit("\n阶段 3/3: 跳过增强处理")
+
+        # (可选) LOD 金字塔: 在增强之后生成, 各级颜色与全分辨率网格一致
+        lod_levels = self.params.get('lod_levels') or 0
+        if lod_levels > 0:
+            self.build_lod_pyramid(output_dir, 'pointcloud_map', lod_levels, leaf_size)
+
+        # 统计最终结果
+        output_files = list(Path(output_dir).glob('pointcloud_map_*.pcd'))
+        metadata_file = os.path.join(output_dir, 'pointcloud_map_metadata.yaml')
+
+        self.progress.emit("\n" + "="*60)
+        self.progress.emit("一键流程处理完成!")
+        self.progress.emit("="*60)
+        self.progress.emit(f"输出目录: {output_dir}")
+        self.progress.emit(f"生成文件: {len(output_files)} 个PCD文件")
+        if os.path.exists(metadata_file):
+            self.progress.emit(f"元数据文件: pointcloud_map_metadata.yaml")
+        if os.path.exists(os.path.join(output_dir, tile_index.index_file_name('pointcloud_map'))):
+            self.progress.emit(f"网格索引: {tile_index.index_file_name('pointcloud_map')}")
+        lod_manifest = lod_pyramid.manifest_file_name('pointcloud_map')
+        if lod_levels > 0 and os.path.exists(os.path.join(output_dir, lod_manifest)):
+            self.progress.emit(f"LOD 清单: {lod_manifest}")
+
+        self.finish(True, f"一键流程完成！\n输出目录: {output_dir}\n生成 {len(output_files)} 个PCD文件")
+
+
+    def pipeline_divide_stream(self, input_file, output_dir, conversion_type, grid_size, leaf_size):
+        """一键流程阶段1+2 (流式): LAS 点块直接分桶写出网格, 返回 False 表示需要回退"""
+        if not las_io.NATIVE_AVAILABLE:
+            self.progress.emit("未安装 numpy, 使用 LAS→PCD + 分割两阶段流程")
+            return False
+
+        self.progress.emit("\n" + "="*60)
+        self.progress.emit("阶段 1-2/3: LAS → 网格分割 (流式, 无中间PCD)")
+        self.progress.emit("="*60)
+        self.progress.emit(f"网格大小: {grid_size}m x {grid_size}m")
+        voxel_mode = self.params.get('voxel_mode', 'centroid')
+        self.progress.emit(f"降采样: {'是 ('+str(leaf_size)+'m, '+voxel_mode+')' if leaf_size > 0 else '否'}")
+        self.progress.emit(f"分块方式: {self.tiling_description()}")
+        self.progress.emit(f"分桶缓存上限: {self.binning_memory_mb():g} MB")
+
+        with self.metrics.stage('las_divide', [input_file], points=las_points([input_file]),
+                                engine='native'):
+            try:
+                tiles = grid_divider.divide_las_stream(
+                    input_file, output_dir, 'pointcloud_map', conversion_type,
+                    grid_size, grid_size, leaf_size, voxel_mode=voxel_mode,
+                    workers=self.params.get('workers') or default_workers(),
+                    memory_limit=grid_divider.memory_limit_bytes(self.params.get('memory_limit_mb')),
+                    progress=self.progress.emit, encoding=self.params.get('encoding', 'binary'),
+                    advance=self.advance, cancel=self.cancel_token, **self.tiling_options())
+            except las_io.UnsupportedLASError as e:
+                self.metrics.update(status='fallback')
+                self.progress.emit(f"内置引擎不支持该文件 ({e}), 改用两阶段流程")
+                return False
+            self.metrics.update(outputs=[os.path.join(output_dir, name) for name in tiles])
+
+        self.progress.emit(f"✓ 流式分割完成: {len(tiles)} 个网格")
+        return True
+
+    def pipeline_convert_and_divide(self, input_file, output_dir, conversion_type, grid_size, leaf_size):
+        """一键流程阶段1+2: 先转换为临时PCD, 再调用 pointcloud_divider 分割"""
+        # 阶段1: LAS → PCD
+        self.progress.emit("\n" + "="*60)
+        self.progress.emit("阶段 1/3: LAS → PCD 转换")
+        self.progress.emit("="*60)
+
+        base_name = os.path.basename(input_file).rsplit('.', 1)[0]
+        temp_pcd = os.path.join(output_dir, base_name + '_temp.pcd')
+
+        with self.metrics.stage('las2pcd', [input_file], [temp_pcd], points=las_points([input_file])):
+            if not self.convert_las_to_pcd_native(input_file, temp_pcd, conversion_type):
+                # 选择转换程序
+                if conversion_type == 'rgb':
+                    las2pcd_cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd']
+                else:
+                    las2pcd_cmd = ['/home/luo/map_ws/las2pcd/build/las2pcd_intensity']
+
+                las2pcd_cmd.extend([input_file, temp_pcd])
+                self.metrics.update(engine='external')
+                self.progress.emit(f"执行命令: {' '.join(las2pcd_cmd)}")
+
+                process = self.run_tool(las2pcd_cmd, echo=False)
+
+                if process.returncode != 0:
+                    self.finish(False, f"LAS转PCD失败: {process.stderr}")
+                    return False
+
+        self.progress.emit("✓ LAS转PCD完成")
+
+        # 阶段2: 点云分割
+        self.progress.emit("\n" + "="*60)
+        self.progress.emit("阶段 2/3: 点云分割")
+        self.progress.emit("="*60)
+
+        # 创建临时配置文件
+        config_file = '/tmp/pointcloud_divider_pipeline.yaml'
+        config = {
+            'pointcloud_divider': {
+                'grid_size_x': grid_size,
+                'grid_size_y': grid_size,
+                'leaf_size': leaf_size,
+                'merge_pcds': False,
+                'use_large_grid': False
+            }
+        }
+
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f)
+
+        divide_cmd = [
+            '/home/luo/map_ws/pointcloud_divider-master/build/pointcloud_divider',
+            '1',
+            temp_pcd,
+            output_dir,
+            'pointcloud_map',
+            config_file
+        ]
+
+        self.progress.emit(f"网格大小: {grid_size}m x {grid_size}m")
+        self.progress.emit(f"降采样: {'是 ('+str(leaf_size)+'m)' if leaf_size > 0 else '否'}")
+        self.emit_external_encoding_warning(self.params.get('encoding', 'binary'))
+        self.emit_external_tiling_warning()
+
+        with self.metrics.stage('divide', [temp_pcd], points=pcd_points([temp_pcd]), engine='external'):
+            process = self.run_tool(divide_cmd, echo=False)
+
+            if process.returncode != 0:
+                self.finish(False, f"点云分割失败: {process.stderr}")
+                return False
+            self.metrics.update(outputs=[str(f) for f in Path(output_dir).glob('pointcloud_map_*.pcd')])
+
+        self.progress.emit("✓ 点云分割完成")
+        self.build_tile_index(output_dir, 'pointcloud_map')
+
+        # 删除临时PCD文件
+        if os.path.exists(temp_pcd):
+            os.remove(temp_pcd)
+            self.progress.emit(f"✓ 已清理临时文件")
+
+        return True
+
+
+    def build_lod_pyramid(self, output_dir, prefix, levels, leaf_size):
+        """由全分辨率网格自底向上生成 LOD 金字塔和清单"""
+        self.progress.emit("\n" + "="*60)
+        self.progress.emit(f"LOD 金字塔: {levels} 级")
+        self.progress.emit("="*60)
+        if not las_io.NATIVE_AVAILABLE:
+            self.progress.emit("⚠️  未安装 numpy, 跳过 LOD 金字塔")
+            return
+
+        tiles = [str(f) for f in Path(output_dir).glob(f'{prefix}_*.pcd')]
+        workers = self.params.get('workers') or default_workers()
+        voxel_mode = self.params.get('voxel_mode', 'centroid')
+        with self.metrics.stage('lod', tiles, points=pcd_points(tiles), engine='native', workers=workers):
+            manifest = lod_pyramid.build_pyramid(
+                output_dir, prefix, levels, leaf_size, voxel_mode,
+                self.params.get('encoding', 'binary'), workers, self.progress.emit, self.advance,
+                self.cancel_token)
+            lod_tiles = Path(output_dir, f'{prefix}_lod').rglob(f'{prefix}_*.pcd')
+            self.metrics.update(outputs=[manifest] + [str(f) for f in lod_tiles])
+        self.progress.emit(f"✓ LOD 金字塔完成: {os.path.basename(manifest)}")
+
+    def build_tile_index(self, output_dir, prefix):
+        """外部程序分割后由元数据和网格文件重建网格索引; 失败时只警告, 不影响分割结果"""
+        if not las_io.NATIVE_AVAILABLE:
+            return
+        self.progress.emit("生成网格索引...")
+        try:
+            path = tile_index.build_from_metadata(output_dir, prefix, self.progress.emit)
+        except (OSError, ValueError, KeyError, TypeError, yaml.YAMLError) as e:
+            self.progress.emit(f"⚠️  网格索引生成失败: {e}")
+            return
+        self.progress.emit(f"✓ 网格索引: {os.path.basename(path)}")
+
+    def run_tool(self, cmd, echo=True):
+        """运行外部程序 (同时读取 stdout/stderr, 超时由参数 timeout 指定)
+
+        echo 为 True 时把 stdout 实时输出到日志; 返回值的 stderr 为最后若干行, 用于报告错误
+        """
+        on_stdout = (lambda line: self.progress.emit(line.strip())) if echo else None
+        return process_runner.run_process(cmd, on_stdout=on_stdout, timeout=self.params.get('timeout'),
+                                          tail_lines=process_runner.ERROR_TAIL_LINES,
+                                          cancel=self.cancel_token)
+
+    def binning_memory_mb(self):
+        """内置分割引擎的分桶缓存上限 (MB), 超过后落盘"""
+        return grid_divider.memory_limit_bytes(self.params.get('memory_limit_mb')) / grid_divider.MB
+
+    def tiling_options(self):
+        """内置分割引擎的分块参数"""
+        max_mb = self.params.get('max_tile_mb') or 0
+        return {
+            'tiling': self.params.get('tiling', 'grid'),
+            'max_tile_points': self.params.get('max_tile_points'),
+            'max_tile_bytes': int(max_mb * 1024 * 1024) or None,
+        }
+
+    def tiling_description(self):
+        if self.params.get('tiling', 'grid') != 'adaptive':
+            return "固定网格"
+        text = f"自适应四叉树 (网格大小为最大分块, 每块最多 " \
+               f"{self.params.get('max_tile_points') or quadtree_tiling.DEFAULT_MAX_TILE_POINTS:,} 点"
+        if self.params.get('max_tile_mb'):
+            text += f" / {self.params['max_tile_mb']:g} MB"
+        return text + ")"
+
+    def emit_external_tiling_warning(self):
+        """外部程序只支持固定网格"""
+        if self.params.get('tiling', 'grid') == 'adaptive':
+            self.progress.emit("⚠️  外部程序不支持自适应分块, 使用固定网格")
+
+    def emit_codec_warning(self):
+        """选择 binary_compressed 输出但未安装 python-lzf 时, 在日志开头提示一次"""
+        encodings = {self.params.get('encoding')}
+        encodings.update(task.get('encoding') for task in self.params.get('tasks', []))
+        if 'binary_compressed' in encodings and not lzf_codec.NATIVE_LZF:
+            self.progress.emit(f"⚠️  {lzf_codec.FALLBACK_WARNING}")
+
+    def emit_external_encoding_warning(self, encoding):
+        """外部程序自行决定输出编码, 选择了非默认编码时提示"""
+        if encoding not in (None, 'binary'):
+            self.progress.emit(f"⚠️  外部程序不支持输出编码选项 ({encoding}), 输出编码由程序决定")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+外部程序运行
+- 用 selectors 同时读取 stdout 和 stderr, 任一管道写满都不会阻塞子进程
+- 输出逐行回调, 只保留最后若干行 (内存有上限)
+- 支持总超时和无输出超时, 超时后结束子进程并抛出 subprocess.TimeoutExpired
+- CancelToken: 取消任务时结束该任务启动的全部子进程 (含子孙进程)
+"""
+
+import os
+import time
+import signal
+import selectors
+import threading
+import subprocess
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# 结果中保留的最后输出行数
+DEFAULT_TAIL_LINES = 200
+
+# 只用于错误信息时保留的行数 (界面对话框中显示)
+ERROR_TAIL_LINES = 20
+
+# 单行最大字节数, 超过后按此长度切分 (防止没有换行的输出占满内存)
+MAX_LINE_BYTES = 64 * 1024
+
+READ_SIZE = 64 * 1024
+
+# 等待输出的轮询间隔 (秒), 用于检查超时
+POLL_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+def child_pids():
+    """{父进程: [子进程]} (读取 /proc/*/stat), 不可用时返回空 dict"""
+    children = {}
+    try:
+        names = os.listdir('/proc')
+    except OSError:
+        return children
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                stat = f.read()
+            # 程序名中可能有空格和括号, 从最后一个 ')' 之后解析: 状态 父进程 ...
+            ppid = int(stat[stat.rfind(b')') + 1:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    return children
+
+
+def kill_tree(pid):
+    """结束进程及其全部子孙进程 (外部程序自己启动的子进程也一并结束)"""
+    children = child_pids()
+    pids = [pid]
+    for parent in pids:
+        pids.extend(children.get(parent, []))
+    for target in pids:
+        try:
+            os.kill(target, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except OSError:
+            pass
+
+
+class CancelToken:
+    """任务取消标记
+
+    任务启动的子进程 / 进程池用 register / tracking 登记, cancel() 时结束它们的整个进程树;
+    任务代码在循环中调用 check(), 已取消时抛出 JobCancelled
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.pids = set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise JobCancelled("任务已取消")
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            pids = list(self.pids)
+        for pid in pids:
+            kill_tree(pid)
+
+    def register(self, pid):
+        with self.lock:
+            self.pids.add(pid)
+            cancelled = self.event.is_set()
+        if cancelled:
+            kill_tree(pid)
+
+    def unregister(self, pid):
+        with self.lock:
+            self.pids.discard(pid)
+
+    @contextmanager
+    def tracking(self, executor):
+        """在 with 块中登记进程池的工作进程 (提交任务后进入, 此时工作进程已启动)
+
+        退出时先关闭进程池再取消登记: 已结束的进程号可能被系统复用, 之后的取消不能再结束它们
+        """
+        pids = list(getattr(executor, '_processes', None) or {})
+        for pid in pids:
+            self.register(pid)
+        try:
+            yield
+        finally:
+            executor.shutdown(wait=True)
+            for pid in pids:
+                self.unregister(pid)
+
+
+def pool_tracking(cancel, executor):
+    """cancel.tracking(executor), cancel 为 None 时不登记"""
+    return cancel.tracking(executor) if cancel is not None else nullcontext()
+
+
+class _LineSplitter:
+    """把读到的字节切分为行, 回调并保留最后 tail_lines 行"""
+
+    def __init__(self, callback, tail_lines):
+        self.callback = callback
+        self.tail = deque(maxlen=tail_lines)
+        self.partial = b''
+
+    def feed(self, data):
+        self.partial += data
+        *lines, self.partial = self.partial.split(b'\n')
+        while len(self.partial) > MAX_LINE_BYTES:
+            lines.append(self.partial[:MAX_LINE_BYTES])
+            self.partial = self.partial[MAX_LINE_BYTES:]
+        for line in lines:
+            self.emit(line)
+
+    def close(self):
+        if self.partial:
+            self.emit(self.partial)
+            self.partial = b''
+
+    def emit(self, raw):
+        line = raw.decode('utf-8', errors='replace').rstrip('\r')
+        self.tail.append(line)
+        if self.callback is not None:
+            self.callback(line)
+
+    def text(self):
+        return '\n'.join(self.tail)
+
+
+def run_process(cmd, on_stdout=None, on_stderr=None, timeout=None, idle_timeout=None,
+                tail_lines=DEFAULT_TAIL_LINES, cancel=None):
+    """运行外部程序直到结束, 返回 subprocess.CompletedProcess
+
+    on_stdout / on_stderr: 每行输出的回调 (在调用线程中执行), 为 None 时只保留最后的行
+    timeout: 总运行时间上限 (秒); idle_timeout: 两次输出之间的最长间隔 (秒)
+    cancel: CancelToken, 取消后结束程序并抛出 JobCancelled
+    返回值的 stdout / stderr 为最后 tail_lines 行; 程序不存在时抛出 OSError
+    """
+    if cancel is not None:
+        cancel.check()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if cancel is not None:
+        cancel.register(process.pid)
+    stdout = _LineSplitter(on_stdout, tail_lines)
+    stderr = _LineSplitter(on_stderr, tail_lines)
+    try:
+        _drain(process, cmd, {process.stdout: stdout, process.stderr: stderr},
+               timeout, idle_timeout, cancel)
+    except BaseException:
+        # 超时 / 取消 / 回调出错 / 线程被中断时不留下僵尸进程
+        kill_tree(process.pid)
+        process.wait()
+        raise
+    finally:
+        if cancel is not None:
+            cancel.unregister(process.pid)
+        process.stdout.close()
+        process.stderr.close()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout.text(), stderr.text())
+
+
+def _drain(process, cmd, splitters, timeout, idle_timeout, cancel):
+    started = last_output = time.monotonic()
+    with selectors.DefaultSelector() as selector:
+        for pipe, splitter in splitters.items():
+            os.set_blocking(pipe.fileno(), False)
+            selector.register(pipe, selectors.EVENT_READ, splitter)
+
+        while selector.get_map():
+            events = selector.select(POLL_INTERVAL)
+            now = time.monotonic()
+            for key, _ in events:
+                data = os.read(key.fd, READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.data.close()
+                    continue
+                key.data.feed(data)
+                last_output = now
+            if cancel is not None:
+                cancel.check()
+            _check_timeout(cmd, splitters, now - started, now - last_output, timeout, idle_timeout)
+
+    # 管道已关闭, 等待进程退出
+    while True:
+        try:
+            process.wait(timeout=POLL_INTERVAL)
+            return
+        except subprocess.TimeoutExpired:
+            if cancel is not None:
+                cancel.check()
+            now = time.monotonic()
+            _check_timeout(cmd, splitters, now - started, 0.0, timeout, None)
+
+
+def _check_timeout(cmd, splitters, elapsed, idle, timeout, idle_timeout):
+    if timeout is not None and elapsed > timeout:
+        limit = timeout
+    elif idle_timeout is not None and idle > idle_timeout:
+        limit = idle_timeout
+    else:
+        return
+    stdout, stderr = (splitter.text() for splitter in splitters.values())
+    raise subprocess.TimeoutExpired(cmd, limit, output=stdout, stderr=stderr)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+自适应四叉树分块
+- 第一遍流式统计点密度直方图 (最细一级单元的点数, 稀疏存储)
+- 从根网格 (grid_size) 开始逐级四分, 直到每块的点数不超过上限或到达最大深度
+- 第二遍按点所在的最细单元查表得到分块, 稀疏区域保留大块, 密集区域细分为小块
+分块用 (级别, ix, iy) 表示: 级别 L 的块边长为 根网格 / 2^L, 左下角为 (ix, iy) × 边长
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 单块默认最大点数
+DEFAULT_MAX_TILE_POINTS = 1000000
+
+# 最大细分级数 (最小块边长为根网格的 1/32)
+MAX_DEPTH = 5
+
+# 直方图中未合并的单元数超过此值时合并一次
+COMPACT_CELLS = 4 * 1024 * 1024
+
+
+def pack_keys(ix, iy):
+    """(ix, iy) 打包为 64 位键 (高 32 位 ix, 低 32 位 iy), 按键排序即按 ix, iy 排序"""
+    return (ix.astype(np.int64) << 32) | (iy.astype(np.int64) & 0xFFFFFFFF)
+
+
+def unpack_keys(keys):
+    """64 位键 → (ix, iy), 均为有符号整数"""
+    return keys >> 32, (keys << 32) >> 32
+
+
+def max_points_for(max_points, max_bytes, point_bytes):
+    """由点数上限和字节数上限 (0 / None 表示不限制) 得到每块的点数上限"""
+    limit = max_points or DEFAULT_MAX_TILE_POINTS
+    if max_bytes:
+        limit = min(limit, max(1, int(max_bytes // point_bytes)))
+    return limit
+
+
+class DensityHistogram:
+    """最细一级单元的点数直方图, 按块流式累加"""
+
+    def __init__(self, cell_x, cell_y):
+        self.cell_x = cell_x
+        self.cell_y = cell_y
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.pending = []
+        self.pending_cells = 0
+
+    def cell_keys(self, x, y):
+        """点所在的最细单元 (统计和查表使用同一计算, 结果一致)"""
+        ix = np.floor(x / self.cell_x).astype(np.int64)
+        iy = np.floor(y / self.cell_y).astype(np.int64)
+        return pack_keys(ix, iy)
+
+    def add(self, x, y):
+        if len(x) == 0:
+            return
+        keys, counts = np.unique(self.cell_keys(x, y), return_counts=True)
+        self.pending.append((keys, counts))
+        self.pending_cells += len(keys)
+        if self.pending_cells > COMPACT_CELLS:
+            self.compact()
+
+    def compact(self):
+        """合并累加的单元 (键有序、唯一)"""
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [keys for keys, _ in self.pending])
+        counts = np.concatenate([self.counts] + [counts for _, counts in self.pending])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        self.pending = []
+        self.pending_cells = 0
+
+    @property
+    def total(self):
+        self.compact()
+        return int(self.counts.sum())
+
+
+class QuadTreeTiling:
+    """四叉树分块结果: 分块列表和 最细单元 → 分块 的查找表"""
+
+    def __init__(self, root_x, root_y, max_depth, max_points, histogram, leaves, cell_tiles,
+                 leaf_points):
+        self.root_x = float(root_x)
+        self.root_y = float(root_y)
+        self.max_depth = max_depth
+        self.max_points = max_points
+        self.histogram = histogram
+        self.leaves = leaves            # 分块编号 → (级别, ix, iy)
+        self.cell_tiles = cell_tiles    # 与 histogram.keys 对齐的分块编号
+        self.leaf_points = leaf_points  # 分块编号 → 点数
+
+    @classmethod
+    def build(cls, histogram, root_x, root_y, max_points, max_depth=MAX_DEPTH):
+        """从根网格开始逐级合计单元点数, 不超过上限 (或到达最大深度) 的块成为分块"""
+        histogram.compact()
+        fx, fy = unpack_keys(histogram.keys)
+        cell_tiles = np.full(len(histogram.keys), -1, dtype=np.int64)
+        leaves = []
+        leaf_points = []
+        remaining = np.arange(len(histogram.keys))
+
+        for level in range(max_depth + 1):
+            if len(remaining) == 0:
+                break
+            shift = max_depth - level
+            parents = pack_keys(fx[remaining] >> shift, fy[remaining] >> shift)
+            blocks, inverse = np.unique(parents, return_inverse=True)
+            sums = np.bincount(inverse, weights=histogram.counts[remaining]).astype(np.int64)
+            done = (sums <= max_points) if level < max_depth else np.ones(len(blocks), dtype=bool)
+
+            ids = np.cumsum(done) - 1 + len(leaves)
+            px, py = unpack_keys(blocks[done])
+            leaves.extend((level, int(x), int(y)) for x, y in zip(px, py))
+            leaf_points.extend(int(v) for v in sums[done])
+
+            finished = done[inverse]
+            cell_tiles[remaining[finished]] = ids[inverse[finished]]
+            remaining = remaining[~finished]
+
+        return cls(root_x, root_y, max_depth, max_points, histogram, leaves, cell_tiles, leaf_points)
+
+    def tile_ids(self, x, y):
+        """每个点所在的分块编号"""
+        keys = self.histogram.cell_keys(x, y)
+        pos = np.searchsorted(self.histogram.keys, keys)
+        pos = np.minimum(pos, len(self.histogram.keys) - 1)
+        if len(keys) and not np.array_equal(self.histogram.keys[pos], keys):
+            raise ValueError("点不在密度直方图中 (两次读取的数据不一致)")
+        return self.cell_tiles[pos]
+
+    def tile_size(self, level):
+        return self.root_x / (1 << level), self.root_y / (1 << level)
+
+    def tile_origin(self, leaf):
+        level, ix, iy = leaf
+        size_x, size_y = self.tile_size(level)
+        return ix * size_x, iy * size_y
+
+    def oversized(self):
+        """到达最大深度仍超过上限的分块数"""
+        return sum(1 for points in self.leaf_points if points > self.max_points)
+
+    def summary(self):
+        """各级分块数 {级别: 块数}"""
+        levels = {}
+        for level, _, _ in self.leaves:
+            levels[level] = levels.get(level, 0) + 1
+        return dict(sorted(levels.items()))
+
+    def metadata_comments(self):
+        """写入元数据 YAML 的分块说明 (注释, 不影响按 x_resolution 读取的加载器)"""
+        return [
+            "tiling: quadtree",
+            f"root_size: [{self.root_x}, {self.root_y}]",
+            f"max_depth: {self.max_depth}",
+            f"max_tile_points: {self.max_points}",
+            "tile entries: [min_x, min_y, size_x, size_y]",
+        ]
@@ -0,0 +1,172 @@
+import json
+import os
+
+import pytest
+
+import batch_manifest
+from batch_manifest import BatchManifest
+from pointcloud_jobs import build_batch_tasks
+
+
+def convert(task, content=None):
+    """模拟转换: 输出内容由输入内容决定"""
+    with open(task['input_file'], 'rb') as f:
+        data = f.read()
+    with open(task['output_file'], 'wb') as f:
+        f.write(content if content is not None else data[::-1])
+
+
+@pytest.fixture
+def batch(tmp_path):
+    inputs = []
+    for name in ('a', 'b', 'c'):
+        path = tmp_path / 'in' / f'{name}.las'
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(name.encode() * 1000)
+        inputs.append(str(path))
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    tasks = build_batch_tasks(inputs, str(output_dir))
+
+    manifest = BatchManifest(str(output_dir))
+    for task in tasks:
+        convert(task)
+        manifest.record(task)
+    return str(output_dir), tasks
+
+
+def pending(output_dir, tasks):
+    """重新读取清单 (模拟再次运行), 返回待处理任务的输入文件名"""
+    tasks, _ = BatchManifest(output_dir).pending_tasks(tasks)
+    return [os.path.basename(task['input_file']) for task in tasks]
+
+
+def test_skip_when_unchanged(batch):
+    output_dir, tasks = batch
+    assert pending(output_dir, tasks) == []
+    assert BatchManifest(output_dir).pending_tasks(tasks)[1] == 3
+
+
+def test_redo_when_input_size_changed(batch):
+    output_dir, tasks = batch
+    with open(tasks[0]['input_file'], 'ab') as f:
+        f.write(b'more')
+    assert pending(output_dir, tasks) == ['a.las']
+
+
+def test_redo_when_input_content_changed_with_mtime(batch):
+    output_dir, tasks = batch
+    path = tasks[1]['input_file']
+    with open(path, 'r+b') as f:
+        f.write(b'x')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+    assert pending(output_dir, tasks) == ['b.las']
+
+
+def test_mtime_only_change_is_up_to_date(batch):
+    output_dir, tasks = batch
+    path = tasks[2]['input_file']
+    stat = os.stat(path)
+    new_mtime = stat.st_mtime_ns + 5 * 10 ** 9
+    os.utime(path, ns=(stat.st_atime_ns, new_mtime))
+    assert pending(output_dir, tasks) == []
+    # 新的修改时间写回清单, 下次不再计算哈希
+    entry = BatchManifest(output_dir).entries['c.pcd']
+    assert entry['input_mtime_ns'] == new_mtime
+
+
+def test_redo_when_params_changed(batch):
+    output_dir, tasks = batch
+    changed = [dict(task) for task in tasks]
+    changed[0]['encoding'] = 'binary_compressed'
+    changed[2]['offsets'] = (1.0, 2.0, 3.0)
+    assert pending(output_dir, changed) == ['a.las', 'c.las']
+
+    intensity = build_batch_tasks([task['input_file'] for task in tasks], output_dir, 'intensity')
+    assert pending(output_dir, intensity) == ['a.las', 'b.las', 'c.las']
+
+
+def test_redo_when_output_changed(batch):
+    output_dir, tasks = batch
+    # 大小不变、内容变化
+    convert(tasks[0], b'z' * 3000)
+    # 大小变化
+    with open(tasks[1]['output_file'], 'ab') as f:
+        f.write(b'!')
+    assert pending(output_dir, tasks) == ['a.las', 'b.las']
+
+
+def test_redo_when_output_missing(batch):
+    output_dir, tasks = batch
+    os.remove(tasks[2]['output_file'])
+    assert pending(output_dir, tasks) == ['c.las']
+
+
+def test_redo_when_input_missing(batch):
+    output_dir, tasks = batch
+    os.remove(tasks[0]['input_file'])
+    assert pending(output_dir, tasks) == ['a.las']
+
+
+def test_failed_task_is_forgotten(batch):
+    output_dir, tasks = batch
+    manifest = BatchManifest(output_dir)
+    manifest.forget(tasks[1])
+    assert pending(output_dir, tasks) == ['b.las']
+
+
+def test_resume_after_partial_run(batch):
+    output_dir, tasks = batch
+    # 中途崩溃: 只记录了第一个任务, 第二个输出写了一半, 清单临时文件残留
+    manifest = BatchManifest(output_dir)
+    manifest.forget(tasks[1])
+    manifest.forget(tasks[2])
+    convert(tasks[1], b'partial')
+    with open(manifest.path + '.tmp', 'w') as f:
+        f.write('{"version": 1, "entr')
+    assert pending(output_dir, tasks) == ['b.las', 'c.las']
+
+    # 继续处理后全部为最新
+    manifest = BatchManifest(output_dir)
+    for task in manifest.pending_tasks(tasks)[0]:
+        convert(task)
+        manifest.record(task)
+    assert pending(output_dir, tasks) == []
+
+
+def test_truncated_manifest_redoes_everything(batch, capsys):
+    output_dir, tasks = batch
+    path = os.path.join(output_dir, batch_manifest.MANIFEST_FILE)
+    with open(path, 'r') as f:
+        data = f.read()
+    with open(path, 'w') as f:
+        f.write(data[:len(data) // 2])
+    assert pending(output_dir, tasks) == ['a.las', 'b.las', 'c.las']
+    assert '批量清单读取失败' in capsys.readouterr().out
+
+
+def test_other_manifest_version_is_ignored(batch):
+    output_dir, tasks = batch
+    path = os.path.join(output_dir, batch_manifest.MANIFEST_FILE)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    data['version'] = batch_manifest.MANIFEST_VERSION + 1
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    assert len(pending(output_dir, tasks)) == 3
+
+
+def test_file_digest_samples_large_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_manifest, 'FULL_HASH_LIMIT', 1024)
+    monkeypatch.setattr(batch_manifest, 'EDGE_BYTES', 128)
+    monkeypatch.setattr(batch_manifest, 'SAMPLE_BYTES', 16)
+    path = tmp_path / 'big.bin'
+    data = bytearray(os.urandom(8192))
+    path.write_bytes(data)
+    digest = batch_manifest.file_digest(str(path))
+
+    # 尾部变化能被检测到
+    data[-1] ^= 0xFF
+    path.write_bytes(data)
+    assert batch_manifest.file_digest(str(path)) != digest
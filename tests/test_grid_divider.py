@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pytest
+
+import grid_divider
+import job_memory
+import pcd_io
+import pointcloud_cli
+import pointcloud_jobs
+
+
+def make_points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    points = np.zeros(count, dtype=pcd_io.point_dtype('rgb'))
+    points['x'] = rng.uniform(-50, 50, count)
+    points['y'] = rng.uniform(-30, 30, count)
+    points['z'] = rng.uniform(0, 5, count)
+    points['rgb'] = rng.integers(0, 1 << 24, count, dtype=np.uint32)
+    return points
+
+
+def read_tiles(output_dir, names):
+    tiles = {}
+    for name in names:
+        chunks = list(pcd_io.iter_point_chunks(os.path.join(output_dir, name), 'rgb'))
+        points = np.concatenate(chunks) if chunks else np.empty(0, dtype=pcd_io.point_dtype('rgb'))
+        tiles[name] = np.sort(points, order=('x', 'y', 'z'))
+    return tiles
+
+
+def bin_points(tmp_path, name, points, memory_limit, chunk=1000):
+    binner = grid_divider.TileBinner('rgb', 20, 20, str(tmp_path / name / 'work'), memory_limit)
+    for begin in range(0, len(points), chunk):
+        binner.add(points[begin:begin + chunk])
+    return binner
+
+
+def test_spill_writes_one_file_per_generation(tmp_path):
+    points = make_points(10000)
+    chunk_bytes = 1000 * points.dtype.itemsize
+    binner = bin_points(tmp_path, 'a', points, memory_limit=chunk_bytes * 2)
+
+    # 每 3 块落盘一次, 每次只写一个溢出文件 (与网格数无关)
+    assert len(binner.spill_files) == 3
+    assert sorted(os.listdir(binner.work_dir)) == ['spill_0.data', 'spill_1.data', 'spill_2.data']
+    assert len(binner.counts) > len(binner.spill_files)
+    for key, count in binner.counts.items():
+        spilled = sum(segment[2] for segment in binner.segments.get(key, []))
+        buffered = sum(len(block) for block in binner.buffers.get(key, []))
+        assert spilled + buffered == count
+
+    tile = binner.tile_points(next(iter(binner.counts)))
+    assert len(tile) == binner.counts[next(iter(binner.counts))]
+    binner.cleanup()
+
+
+@pytest.mark.parametrize('leaf_size, workers', [(0.0, 1), (0.5, 1), (0.5, 2)])
+def test_spilled_tiles_match_in_memory_tiles(tmp_path, leaf_size, workers):
+    points = make_points(20000, seed=1)
+    results = []
+    for name, limit in (('memory', grid_divider.DEFAULT_MEMORY_LIMIT), ('spill', 50000)):
+        output_dir = tmp_path / name
+        binner = bin_points(tmp_path, name, points, limit, chunk=3000)
+        assert bool(binner.spill_files) == (name == 'spill')
+        tiles = binner.write_tiles(str(output_dir), 'map', leaf_size, workers=workers)
+        # 写出后溢出文件被删除
+        assert binner.spill_files == [] and not any(
+            path.endswith('.data') for path in os.listdir(binner.work_dir))
+        binner.cleanup()
+        results.append(read_tiles(str(output_dir), tiles))
+
+    in_memory, spilled = results
+    assert sorted(in_memory) == sorted(spilled)
+    for name in in_memory:
+        assert np.array_equal(in_memory[name], spilled[name])
+    if leaf_size == 0:
+        assert sum(len(tile) for tile in spilled.values()) == len(points)
+
+
+def test_write_merged_after_spill(tmp_path):
+    points = make_points(5000, seed=2)
+    binner = bin_points(tmp_path, 'a', points, memory_limit=20000)
+    assert binner.spill_files
+    output = str(tmp_path / 'merged.pcd')
+    assert binner.write_merged(output) == len(points)
+    merged = np.concatenate(list(pcd_io.iter_point_chunks(output, 'rgb')))
+    assert np.array_equal(np.sort(merged, order=('x', 'y', 'z')), np.sort(points, order=('x', 'y', 'z')))
+    binner.cleanup()
+
+
+def test_memory_limit_from_job_params(tmp_path, monkeypatch):
+    assert grid_divider.memory_limit_bytes(None) == grid_divider.DEFAULT_MEMORY_LIMIT
+    assert grid_divider.memory_limit_bytes(256) == 256 * 1024 * 1024
+
+    input_file = str(tmp_path / 'a.pcd')
+    with pcd_io.PCDWriter(input_file, 'rgb', 1) as writer:
+        writer.write(make_points(1))
+    params = pointcloud_cli.prepare_params('divide', {'input_files': [input_file],
+                                                      'output_dir': str(tmp_path / 'out'),
+                                                      'memory_limit_mb': 100})
+    assert params['memory_limit_mb'] == 100
+    args = pointcloud_cli.build_parser().parse_args(['pipeline', 'a.las', '-o', 'out', '--memory-limit', '512'])
+    assert args.memory_limit_mb == 512
+
+    # 内存估算按任务的分桶上限封顶
+    assert job_memory.binning_limit(params) == 100 * 1024 * 1024
+    assert job_memory.default_binning_limit_mb(None) == 1024
+    assert job_memory.default_binning_limit_mb(2048) == 512
+
+    # 任务把上限传给分割引擎
+    calls = []
+
+    def divide_pcd_files(*args, **kwargs):
+        calls.append(kwargs)
+        return []
+
+    monkeypatch.setattr(grid_divider, 'divide_pcd_files', divide_pcd_files)
+    job = pointcloud_jobs.ConversionJob('divide', params)
+    job.run()
+    assert calls[0]['memory_limit'] == 100 * 1024 * 1024
@@ -0,0 +1,26 @@
+import job_metrics
+from job_metrics import JobMetrics
+
+
+def test_overlapping_jobs_do_not_reset_each_other(monkeypatch):
+    resets = []
+    monkeypatch.setattr(job_metrics, '_reset_vm_hwm', lambda: resets.append(1) or True)
+
+    first = JobMetrics('las2pcd')
+    second = JobMetrics('enhance')
+    with first.stage('las2pcd'):
+        # 另一个任务的阶段开始时不重置峰值 (否则清除第一个任务的峰值)
+        with second.stage('enhance'):
+            pass
+    assert len(resets) == 1
+    assert first.stages[0]['peak_rss_scope'] == 'process'
+    assert second.stages[0]['peak_rss_scope'] == 'process'
+    assert '_overlapped' not in first.stages[0]
+
+    # 单独运行时按阶段统计
+    with first.stage('divide'):
+        with first.stage('write'):
+            pass
+    assert len(resets) == 3
+    assert [stage['peak_rss_scope'] for stage in first.stages[1:]] == ['stage', 'stage']
+    assert job_metrics._running_stages == {}
@@ -0,0 +1,85 @@
+import job_scheduler
+from job_scheduler import JobScheduler
+
+
+class Handle:
+    def cancel(self):
+        pass
+
+
+def make_scheduler(**limits):
+    launched = []
+
+    def launch(job):
+        launched.append(job)
+        return Handle()
+
+    return JobScheduler(launch, **limits), launched
+
+
+def test_release_uses_acquired_when_limits_lowered():
+    scheduler, launched = make_scheduler(cpu_slots=4, disk_slots=2)
+    first = scheduler.submit('divide', {'input_files': [], 'workers': 4})
+    assert first.state == job_scheduler.RUNNING
+    assert scheduler.used['cpu'] == 4
+
+    # 运行期间降低 CPU 槽位: 释放量仍为启动时占用的 4
+    scheduler.set_limits(cpu_slots=2)
+    scheduler.job_finished(first, True, 'ok')
+    assert scheduler.used == {'cpu': 0, 'disk': 0, 'memory': 0}
+
+
+def test_release_uses_acquired_when_limits_raised():
+    scheduler, launched = make_scheduler(cpu_slots=2, disk_slots=2)
+    first = scheduler.submit('divide', {'input_files': [], 'workers': 4})
+    assert scheduler.used['cpu'] == 2
+
+    # 运行期间放宽 CPU 槽位: 不能多释放 (否则 used 变为负数, 超额启动)
+    scheduler.set_limits(cpu_slots=8)
+    scheduler.job_finished(first, True, 'ok')
+    assert scheduler.used['cpu'] == 0
+
+    jobs = [scheduler.submit('divide', {'input_files': [], 'workers': 4}) for _ in range(3)]
+    assert [job.state for job in jobs] == [job_scheduler.RUNNING, job_scheduler.RUNNING,
+                                           job_scheduler.QUEUED]
+    assert scheduler.used['cpu'] == 8
+
+
+def test_memory_budget_change_mid_run():
+    class Model:
+        def estimate(self, task_type, params):
+            return params['memory']
+
+    scheduler, launched = make_scheduler(cpu_slots=8, disk_slots=2, memory_budget=1000)
+    scheduler.memory_model = Model()
+    first = scheduler.submit('enhance', {'input_file': 'a.pcd', 'memory': 1500})
+    assert scheduler.used['memory'] == 1000
+
+    scheduler.set_limits(memory_budget=0)
+    scheduler.job_finished(first, True, 'ok')
+    assert scheduler.used['memory'] == 0
+
+    scheduler.set_limits(memory_budget=600)
+    second = scheduler.submit('enhance', {'input_file': 'a.pcd', 'memory': 500})
+    third = scheduler.submit('enhance', {'input_file': 'a.pcd', 'memory': 500})
+    assert second.state == job_scheduler.RUNNING
+    assert third.state == job_scheduler.QUEUED
+    scheduler.job_finished(second, True, 'ok')
+    assert third.state == job_scheduler.RUNNING
+    assert scheduler.used['memory'] == 500
+
+
+def test_one_per_type_skips_without_blocking_other_types():
+    scheduler, launched = make_scheduler(cpu_slots=8, disk_slots=2, one_per_type=True)
+    first = scheduler.submit('enhance', {'input_file': 'a.pcd'})
+    second = scheduler.submit('enhance', {'input_file': 'b.pcd'})
+    other = scheduler.submit('las2pcd', {'input_file': 'a.las', 'workers': 2})
+    assert first.state == job_scheduler.RUNNING
+    assert second.state == job_scheduler.QUEUED
+    assert scheduler.waiting_for(second) == ['task']
+    # 同类任务在运行的任务不阻塞其他类型的任务
+    assert other.state == job_scheduler.RUNNING
+
+    scheduler.job_finished(first, True, 'ok')
+    assert second.state == job_scheduler.RUNNING
+    assert scheduler.used['cpu'] == 3
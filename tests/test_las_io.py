@@ -0,0 +1,149 @@
+import struct
+
+import numpy as np
+import pytest
+
+import las_io
+import pcd_io
+import pointcloud_bench
+from pointcloud_bench import write_synthetic_las, las_header_bytes
+
+
+def read_pcd(path, point_type):
+    return np.concatenate(list(pcd_io.iter_point_chunks(path, point_type)))
+
+
+def las_xyz(path):
+    """LAS 点的 float64 真实坐标"""
+    header, points = las_io.open_las_points(path)
+    return np.stack([points[axis].astype(np.float64) * header['scale'][i] + header['offset'][i]
+                     for i, axis in enumerate(('X', 'Y', 'Z'))], axis=1)
+
+
+def test_read_las_12_header(tmp_path):
+    path = str(tmp_path / 'a.las')
+    write_synthetic_las(path, 1000, point_format=3)
+    header = las_io.read_las_header(path)
+    assert (header['version_major'], header['version_minor']) == (1, 2)
+    assert header['header_size'] == header['point_offset'] == 227
+    assert header['point_format'] == 3
+    assert header['record_length'] == las_io.POINT_FORMATS[3][0]
+    assert header['point_count'] == 1000
+    assert header['scale'] == pointcloud_bench.SYNTHETIC_SCALE
+    assert header['offset'] == pointcloud_bench.SYNTHETIC_OFFSET
+    assert header['software_id'] == 'pointcloud_bench'
+
+    # 文件头的范围与点坐标一致
+    xyz = las_xyz(path)
+    assert np.allclose(header['min'], xyz.min(axis=0))
+    assert np.allclose(header['max'], xyz.max(axis=0))
+
+    metadata = las_io.read_las_metadata(path)
+    assert metadata['version'] == '1.2'
+    assert metadata['point_count'] == 1000
+
+
+def test_read_las_14_header_uses_64_bit_count(tmp_path):
+    path = str(tmp_path / 'a.las')
+    write_synthetic_las(path, 500, point_format=7)
+    header = las_io.read_las_header(path)
+    assert (header['version_major'], header['version_minor']) == (1, 4)
+    # 格式 6 以上旧的 32 位点数为 0, 点数来自偏移 247 的 64 位字段
+    with open(path, 'rb') as f:
+        assert struct.unpack_from('<I', f.read(111), 107)[0] == 0
+    assert header['point_count'] == 500
+
+    # 超过 32 位的点数只能由 64 位字段表示
+    raw = las_header_bytes(6, 30, (1 << 32) + 5, (0, 0, 0), (1, 1, 1))
+    big = tmp_path / 'big.las'
+    big.write_bytes(raw)
+    assert las_io.read_las_header(str(big))['point_count'] == (1 << 32) + 5
+
+
+def test_read_las_header_rejects_other_files(tmp_path):
+    path = tmp_path / 'a.las'
+    path.write_bytes(b'PCD' + bytes(400))
+    with pytest.raises(ValueError):
+        las_io.read_las_header(str(path))
+
+
+@pytest.mark.parametrize('point_format', sorted(las_io.POINT_FORMATS))
+def test_point_formats(tmp_path, point_format):
+    path = str(tmp_path / 'a.las')
+    write_synthetic_las(path, 300, point_format=point_format, seed=point_format)
+    header, points = las_io.open_las_points(path)
+    assert len(points) == 300
+    assert points.dtype.itemsize == las_io.POINT_FORMATS[point_format][0]
+    assert ('red' in points.dtype.names) == (las_io.POINT_FORMATS[point_format][1] is not None)
+
+    # 字段偏移正确时, 整数坐标与文件头范围一致
+    xyz = las_xyz(path)
+    assert np.allclose(header['min'], xyz.min(axis=0))
+    assert np.allclose(header['max'], xyz.max(axis=0))
+
+    for conversion_type in ('rgb', 'intensity'):
+        output = str(tmp_path / f'{conversion_type}.pcd')
+        assert las_io.convert_las_to_pcd(path, output, conversion_type) == 300
+        converted = read_pcd(output, conversion_type)
+        if conversion_type == 'intensity':
+            assert np.array_equal(converted['intensity'], points['intensity'])
+        elif 'red' not in points.dtype.names:
+            assert not converted['rgb'].any()
+
+
+def test_point_dtype_rejects_short_records():
+    with pytest.raises(las_io.UnsupportedLASError):
+        las_io.point_dtype(3, 20)
+    with pytest.raises(las_io.UnsupportedLASError):
+        las_io.point_dtype(4, 57)
+
+
+def test_rgb_shift_detects_8_bit_colour(tmp_path):
+    path = str(tmp_path / 'a.las')
+    write_synthetic_las(path, 1000, point_format=2)
+    header, points = las_io.open_las_points(path)
+    assert las_io.rgb_shift(points) == 8
+    red16 = np.array(points['red'])
+
+    # 颜色本身为 8 位时不缩放
+    header = las_io.read_las_header(path)
+    records = np.memmap(path, dtype=las_io.point_dtype(2, header['record_length']), mode='r+',
+                        offset=header['point_offset'], shape=(1000,))
+    for name in ('red', 'green', 'blue'):
+        records[name] >>= 8
+    records.flush()
+    del records
+
+    _, points = las_io.open_las_points(path)
+    assert las_io.rgb_shift(points) == 0
+    assert las_io.rgb_shift(points[:0]) == 0
+
+    output = str(tmp_path / 'a.pcd')
+    las_io.convert_las_to_pcd(path, output, 'rgb')
+    rgb = read_pcd(output, 'rgb')['rgb']
+    assert np.array_equal((rgb >> 16) & 0xFF, red16 >> 8)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_float64_origin_round_trip(tmp_path, workers):
+    path = str(tmp_path / 'a.las')
+    write_synthetic_las(path, 20000, point_format=3)
+    origin = (500123.456, 4000456.789, 1.5)
+    output = str(tmp_path / 'a.pcd')
+    assert las_io.convert_las_to_pcd(path, output, 'rgb', origin=origin,
+                                     chunk_points=3000, workers=workers) == 20000
+
+    # 原点在 float64 下减去, PCD 中的 float32 坐标加回原点后误差在 1 mm 以内
+    converted = read_pcd(output, 'rgb')
+    xyz = las_xyz(path)
+    for axis, name in enumerate(('x', 'y', 'z')):
+        restored = converted[name].astype(np.float64) + origin[axis]
+        assert np.abs(restored - xyz[:, axis]).max() < 1e-3
+
+
+def test_default_origin(tmp_path):
+    path = str(tmp_path / 'a.las')
+    write_synthetic_las(path, 10, point_format=1)
+    header, points = las_io.open_las_points(path)
+    assert las_io.default_origin(header, points, 'rgb') == pointcloud_bench.SYNTHETIC_OFFSET
+    assert np.allclose(las_io.default_origin(header, points, 'intensity'), las_xyz(path)[0])
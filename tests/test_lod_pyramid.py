@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import grid_divider
+import lod_pyramid
+import pcd_io
+from tile_index import TileIndex
+
+
+def test_parent_groups_with_negative_indices():
+    entries = []
+    for ix in range(-5, 5):
+        for iy in (-3, -1, 0, 2):
+            entries.append((f'f_{ix}_{iy}.pcd', (ix, iy), 0, 10, 1, None))
+    # 第 1 级 (边长减半) 的四叉树网格与一个空网格
+    entries.append(('q_-7_5.pcd', (-7, 5), 1, 3, 1, None))
+    entries.append(('empty.pcd', (8, 8), 0, 0, 1, None))
+    index = TileIndex.build(entries, 10.0, 10.0)
+
+    groups = lod_pyramid.parent_groups(index)
+    expected = {}
+    for idx in range(len(index)):
+        entry = index.entry(idx)
+        if entry['points'] == 0:
+            continue
+        # 向下取整: -1 >> 1 == -1, 不是 0
+        scale = 2 << entry['level']
+        key = (entry['key'][0] // scale, entry['key'][1] // scale)
+        expected.setdefault(key, []).append(idx)
+    assert groups == expected
+    assert sorted(index.files(groups[(-1, -1)])) == ['f_-1_-1.pcd', 'f_-2_-1.pcd']
+    # 四叉树网格与同一上级网格中的固定网格合并
+    assert sorted(index.files(groups[(-2, 1)])) == ['f_-3_2.pcd', 'f_-4_2.pcd', 'q_-7_5.pcd']
+    assert all(index.name(idx) != 'empty.pcd' for members in groups.values() for idx in members)
+
+
+def make_manifest():
+    return {'levels': [
+        {'level': 0, 'max_error': 0.0, 'points': 1000},
+        {'level': 1, 'max_error': 0.35, 'points': 400},
+        {'level': 2, 'max_error': 0.69, 'points': 120},
+        {'level': 3, 'max_error': 1.39, 'points': 30},
+    ]}
+
+
+@pytest.mark.parametrize('budget, level', [(0.0, 0), (0.3, 0), (0.35, 1), (1.0, 2), (100.0, 3)])
+def test_select_level_picks_coarsest_within_budget(budget, level):
+    assert lod_pyramid.select_level(make_manifest(), budget)['level'] == level
+
+
+def test_select_level_without_fitting_level():
+    # 第 0 级做过降采样时误差不为 0, 预算更小时返回第 0 级
+    manifest = make_manifest()
+    manifest['levels'][0]['max_error'] = 0.17
+    assert lod_pyramid.select_level(manifest, 0.1)['level'] == 0
+
+
+def test_build_pyramid(tmp_path):
+    rng = np.random.default_rng(0)
+    tiles = {}
+    for key in [(-1, -1), (-1, 0), (0, 0), (1, 0), (2, 3)]:
+        points = np.zeros(500, dtype=pcd_io.point_dtype('rgb'))
+        points['x'] = rng.uniform(key[0] * 10, key[0] * 10 + 10, 500)
+        points['y'] = rng.uniform(key[1] * 10, key[1] * 10 + 10, 500)
+        points['z'] = rng.uniform(0, 1, 500)
+        name = grid_divider.tile_file_name('a', key, 10.0, 10.0)
+        with pcd_io.PCDWriter(str(tmp_path / name), 'rgb', len(points)) as writer:
+            writer.write(points)
+        tiles[name] = (key[0] * 10.0, key[1] * 10.0)
+    grid_divider.write_grid_metadata(str(tmp_path), 'a', 10.0, 10.0, tiles)
+
+    path = lod_pyramid.build_pyramid(str(tmp_path), 'a', levels=2, leaf_size=0.5)
+    manifest = lod_pyramid.load_manifest(str(tmp_path), 'a')
+    assert path.endswith(lod_pyramid.manifest_file_name('a'))
+    levels = manifest['levels']
+    assert [entry['level'] for entry in levels] == [0, 1, 2]
+    assert levels[0]['points'] == 2500
+    # 第 1 级 (0,0) 与 (1,0) 合并; 第 2 级再合并 (0,0) 与 (2,3) 所在的块
+    assert [entry['tiles'] for entry in levels] == [5, 4, 3]
+    assert levels[0]['points'] > levels[1]['points'] > levels[2]['points']
+    assert levels[2]['max_error'] == pytest.approx(lod_pyramid.max_error(2.0), abs=1e-6)
+    assert lod_pyramid.select_level(manifest, 2.0)['level'] == 1
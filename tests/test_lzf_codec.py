@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+import lzf_codec
+
+
+@pytest.fixture(autouse=True)
+def pure_python(monkeypatch):
+    """只测试纯 Python 实现"""
+    monkeypatch.setattr(lzf_codec, 'lzf', None)
+
+
+def round_trip(data):
+    compressed = lzf_codec.compress(data)
+    assert len(compressed) <= lzf_codec.max_compressed_size(len(data))
+    assert lzf_codec.decompress(compressed, len(data)) == data
+    return compressed
+
+
+def test_empty_input():
+    assert lzf_codec.compress(b'') == b''
+    assert lzf_codec.decompress(b'', 0) == b''
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 31, 32, 33, 5000])
+def test_random_input(size):
+    round_trip(os.urandom(size))
+
+
+def test_repetitive_input():
+    for data in (bytes(100000), b'ab' * 40000, b'0123456789' * 10000):
+        assert len(round_trip(data)) < len(data) // 20
+    # 递增的浮点数只有短匹配
+    round_trip(np.arange(30000, dtype=np.float32).tobytes())
+
+
+def test_uint8_array_input():
+    data = np.frombuffer(b'xyz' * 1000, dtype=np.uint8)
+    assert lzf_codec.decompress(lzf_codec.compress(data), len(data)) == data.tobytes()
+
+
+def test_match_across_block_boundary(monkeypatch):
+    monkeypatch.setattr(lzf_codec, 'COMPRESS_BLOCK', 64)
+    rng = np.random.default_rng(0)
+    pattern = rng.integers(0, 256, 50, dtype=np.uint8).tobytes()
+    # 重复段从第一块中开始、越过块边界, 引用位置在上一块中
+    data = rng.integers(0, 256, 40, dtype=np.uint8).tobytes() + pattern * 8 + os.urandom(70)
+    compressed = round_trip(data)
+    assert len(compressed) < len(data) - 200
+
+
+def test_match_across_default_block_boundary():
+    pattern = np.random.default_rng(1).integers(0, 256, 4096, dtype=np.uint8).tobytes()
+    data = pattern * (lzf_codec.COMPRESS_BLOCK // len(pattern) + 3)
+    assert len(data) > lzf_codec.COMPRESS_BLOCK
+    assert len(round_trip(data)) < len(data) // 10
+
+
+def test_decompress_rejects_wrong_size():
+    compressed = lzf_codec.compress(b'hello world' * 10)
+    with pytest.raises(ValueError):
+        lzf_codec.decompress(compressed, 5)
+
+
+def test_decompress_rejects_corrupt_data():
+    with pytest.raises(ValueError):
+        lzf_codec.decompress(bytes([31, 1, 2]), 32)
+    with pytest.raises(ValueError):
+        lzf_codec.decompress(bytes([0, 65, 0x20, 0x10]), 4)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import lzf_codec
+import pcd_io
+
+
+def make_points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    points = np.zeros(count, dtype=pcd_io.point_dtype('rgb'))
+    for axis in ('x', 'y', 'z'):
+        points[axis] = np.round(rng.uniform(0, 50, count), 2)
+    points['rgb'] = rng.integers(0, 1 << 24, count, dtype=np.uint32)
+    return points
+
+
+def write_pcd(path, points, encoding='binary', chunk=None):
+    with pcd_io.PCDWriter(str(path), 'rgb', len(points), encoding) as writer:
+        step = chunk or max(1, len(points))
+        for begin in range(0, len(points), step):
+            writer.write(points[begin:begin + step])
+    return str(path)
+
+
+def read_pcd(path):
+    chunks = list(pcd_io.iter_point_chunks(path, 'rgb'))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=pcd_io.point_dtype('rgb'))
+
+
+def test_compressed_writer_round_trip_in_chunks(tmp_path):
+    points = make_points(5000)
+    path = write_pcd(tmp_path / 'a.pcd', points, 'binary_compressed', chunk=777)
+    assert np.array_equal(read_pcd(path), points)
+
+    # 逐块写入与整体按字段排列的结果一致
+    with open(tmp_path / 'b.data', 'wb') as f:
+        pcd_io.write_compressed(f, points)
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data[pcd_io.read_header(path)['data_offset']:] == (tmp_path / 'b.data').read_bytes()
+
+
+def test_fallback_codec_refuses_large_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(lzf_codec, 'lzf', None)
+    monkeypatch.setattr(lzf_codec, 'FALLBACK_MAX_BYTES', 1024)
+    with pytest.raises(ValueError, match='python-lzf'):
+        pcd_io.PCDWriter(str(tmp_path / 'big.pcd'), 'rgb', 1000, 'binary_compressed')
+    assert not (tmp_path / 'big.pcd').exists()
+    write_pcd(tmp_path / 'small.pcd', make_points(10), 'binary_compressed')
+
+
+def test_merge_without_inputs_raises_value_error(tmp_path):
+    with pytest.raises(ValueError, match='没有要合并的 PCD 文件'):
+        pcd_io.merge_pcd_files([], str(tmp_path / 'merged.pcd'))
+    assert not (tmp_path / 'merged.pcd').exists()
+
+
+def test_merge_concatenates_inputs(tmp_path):
+    parts = [make_points(300, seed) for seed in range(3)]
+    files = [write_pcd(tmp_path / f'{idx}.pcd', points) for idx, points in enumerate(parts)]
+    output = str(tmp_path / 'merged.pcd')
+    assert pcd_io.merge_pcd_files(files, output) == 900
+    assert np.array_equal(read_pcd(output), np.concatenate(parts))
+
+
+@pytest.mark.parametrize('encoding', ['ascii', 'binary_compressed'])
+def test_encodings_read_back_equal_to_binary(tmp_path, monkeypatch, encoding):
+    monkeypatch.setattr(lzf_codec, 'lzf', None)
+    points = make_points(3000, seed=7)
+    binary = read_pcd(write_pcd(tmp_path / 'binary.pcd', points))
+    encoded = read_pcd(write_pcd(tmp_path / f'{encoding}.pcd', points, encoding, chunk=1000))
+    assert pcd_io.read_header(str(tmp_path / f'{encoding}.pcd'))['data'] == encoding
+    assert np.array_equal(encoded, binary)
+    assert np.array_equal(binary, points)
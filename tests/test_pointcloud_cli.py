@@ -0,0 +1,103 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import pcd_io
+import pointcloud_cli
+from pointcloud_bench import write_synthetic_las
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """内存模型和元数据缓存写入临时目录"""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+
+
+def run_cli(argv, capsys):
+    code = pointcloud_cli.main(argv)
+    out = capsys.readouterr().out
+    return code, [json.loads(line) for line in out.splitlines()]
+
+
+def test_las2pcd_creates_output_parent_and_emits_json_lines(tmp_path, capsys):
+    las_file = str(tmp_path / 'a.las')
+    write_synthetic_las(las_file, 2000, point_format=3)
+    output = tmp_path / 'nested' / 'dir' / 'a.pcd'
+
+    code, events = run_cli(['las2pcd', las_file, str(output), '--workers', '1'], capsys)
+    assert code == 0
+    kinds = [event['event'] for event in events]
+    assert kinds[0] == 'start' and kinds[-1] == 'finished'
+    assert 'progress' in kinds
+    assert all('time' in event for event in events)
+    assert events[0]['task'] == 'las2pcd'
+    assert events[0]['params']['output_file'] == str(output)
+    assert events[-1]['success'] is True
+
+    assert output.exists()
+    assert pcd_io.read_header(str(output))['points'] == 2000
+
+
+def test_invalid_arguments_emit_error_event(tmp_path, capsys):
+    code, events = run_cli(['las2pcd', str(tmp_path / 'a.las'), str(tmp_path / 'a.pcd'),
+                            '--encoding', 'binary', '--origin', '0', '0', '0'], capsys)
+    # 输入不存在: 任务失败但仍输出 finished 事件
+    assert code == 1
+    assert events[-1]['event'] == 'finished' and events[-1]['success'] is False
+
+    code, events = run_cli(['run', str(tmp_path / 'missing.yaml')], capsys)
+    assert code == 2
+    assert events == [{'event': 'error', 'time': events[0]['time'], 'message': events[0]['message']}]
+
+
+def test_prepare_params_checks_required():
+    with pytest.raises(ValueError, match='output_file'):
+        pointcloud_cli.prepare_params('las2pcd', {'input_file': 'a.las'})
+    with pytest.raises(ValueError):
+        pointcloud_cli.prepare_params('unknown', {})
+
+
+def test_load_job_file_resolves_relative_paths(tmp_path, monkeypatch):
+    job_dir = tmp_path / 'jobs'
+    job_dir.mkdir()
+    job_file = job_dir / 'jobs.yaml'
+    job_file.write_text(
+        "jobs:\n"
+        "  - task: las2pcd\n"
+        "    input_file: data/a.las\n"
+        "    output_file: ../out/a.pcd\n"
+        "  - task: divide\n"
+        "    input_files: [a.pcd, /abs/b.pcd]\n"
+        "    output_dir: tiles\n"
+        "    grid_size_x: 50\n")
+    # 相对路径按任务文件所在目录解析, 与当前目录无关
+    monkeypatch.chdir(tmp_path)
+    jobs = pointcloud_cli.load_job_file(os.path.join('jobs', 'jobs.yaml'))
+
+    assert [task for task, _ in jobs] == ['las2pcd', 'divide']
+    las2pcd, divide = jobs[0][1], jobs[1][1]
+    assert las2pcd['input_file'] == os.path.join(str(job_dir), 'data/a.las')
+    assert os.path.normpath(las2pcd['output_file']) == str(tmp_path / 'out' / 'a.pcd')
+    assert divide['input_files'] == [os.path.join(str(job_dir), 'a.pcd'), '/abs/b.pcd']
+    assert divide['output_dir'] == os.path.join(str(job_dir), 'tiles')
+    assert divide['grid_size_x'] == 50
+
+
+def test_load_job_file_single_job(tmp_path):
+    job_file = tmp_path / 'job.json'
+    job_file.write_text(json.dumps({'task': 'enhance', 'input_file': 'a.pcd', 'output_file': 'b.pcd'}))
+    assert pointcloud_cli.load_job_file(str(job_file)) == [
+        ('enhance', {'input_file': str(tmp_path / 'a.pcd'), 'output_file': str(tmp_path / 'b.pcd')})]
+
+
+def test_run_job_file(tmp_path, capsys):
+    write_synthetic_las(str(tmp_path / 'a.las'), 1000, point_format=2)
+    (tmp_path / 'job.yaml').write_text(
+        "task: las2pcd\ninput_file: a.las\noutput_file: out/a.pcd\nworkers: 1\nencoding: ascii\n")
+    code, events = run_cli(['run', str(tmp_path / 'job.yaml')], capsys)
+    assert code == 0
+    assert events[-1]['event'] == 'finished' and events[-1]['success'] is True
+    points = np.concatenate(list(pcd_io.iter_point_chunks(str(tmp_path / 'out' / 'a.pcd'), 'rgb')))
+    assert len(points) == 1000
@@ -0,0 +1,35 @@
+from pointcloud_jobs import ConversionJob
+
+
+def run_job(job):
+    results = []
+    job.finished.connect(lambda success, message: results.append((success, message)))
+    job.run()
+    return results
+
+
+def test_finished_emitted_without_result():
+    # 未知的任务类型不会调用 finish, 仍须报告 (失败) 结果
+    results = run_job(ConversionJob('unknown', {}))
+    assert len(results) == 1
+    assert results[0][0] is False
+
+
+def test_finished_emitted_when_reporting_fails(monkeypatch):
+    job = ConversionJob('unknown', {})
+
+    def broken_report():
+        raise OSError('disk full')
+
+    monkeypatch.setattr(job, 'report_metrics', broken_report)
+    logs = []
+    job.progress.connect(logs.append)
+    results = run_job(job)
+    assert len(results) == 1
+    assert any('disk full' in line for line in logs)
+
+
+def test_cancelled_job_reports_cancel():
+    job = ConversionJob('unknown', {})
+    job.cancel()
+    assert run_job(job) == [(False, "任务已取消")]
@@ -0,0 +1,131 @@
+import multiprocessing
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import process_runner
+from process_runner import CancelToken
+
+
+def test_tracking_unregisters_pool_workers_on_exit():
+    cancel = CancelToken()
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(abs, -value) for value in range(4)]
+        with cancel.tracking(executor):
+            assert cancel.pids
+            assert sorted(future.result() for future in futures) == [0, 1, 2, 3]
+    # 进程池已结束, 之后的取消不能再结束这些 (可能被复用的) 进程号
+    assert cancel.pids == set()
+
+
+def test_pool_tracking_without_token():
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        future = executor.submit(abs, -1)
+        with process_runner.pool_tracking(None, executor):
+            assert future.result() == 1
+
+
+# 子进程启动一个长时间运行的孙进程, 输出孙进程的进程号后等待
+SPAWN_GRANDCHILD = (
+    "import subprocess, sys, time\n"
+    "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+    "print(child.pid, flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+def alive(pid):
+    """进程是否仍在运行 (僵尸进程视为已结束)"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            return f.read().rsplit(b')', 1)[1].split()[0] != b'Z'
+    except OSError:
+        return False
+
+
+def wait_dead(pid, limit=5.0):
+    deadline = time.monotonic() + limit
+    while alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not alive(pid)
+
+
+def test_interleaved_large_output_does_not_deadlock():
+    # 两个管道交替写入大量输出, 任一管道写满都会阻塞只读另一个管道的实现
+    code = (
+        "import sys\n"
+        "line = 'x' * 1000\n"
+        "for i in range(4000):\n"
+        "    sys.stdout.write(f'out {i} {line}\\n')\n"
+        "    sys.stderr.write(f'err {i} {line}\\n')\n"
+    )
+    out_lines, err_lines = [], []
+    result = process_runner.run_process(python(code), on_stdout=out_lines.append,
+                                        on_stderr=err_lines.append, timeout=60)
+    assert result.returncode == 0
+    assert len(out_lines) == len(err_lines) == 4000
+    assert out_lines[-1].startswith('out 3999 ') and err_lines[0].startswith('err 0 ')
+
+
+def test_tail_limit():
+    code = "import sys\nfor i in range(1000): print(i)\nprint('e', file=sys.stderr, end='')\n"
+    result = process_runner.run_process(python(code), tail_lines=5)
+    assert result.stdout == '\n'.join(str(i) for i in range(995, 1000))
+    assert result.stderr == 'e'
+
+
+def test_long_line_is_split(monkeypatch):
+    monkeypatch.setattr(process_runner, 'MAX_LINE_BYTES', 1000)
+    lines = []
+    process_runner.run_process(python("print('y' * 3500)"), on_stdout=lines.append)
+    assert [len(line) for line in lines] == [1000, 1000, 1000, 500]
+
+
+def test_timeout_kills_descendants(monkeypatch):
+    monkeypatch.setattr(process_runner, 'POLL_INTERVAL', 0.05)
+    pids = []
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired) as info:
+        process_runner.run_process(python(SPAWN_GRANDCHILD), on_stdout=pids.append, timeout=1.0)
+    assert time.monotonic() - started < 10
+    assert info.value.timeout == 1.0
+    assert info.value.output == pids[0]
+    assert wait_dead(int(pids[0]))
+
+
+def test_idle_timeout(monkeypatch):
+    monkeypatch.setattr(process_runner, 'POLL_INTERVAL', 0.05)
+    with pytest.raises(subprocess.TimeoutExpired) as info:
+        process_runner.run_process(python("import time\nprint('a', flush=True)\ntime.sleep(60)"),
+                                   idle_timeout=0.5, timeout=30)
+    assert info.value.timeout == 0.5
+
+
+def test_cancel_during_run(monkeypatch):
+    monkeypatch.setattr(process_runner, 'POLL_INTERVAL', 0.05)
+    cancel = CancelToken()
+    pids = []
+
+    def on_stdout(line):
+        pids.append(line)
+        # 在其他线程中取消 (与图形界面的取消按钮相同)
+        threading.Timer(0.2, cancel.cancel).start()
+
+    started = time.monotonic()
+    with pytest.raises(process_runner.JobCancelled):
+        process_runner.run_process(python(SPAWN_GRANDCHILD), on_stdout=on_stdout, cancel=cancel)
+    assert time.monotonic() - started < 10
+    assert wait_dead(int(pids[0]))
+    assert cancel.pids == set()
+
+    # 已取消的标记不再启动新的进程
+    with pytest.raises(process_runner.JobCancelled):
+        process_runner.run_process(python("print(1)"), cancel=cancel)
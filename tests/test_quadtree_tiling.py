@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import quadtree_tiling
+from quadtree_tiling import DensityHistogram, QuadTreeTiling
+
+ROOT = 100.0
+MAX_DEPTH = 4
+MAX_POINTS = 2000
+
+
+def clustered_cloud(seed=0):
+    """稀疏背景 + 两个密集簇 (含负坐标和根网格边界附近的点)"""
+    rng = np.random.default_rng(seed)
+    background = rng.uniform(-250, 250, (5000, 2))
+    cluster = rng.normal((30, -20), 3, (20000, 2))
+    tight = rng.normal((-100.001, 50), 0.2, (8000, 2))
+    xy = np.concatenate([background, cluster, tight])
+    return xy[:, 0], xy[:, 1]
+
+
+def build(x, y, chunk=4096):
+    cell = ROOT / (1 << MAX_DEPTH)
+    hist = DensityHistogram(cell, cell)
+    for begin in range(0, len(x), chunk):
+        hist.add(x[begin:begin + chunk], y[begin:begin + chunk])
+    return QuadTreeTiling.build(hist, ROOT, ROOT, MAX_POINTS, MAX_DEPTH)
+
+
+def test_tiles_respect_max_points_unless_at_max_depth():
+    tiling = build(*clustered_cloud())
+    assert len(tiling.leaves) > 1
+    for (level, _, _), points in zip(tiling.leaves, tiling.leaf_points):
+        assert points <= MAX_POINTS or level == MAX_DEPTH
+    assert tiling.oversized() == sum(1 for points in tiling.leaf_points if points > MAX_POINTS)
+    # 稀疏区域保留根网格, 密集区域细分
+    assert 0 in tiling.summary() and max(tiling.summary()) > 0
+
+
+def test_tiles_partition_root_cells_without_overlap():
+    x, y = clustered_cloud()
+    tiling = build(x, y)
+    leaves = set(tiling.leaves)
+    assert len(leaves) == len(tiling.leaves)
+    # 任何分块的上级块都不是分块 (分块之间没有重叠)
+    for level, ix, iy in tiling.leaves:
+        for up in range(1, level + 1):
+            assert (level - up, ix >> up, iy >> up) not in leaves
+
+    # 每个点落在唯一的分块中, 且点在该分块的范围内
+    ids = tiling.tile_ids(x, y)
+    assert ids.min() >= 0
+    levels = np.array([leaf[0] for leaf in tiling.leaves])[ids]
+    origin = np.array([tiling.tile_origin(leaf) for leaf in tiling.leaves])[ids]
+    size = ROOT / (1 << levels)
+    assert np.all((x >= origin[:, 0]) & (x < origin[:, 0] + size))
+    assert np.all((y >= origin[:, 1]) & (y < origin[:, 1] + size))
+
+
+def test_total_point_count_preserved():
+    x, y = clustered_cloud(seed=1)
+    tiling = build(x, y)
+    assert tiling.histogram.total == len(x)
+    assert sum(tiling.leaf_points) == len(x)
+    counts = np.bincount(tiling.tile_ids(x, y), minlength=len(tiling.leaves))
+    assert counts.tolist() == tiling.leaf_points
+
+
+def test_streaming_compaction_matches_single_pass(monkeypatch):
+    x, y = clustered_cloud(seed=2)
+    single = build(x, y, chunk=len(x))
+    monkeypatch.setattr(quadtree_tiling, 'COMPACT_CELLS', 50)
+    streamed = build(x, y, chunk=1000)
+    assert streamed.leaves == single.leaves
+    assert streamed.leaf_points == single.leaf_points
+
+
+def test_unknown_point_raises():
+    x, y = clustered_cloud()
+    tiling = build(x, y)
+    with pytest.raises(ValueError):
+        tiling.tile_ids(np.array([10000.0]), np.array([10000.0]))
+
+
+def test_max_points_for():
+    assert quadtree_tiling.max_points_for(0, 0, 16) == quadtree_tiling.DEFAULT_MAX_TILE_POINTS
+    assert quadtree_tiling.max_points_for(1000, 1600, 16) == 100
+    assert quadtree_tiling.max_points_for(1000, 8, 16) == 1
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import grid_divider
+import pcd_io
+import tile_index
+from tile_index import TileIndex
+
+
+def random_entries(count, seed=0):
+    """固定网格与四叉树网格混合; 包围盒在网格范围内, 少数网格为空"""
+    rng = np.random.default_rng(seed)
+    entries = []
+    seen = set()
+    while len(entries) < count:
+        idx = len(entries)
+        level = int(rng.integers(0, 4))
+        size = 100.0 / (1 << level)
+        key = (int(rng.integers(-40 << level, 40 << level)), int(rng.integers(-40 << level, 40 << level)))
+        if (key, level) in seen:
+            continue
+        seen.add((key, level))
+        x, y = key[0] * size, key[1] * size
+        if idx % 17 == 0:
+            bounds = None
+        else:
+            lo = rng.uniform(0, size / 2, 2)
+            hi = rng.uniform(size / 2, size, 2)
+            bounds = (x + lo[0], y + lo[1], 0.0, x + hi[0], y + hi[1], 5.0)
+        entries.append((f'tile_{idx}.pcd', key, level, int(rng.integers(0, 1000)), 100 + idx, bounds))
+    return entries
+
+
+def brute_force(index, predicate):
+    return sorted(index.name(idx) for idx in range(len(index)) if predicate(index.records[idx]))
+
+
+def query_names(index, indices):
+    return sorted(index.files(indices))
+
+
+def test_records_sorted_by_min_x_with_max_width():
+    entries = random_entries(500)
+    index = TileIndex.build(entries, 100.0, 100.0)
+    assert np.all(np.diff(index.records['min_x']) >= 0)
+    widths = index.records['max_x'] - index.records['min_x']
+    assert index.max_width == pytest.approx(widths.max())
+    # 空网格按网格范围记录
+    _, key, level, _, _, bounds = entries[0]
+    assert bounds is None
+    bbox = index.entry(index.lookup(key, level))['bbox']
+    assert bbox[3] - bbox[0] == pytest.approx(100.0 / (1 << level))
+
+
+def test_bbox_query_matches_brute_force():
+    index = TileIndex.build(random_entries(800, seed=1), 100.0, 100.0)
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        x0, y0 = rng.uniform(-4500, 4500, 2)
+        w, h = rng.uniform(0, 600, 2)
+        expected = brute_force(index, lambda r: r['max_x'] >= x0 and r['min_x'] <= x0 + w
+                               and r['max_y'] >= y0 and r['min_y'] <= y0 + h)
+        assert query_names(index, index.query_bbox(x0, y0, x0 + w, y0 + h)) == expected
+
+
+def test_radius_query_matches_brute_force():
+    index = TileIndex.build(random_entries(800, seed=3), 100.0, 100.0)
+    rng = np.random.default_rng(4)
+
+    def hit(r, x, y, radius):
+        dx = max(r['min_x'] - x, x - r['max_x'], 0.0)
+        dy = max(r['min_y'] - y, y - r['max_y'], 0.0)
+        return dx * dx + dy * dy <= radius * radius
+
+    for _ in range(200):
+        x, y = rng.uniform(-4500, 4500, 2)
+        radius = rng.uniform(0, 400)
+        expected = brute_force(index, lambda r: hit(r, x, y, radius))
+        assert query_names(index, index.query_radius(x, y, radius)) == expected
+
+
+def test_save_load_round_trip(tmp_path):
+    index = TileIndex.build(random_entries(300, seed=5), 100.0, 50.0)
+    path = str(tmp_path / 'a_tiles.idx')
+    index.save(path)
+    loaded = TileIndex.load(path)
+    assert np.array_equal(loaded.records, index.records)
+    assert (loaded.grid_size_x, loaded.grid_size_y) == (100.0, 50.0)
+    assert loaded.max_width == index.max_width
+    assert [loaded.entry(idx) for idx in range(len(loaded))] == [index.entry(idx) for idx in range(len(index))]
+
+
+@pytest.mark.parametrize('magic, version', [(b'XXXX', tile_index.INDEX_VERSION),
+                                            (tile_index.INDEX_MAGIC, tile_index.INDEX_VERSION - 1)])
+def test_load_rejects_wrong_magic_or_version(tmp_path, magic, version):
+    path = tmp_path / 'a_tiles.idx'
+    path.write_bytes(tile_index.HEADER.pack(magic, version, 0, 1.0, 1.0, 0.0))
+    with pytest.raises(ValueError):
+        TileIndex.load(str(path))
+
+
+def test_load_rejects_truncated_file(tmp_path):
+    path = str(tmp_path / 'a_tiles.idx')
+    TileIndex.build(random_entries(10), 100.0, 100.0).save(path)
+    with open(path, 'r+b') as f:
+        f.truncate(tile_index.HEADER.size + tile_index.RECORD_DTYPE.itemsize * 5)
+    with pytest.raises(ValueError):
+        TileIndex.load(path)
+
+
+def write_tile(path, xyz):
+    points = np.zeros(len(xyz), dtype=pcd_io.point_dtype('rgb'))
+    for axis, name in enumerate(('x', 'y', 'z')):
+        points[name] = [p[axis] for p in xyz]
+    with pcd_io.PCDWriter(str(path), 'rgb', len(points)) as writer:
+        writer.write(points)
+
+
+def test_build_from_metadata(tmp_path):
+    # 两个固定网格 (边长 20) 和一个第 1 级的四叉树网格 (边长 10)
+    tiles = {
+        'a_0_0.pcd': ((0.0, 0.0), [(1, 2, 3), (4, 5, 6)], (20.0, 20.0)),
+        'a_20_0.pcd': ((20.0, 0.0), [(25, 1, 0)], (20.0, 20.0)),
+        'a_40_10.pcd': ((40.0, 10.0), [(41, 12, 1), (49, 19, 2), (45, 15, 0)], (10.0, 10.0)),
+    }
+    for name, (_, xyz, _) in tiles.items():
+        write_tile(tmp_path / name, xyz)
+    grid_divider.write_grid_metadata(str(tmp_path), 'a', 20.0, 20.0,
+                                     {name: tiles[name][0] for name in tiles},
+                                     {name: tiles[name][2] for name in tiles})
+
+    index = tile_index.load_index(str(tmp_path), 'a')
+    assert len(index) == 3
+    assert index.entry(index.lookup((0, 0)))['bbox'] == [1, 2, 3, 4, 5, 6]
+    assert index.entry(index.lookup((1, 0)))['points'] == 1
+    quad = index.entry(index.lookup((4, 1), level=1))
+    assert quad['file'] == 'a_40_10.pcd'
+    assert quad['bbox'] == [41, 12, 0, 49, 19, 2]
+    assert quad['bytes'] == (tmp_path / 'a_40_10.pcd').stat().st_size
+    assert query_names(index, index.query_radius(30, 5, 12)) == ['a_20_0.pcd']
+    assert query_names(index, index.query_radius(30, 5, 14)) == ['a_20_0.pcd', 'a_40_10.pcd']
+
+    # 删除的网格文件在重建时跳过
+    (tmp_path / 'a_20_0.pcd').unlink()
+    assert len(tile_index.load_index(str(tmp_path), 'a', rebuild=True)) == 2
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import pcd_io
+import voxel_filter
+
+
+def make_records(point_type, rows):
+    records = np.zeros(len(rows), dtype=pcd_io.point_dtype(point_type))
+    for idx, row in enumerate(rows):
+        records[idx] = row
+    return records
+
+
+def pack_rgb(r, g, b):
+    return (r << 16) | (g << 8) | b
+
+
+def test_centroid_averages_xyz_and_rgb_channels():
+    records = make_records('rgb', [
+        (0.1, 0.2, 0.3, pack_rgb(10, 200, 0)),
+        (5.5, 5.5, 5.5, pack_rgb(1, 2, 3)),
+        (0.5, 0.6, 0.7, pack_rgb(20, 100, 255)),
+        (0.9, 0.1, 0.2, pack_rgb(31, 0, 0)),
+    ])
+    out = voxel_filter.voxel_downsample(records, 1.0, 'centroid')
+    assert len(out) == 2
+    voxel = out[np.argmin(out['x'])]
+    assert voxel['x'] == pytest.approx(0.5, abs=1e-6)
+    assert voxel['y'] == pytest.approx(0.3, abs=1e-6)
+    assert voxel['z'] == pytest.approx(0.4, abs=1e-6)
+    # 颜色按通道平均后四舍五入, 不对打包后的整数取平均
+    assert voxel['rgb'] == pack_rgb(20, 100, 85)
+    single = out[np.argmax(out['x'])]
+    assert tuple(single) == pytest.approx((5.5, 5.5, 5.5, pack_rgb(1, 2, 3)))
+
+
+def test_centroid_averages_intensity():
+    records = make_records('intensity', [(0.1, 0.1, 0.1, 10), (0.2, 0.2, 0.2, 31)])
+    out = voxel_filter.voxel_downsample(records, 0.5, 'centroid')
+    assert len(out) == 1
+    assert out['intensity'][0] == pytest.approx(20.5)
+
+
+def test_negative_coordinates_use_floor():
+    records = make_records('intensity', [(-0.1, 0, 0, 1), (0.1, 0, 0, 2), (-0.9, 0, 0, 3)])
+    out = voxel_filter.voxel_downsample(records, 1.0, 'first')
+    assert list(out['intensity']) == [1, 2]
+
+
+def test_first_keeps_input_order():
+    rng = np.random.default_rng(0)
+    records = np.zeros(2000, dtype=pcd_io.point_dtype('intensity'))
+    for axis in ('x', 'y', 'z'):
+        records[axis] = rng.uniform(-5, 5, len(records))
+    records['intensity'] = np.arange(len(records))
+
+    out = voxel_filter.voxel_downsample(records, 2.0, 'first')
+    # 每个体素保留输入中最早的点, 输出仍按输入顺序排列
+    keys = voxel_filter.pack_voxel_keys(records, 2.0)
+    _, first = np.unique(keys, return_index=True)
+    assert list(out['intensity']) == sorted(first)
+
+
+@pytest.mark.parametrize('leaf_size', [0, -1.0])
+def test_non_positive_leaf_size_passes_through(leaf_size):
+    records = make_records('rgb', [(0.1, 0.1, 0.1, 1), (0.2, 0.2, 0.2, 2)])
+    assert voxel_filter.voxel_downsample(records, leaf_size) is records
+
+
+def test_unknown_mode():
+    records = make_records('rgb', [(0, 0, 0, 0)])
+    with pytest.raises(ValueError):
+        voxel_filter.voxel_downsample(records, 1.0, 'median')
+
+
+def test_key_overflow_raises():
+    records = make_records('rgb', [(0, 0, 0, 0), (1e6, 1e6, 1e6, 0)])
+    with pytest.raises(ValueError, match='64'):
+        voxel_filter.voxel_downsample(records, 1e-6)
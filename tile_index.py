@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+网格空间索引
+- 分割 / 一键流程写出网格时同时写出 {prefix}_tiles.idx: 网格键 (含四叉树级别) → 文件名、包围盒、点数、文件字节数
+- 二进制格式: 文件头 + 定长记录数组 (按包围盒 min_x 排序) + 文件名表, 读取时不解析文本
+- 按矩形 / 圆形范围查询覆盖的网格: 二分查找 min_x 后只比较候选区间, 10 万个网格的查询在微秒级
+- 没有索引的目录 (外部 pointcloud_divider 输出) 可由元数据 YAML 和网格文件重建
+"""
+
+import os
+import math
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import yaml
+
+import pcd_io
+
+INDEX_MAGIC = b'PCTI'
+INDEX_VERSION = 2
+
+# 文件头: 标识, 版本, 网格数, 网格大小 x / y (自适应分块时为根网格), 最大网格宽度 (x 方向, 用于确定二分查找的下界)
+HEADER = struct.Struct('<4sIQddd')
+
+RECORD_DTYPE = np.dtype([
+    ('ix', '<i4'), ('iy', '<i4'), ('level', '<i4'),
+    ('points', '<u8'), ('bytes', '<u8'),
+    ('min_x', '<f8'), ('min_y', '<f8'), ('min_z', '<f8'),
+    ('max_x', '<f8'), ('max_y', '<f8'), ('max_z', '<f8'),
+    ('name_offset', '<u4'), ('name_length', '<u4'),
+]) if np is not None else None
+
+
+def index_file_name(prefix):
+    return f'{prefix}_tiles.idx'
+
+
+def pcd_bounds(pcd_file):
+    """读取 PCD 计算包围盒 (min_x, min_y, min_z, max_x, max_y, max_z), 没有点时返回 None"""
+    header = pcd_io.read_header(pcd_file)
+    lower = upper = None
+    for chunk in pcd_io.iter_point_chunks(pcd_file, 'xyz', header=header):
+        if len(chunk) == 0:
+            continue
+        xyz = np.stack([chunk['x'], chunk['y'], chunk['z']])
+        chunk_lower, chunk_upper = xyz.min(axis=1), xyz.max(axis=1)
+        lower = chunk_lower if lower is None else np.minimum(lower, chunk_lower)
+        upper = chunk_upper if upper is None else np.maximum(upper, chunk_upper)
+    if lower is None:
+        return None
+    return tuple(float(v) for v in lower) + tuple(float(v) for v in upper)
+
+
+class TileIndex:
+    """网格索引
+
+    entries: [(文件名, (ix, iy), 级别, 点数, 字节数, 包围盒)]; 固定网格的级别为 0,
+    自适应分块级别 L 的边长为 网格大小 / 2^L; 包围盒为 None (空网格) 时按网格范围记录
+    """
+
+    def __init__(self, records, names, grid_size_x, grid_size_y):
+        self.records = records
+        self.names = names
+        self.grid_size_x = grid_size_x
+        self.grid_size_y = grid_size_y
+        widths = records['max_x'] - records['min_x']
+        self.max_width = float(widths.max()) if len(records) else 0.0
+        self._keys = None
+
+    @classmethod
+    def build(cls, entries, grid_size_x, grid_size_y):
+        records = np.zeros(len(entries), dtype=RECORD_DTYPE)
+        blob = bytearray()
+        for idx, (name, key, level, points, size, bounds) in enumerate(entries):
+            if bounds is None:
+                size_x, size_y = grid_size_x / (1 << level), grid_size_y / (1 << level)
+                x, y = key[0] * size_x, key[1] * size_y
+                bounds = (x, y, 0.0, x + size_x, y + size_y, 0.0)
+            encoded = name.encode('utf-8')
+            records[idx] = (key[0], key[1], level, points, size, *bounds, len(blob), len(encoded))
+            blob += encoded
+        records = records[np.argsort(records['min_x'], kind='stable')]
+        return cls(records, bytes(blob), float(grid_size_x), float(grid_size_y))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, version, count, grid_size_x, grid_size_y, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError(f"不是网格索引文件或版本不支持: {path}")
+            records = np.fromfile(f, dtype=RECORD_DTYPE, count=count)
+            if len(records) != count:
+                raise ValueError(f"网格索引文件被截断: {path}")
+            names = f.read()
+        return cls(records, names, grid_size_x, grid_size_y)
+
+    def save(self, path):
+        """原子写入索引文件"""
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(self.records),
+                                self.grid_size_x, self.grid_size_y, self.max_width))
+            self.records.tofile(f)
+            f.write(self.names)
+        os.replace(temp_path, path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def name(self, idx):
+        record = self.records[idx]
+        start = int(record['name_offset'])
+        return self.names[start:start + int(record['name_length'])].decode('utf-8')
+
+    def entry(self, idx):
+        """一个网格的信息 (dict)"""
+        record = self.records[idx]
+        return {
+            'file': self.name(idx),
+            'key': [int(record['ix']), int(record['iy'])],
+            'level': int(record['level']),
+            'points': int(record['points']),
+            'bytes': int(record['bytes']),
+            'bbox': [float(record[field]) for field in
+                     ('min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z')],
+        }
+
+    def files(self, indices):
+        return [self.name(idx) for idx in indices]
+
+    def lookup(self, key, level=0):
+        """网格键 (ix, iy) 和级别 → 记录下标, 不存在时返回 None"""
+        if self._keys is None:
+            self._keys = {(int(ix), int(iy), int(lv)): idx for idx, (ix, iy, lv) in enumerate(
+                zip(self.records['ix'], self.records['iy'], self.records['level']))}
+        return self._keys.get((key[0], key[1], level))
+
+    def candidates(self, min_x, max_x):
+        """min_x 落在 [min_x - 最大网格宽度, max_x] 内的记录区间 (只有它们可能与查询范围相交)"""
+        column = self.records['min_x']
+        start = np.searchsorted(column, min_x - self.max_width, side='left')
+        stop = np.searchsorted(column, max_x, side='right')
+        return start, stop
+
+    def query_bbox(self, min_x, min_y, max_x, max_y):
+        """与矩形 (平面) 相交的网格下标"""
+        start, stop = self.candidates(min_x, max_x)
+        part = self.records[start:stop]
+        hit = (part['max_x'] >= min_x) & (part['min_y'] <= max_y) & (part['max_y'] >= min_y)
+        return np.flatnonzero(hit) + start
+
+    def query_radius(self, x, y, radius):
+        """与圆 (平面) 相交的网格下标: 圆心到网格包围盒的距离不超过半径"""
+        start, stop = self.candidates(x - radius, x + radius)
+        part = self.records[start:stop]
+        dx = np.maximum(np.maximum(part['min_x'] - x, x - part['max_x']), 0.0)
+        dy = np.maximum(np.maximum(part['min_y'] - y, y - part['max_y']), 0.0)
+        return np.flatnonzero(dx * dx + dy * dy <= radius * radius) + start
+
+    def refresh_sizes(self, directory):
+        """网格文件被改写 (如增强) 后更新字节数"""
+        for idx in range(len(self.records)):
+            path = os.path.join(directory, self.name(idx))
+            if os.path.exists(path):
+                self.records['bytes'][idx] = os.path.getsize(path)
+
+
+def write_index(output_dir, prefix, grid_size_x, grid_size_y, entries):
+    """写出网格索引, 返回索引文件路径"""
+    path = os.path.join(output_dir, index_file_name(prefix))
+    TileIndex.build(entries, grid_size_x, grid_size_y).save(path)
+    return path
+
+
+def build_from_metadata(output_dir, prefix, progress=None):
+    """由元数据 YAML 和网格文件重建索引 (读取每个网格计算包围盒), 返回索引文件路径"""
+    emit = progress or (lambda message: None)
+    metadata_file = os.path.join(output_dir, f'{prefix}_metadata.yaml')
+    with open(metadata_file, 'r') as f:
+        metadata = yaml.safe_load(f) or {}
+    grid_size_x = float(metadata.pop('x_resolution'))
+    grid_size_y = float(metadata.pop('y_resolution'))
+
+    entries = []
+    for idx, (name, values) in enumerate(sorted(metadata.items())):
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path):
+            continue
+        # 自适应分块的条目为 [x, y, 边长 x, 边长 y]
+        x, y = values[:2]
+        size_x = values[2] if len(values) > 2 else grid_size_x
+        level = int(round(math.log2(grid_size_x / size_x)))
+        size_x, size_y = grid_size_x / (1 << level), grid_size_y / (1 << level)
+        key = (int(round(x / size_x)), int(round(y / size_y)))
+        points = pcd_io.read_header(path)['points']
+        entries.append((name, key, level, points, os.path.getsize(path), pcd_bounds(path)))
+        if (idx + 1) % 100 == 0:
+            emit(f"已索引网格 {idx+1}/{len(metadata)}")
+    return write_index(output_dir, prefix, grid_size_x, grid_size_y, entries)
+
+
+def load_index(output_dir, prefix, rebuild=False, progress=None):
+    """读取目录中的网格索引, 不存在 (或 rebuild) 时由元数据重建"""
+    path = os.path.join(output_dir, index_file_name(prefix))
+    if rebuild or not os.path.exists(path):
+        build_from_metadata(output_dir, prefix, progress)
+    return TileIndex.load(path)
+
+
+def refresh_index_sizes(output_dir, prefix):
+    """网格文件被改写后更新索引中的字节数, 没有索引时返回 False"""
+    path = os.path.join(output_dir, index_file_name(prefix))
+    if not os.path.exists(path):
+        return False
+    index = TileIndex.load(path)
+    index.refresh_sizes(output_dir)
+    index.save(path)
+    return True
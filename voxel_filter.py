@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+体素降采样 (替代 pointcloud_divider 中的 leaf_size 处理)
+- 坐标量化为体素编号, 打包为单个 64 位整数键
+- 排序分组后按体素归约: 质心 (centroid) 或首点 (first)
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VOXEL_MODES = ('centroid', 'first')
+
+
+def pack_voxel_keys(records, leaf_size):
+    """计算每个点的体素键 (int64), 按网格内的体素范围做混合进制打包"""
+    coords = []
+    spans = []
+    for axis in ('x', 'y', 'z'):
+        c = np.floor(records[axis] / leaf_size).astype(np.int64)
+        c -= c.min()
+        coords.append(c)
+        spans.append(int(c.max()) + 1)
+
+    if spans[0] * spans[1] * spans[2] >= 1 << 63:
+        raise ValueError(f"体素范围过大, 无法打包为 64 位键: {spans}")
+
+    keys = coords[0] * (spans[1] * spans[2])
+    keys += coords[1] * spans[2]
+    keys += coords[2]
+    return keys
+
+
+def voxel_downsample(records, leaf_size, mode='centroid'):
+    """体素降采样, 返回新的点记录 (dtype 不变)
+
+    centroid: 每个体素取质心, 颜色按通道取平均, 强度取平均 (与 PCL VoxelGrid 一致)
+    first: 每个体素保留输入顺序中的第一个点
+    """
+    if leaf_size <= 0 or len(records) == 0:
+        return records
+    if mode not in VOXEL_MODES:
+        raise ValueError(f"未知的降采样模式: {mode}")
+
+    keys = pack_voxel_keys(records, leaf_size)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+
+    if mode == 'first':
+        # 稳定排序后每组的第一个即输入顺序中的第一个点, 输出按输入顺序排列
+        return records[np.sort(order[starts])]
+
+    counts = np.diff(np.r_[starts, len(keys)])
+    out = np.empty(len(starts), dtype=records.dtype)
+    for axis in ('x', 'y', 'z'):
+        out[axis] = np.add.reduceat(records[axis][order].astype(np.float64), starts) / counts
+
+    names = records.dtype.names
+    if 'rgb' in names:
+        rgb = records['rgb'][order]
+        packed = np.zeros(len(starts), dtype=np.uint32)
+        for shift in (16, 8, 0):
+            channel = np.add.reduceat(((rgb >> shift) & 0xFF).astype(np.uint64), starts) / counts
+            packed |= np.rint(channel).astype(np.uint32) << shift
+        out['rgb'] = packed
+    elif 'intensity' in names:
+        out['intensity'] = np.add.reduceat(records['intensity'][order].astype(np.float64), starts) / counts
+
+    return out